@@ -0,0 +1,60 @@
+"""
+Throughput of multi-ID lookups (imgur image id ID...) for several worker
+counts on the thread pool and, when aiohttp is installed, the asyncio engine,
+against a local stand-in Imgur server adding a fixed latency to every request
+
+    python benchmarks/bench_batch.py [--ids N] [--latency SECONDS]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imgur_cli import aio  # noqa: E402
+from imgur_cli import batch  # noqa: E402
+from imgur_cli import concurrency  # noqa: E402
+from imgur_cli.client import ImgurClient  # noqa: E402
+from tests.fake_imgur import FakeImgurServer  # noqa: E402
+
+WORKERS = (1, 4, 16, 64, 256)
+
+
+def run(client, count, workers):
+    ids = ('img{0}'.format(index) for index in range(count))
+    stderr, sys.stderr = sys.stderr, io.StringIO()
+    try:
+        start = time.perf_counter()
+        for _ in batch.fetch_many(lambda image_id: client.get_image(image_id),
+                                  ids, workers):
+            pass
+        elapsed = time.perf_counter() - start
+    finally:
+        stats, sys.stderr = sys.stderr.getvalue().strip(), stderr
+    return count / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--ids', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.01)
+    options = parser.parse_args()
+
+    with FakeImgurServer(latency=options.latency) as server:
+        client = ImgurClient('client_id', 'client_secret', api_url=server.url)
+        engines = concurrency.ENGINES if aio.aiohttp else ('threads',)
+        baseline = None
+        for engine in engines:
+            concurrency.configure(engine=engine)
+            for workers in WORKERS:
+                rate, stats = run(client, options.ids, workers)
+                baseline = baseline or rate
+                print('{0:<7} {1:>3} workers {2:8.1f} ids/s ({3:4.1f}x)  {4}'.format(
+                    engine, workers, rate, rate / baseline, stats))
+
+
+if __name__ == '__main__':
+    main()
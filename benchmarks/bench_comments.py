@@ -0,0 +1,85 @@
+"""
+Format a synthetic comment tree as nested JSON and as a flat adjacency list,
+reporting time and peak memory. The tree holds one reply chain deeper than the
+interpreter's recursion limit, which both outputs have to get through. Its
+indentation makes the nested output grow with the square of the chain length
+(about 1.7 GB for the default chain), so lower --chain on a small machine
+
+    python benchmarks/bench_comments.py [--comments N] [--chain N]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imgur_cli import output  # noqa: E402
+from imgur_cli.client import build_comments  # noqa: E402
+from imgur_cli.utils import flatten_comment_tree, format_comment_tree  # noqa: E402
+
+
+def synthetic_tree(count, chain, seed=0):
+    """count comments: a reply chain of length chain, the rest spread randomly"""
+    random_state = random.Random(seed)
+    roots = []
+    nodes = []
+    for comment_id in range(count):
+        parent = None
+        if comment_id < chain:
+            parent = nodes[-1] if nodes else None
+        elif nodes and random_state.random() < 0.9:
+            parent = nodes[random_state.randrange(len(nodes))]
+        comment = {'id': comment_id, 'parent_id': parent['id'] if parent else 0,
+                   'comment': 'comment {0}'.format(comment_id), 'author': 'author',
+                   'points': comment_id % 50, 'children': []}
+        (parent['children'] if parent else roots).append(comment)
+        nodes.append(comment)
+    return roots
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    # Tracing slows everything down, so memory is measured on a second run
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{0:<24} {1:>7} comments {2:8.3f} s  peak {3:7.1f} MB'.format(
+        name, count, elapsed, peak / (1024 * 1024)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--comments', type=int, default=100000)
+    parser.add_argument('--chain', type=int, default=sys.getrecursionlimit() * 3)
+    options = parser.parse_args()
+
+    comments = build_comments(synthetic_tree(options.comments, options.chain))
+
+    def nested():
+        stream = io.StringIO()
+        output.write_json({'comments': format_comment_tree(comments)}, stream)
+        return stream.getvalue().count('"points"')
+
+    def flat():
+        stream = io.StringIO()
+        output.write_ndjson({'comments': flatten_comment_tree(comments)}, stream)
+        return stream.getvalue().count('\n')
+
+    def walk():
+        return sum(1 for _ in flatten_comment_tree(comments))
+
+    measure('walk', walk)
+    measure('nested json', nested)
+    measure('flat ndjson', flat)
+
+
+if __name__ == '__main__':
+    main()
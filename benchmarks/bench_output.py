@@ -0,0 +1,64 @@
+"""
+Encode time and output size of every output format for a large gallery export
+(imgurpython GalleryImage models, as "imgur gallery items --all-pages" writes
+them). Compact formats are timed with orjson when it is installed and with the
+json module alone:
+
+    python benchmarks/bench_output.py [--items N]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imgurpython.imgur.models.gallery_image import GalleryImage  # noqa: E402
+
+from imgur_cli import output  # noqa: E402
+from tests.fake_imgur import fake_gallery_item  # noqa: E402
+
+
+def encode(items, format):
+    output.configure(format=format)
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+    start = time.perf_counter()
+    output.write({'gallery': (item.__dict__ for item in items)}, stream)
+    elapsed = time.perf_counter() - start
+    stream.flush()
+    return elapsed, len(stream.buffer.getvalue())
+
+
+def report(name, elapsed, size, baseline):
+    print('{0:<18} {1:8.3f} s {2:10.1f} MB  ({3:.0%} of json)'.format(
+        name, elapsed, size / (1024 * 1024), size / baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--items', type=int, default=100000)
+    options = parser.parse_args()
+
+    items = [GalleryImage(fake_gallery_item(index))
+             for index in range(options.items)]
+    elapsed, baseline = encode(items, 'json')
+    report('json', elapsed, baseline, baseline)
+    for format in output.FORMATS[1:]:
+        try:
+            elapsed, size = encode(items, format)
+        except Exception as e:
+            print('{0:<18} skipped: {1}'.format(format, e))
+            continue
+        report(format, elapsed, size, baseline)
+    # The same compact formats with the json module only
+    sys.modules['orjson'] = None
+    for format in ('compact', 'ndjson'):
+        output._encoders.clear()
+        elapsed, size = encode(items, format)
+        report(format + ' (json)', elapsed, size, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Requests/sec through ImgurClient with and without the pooled keep-alive
+session, against a local stand-in Imgur server (plain HTTP, so the gap
+understates the TLS handshakes saved against api.imgur.com)
+
+    python benchmarks/bench_session.py [--requests N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from imgur_cli.client import ImgurClient, create_session  # noqa: E402
+from tests.fake_imgur import FakeImgurServer  # noqa: E402
+
+
+def run(server, session, count):
+    # The requests module itself quacks like a session but opens a new
+    # connection for every call
+    client = ImgurClient('client_id', 'client_secret', api_url=server.url,
+                         session=session)
+    start = time.perf_counter()
+    for index in range(count):
+        client.get_image('img{0}'.format(index))
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=500)
+    options = parser.parse_args()
+
+    with FakeImgurServer() as server:
+        unpooled = run(server, requests, options.requests)
+        pooled = run(server, create_session(), options.requests)
+    print('{0:<12} {1:10.1f} req/s'.format('unpooled', unpooled))
+    print('{0:<12} {1:10.1f} req/s  ({2:.1f}x)'.format(
+        'pooled', pooled, pooled / unpooled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Compare building the full argparse tree against the lazy, per-invocation
+parser used by ImgurCli.main
+
+    python benchmarks/bench_startup.py [--number N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imgur_cli.cli import ImgurCli  # noqa: E402
+
+ARGV = [['gallery', 'items', '--page', '2'],
+        ['account', 'user', 'me'],
+        ['album'],
+        ['help']]
+
+
+def build(argv):
+    ImgurCli().generate_parser(argv)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=200)
+    options = parser.parse_args()
+
+    full = min(timeit.repeat(lambda: build(None), number=options.number,
+                             repeat=3)) / options.number
+    print('{0:<30} {1:8.3f} ms'.format('full tree', full * 1000))
+    for argv in ARGV:
+        lazy = min(timeit.repeat(lambda: build(argv), number=options.number,
+                                 repeat=3)) / options.number
+        print('{0:<30} {1:8.3f} ms  ({2:.1f}x)'.format(
+            ' '.join(argv), lazy * 1000, full / lazy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Peak memory (RSS) of file uploads: imgurpython's upload_from_path, which reads
+and base64 encodes the whole file, against ImgurClient's multipart body
+streamed from disk. Every case runs in a fresh process, uploading --workers
+files of --size MB at once to a local stand-in Imgur server, and reports its
+peak RSS and how much that grew over the RSS before uploading
+
+    python benchmarks/bench_upload.py [--size MB] [--workers N]
+"""
+
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ('base64', 'streaming')
+
+
+def max_rss():
+    """Peak resident set size of this process so far, in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def child(mode, url, paths):
+    """Upload paths in this process and print the memory figures as JSON"""
+    import imgurpython
+
+    from imgur_cli import upload
+    from imgur_cli.client import ImgurClient
+
+    client = ImgurClient('client_id', 'client_secret', api_url=url)
+    if mode == 'base64':
+        client.upload_from_path = functools.partial(
+            imgurpython.ImgurClient.upload_from_path, client)
+    before = max_rss()
+    start = time.perf_counter()
+    records = list(upload.upload_many(client, paths, workers=len(paths)))
+    elapsed = time.perf_counter() - start
+    errors = [record['error'] for record in records if 'error' in record]
+    if errors:
+        raise SystemExit('Upload failed: {0}'.format(errors[0]))
+    print(json.dumps({'before': before, 'peak': max_rss(), 'seconds': elapsed}))
+
+
+def run(mode, url, paths):
+    process = subprocess.run([sys.executable, os.path.abspath(__file__),
+                              '--child', mode, url] + paths,
+                             stdout=subprocess.PIPE, check=True,
+                             universal_newlines=True)
+    return json.loads(process.stdout)
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], sys.argv[3], sys.argv[4:])
+        return
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--size', type=float, default=10,
+                        help='Size of every file in MB (default 10)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Files uploaded at once (default 4)')
+    options = parser.parse_args()
+
+    from tests.fake_imgur import FakeImgurServer
+
+    size = int(options.size * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as directory, \
+            FakeImgurServer() as server:
+        paths = []
+        for index in range(options.workers):
+            path = os.path.join(directory, 'image{0}.gif'.format(index))
+            with open(path, 'wb') as image_file:
+                image_file.write(os.urandom(size))
+            paths.append(path)
+        print('{0} x {1:.1f}MB uploaded at once'.format(options.workers,
+                                                        size / 1024 ** 2))
+        print('{0:<10} {1:>10} {2:>10} {3:>13} {4:>8}'.format(
+            'mode', 'peak RSS', 'growth', 'growth/file', 'seconds'))
+        for mode in MODES:
+            result = run(mode, server.url, paths)
+            growth = result['peak'] - result['before']
+            print('{0:<10} {1:8.1f}MB {2:8.1f}MB {3:11.1f}MB {4:8.2f}'.format(
+                mode, result['peak'] / 1024 ** 2, growth / 1024 ** 2,
+                growth / options.workers / 1024 ** 2, result['seconds']))
+
+
+if __name__ == '__main__':
+    main()
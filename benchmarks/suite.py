@@ -0,0 +1,259 @@
+"""
+Benchmark suite for the CLI's hot paths, runnable offline: cold start, parser
+construction, argument parsing for every subcommand, comment tree formatting,
+output serialization and end-to-end command latency against a local stand-in
+Imgur server. Results are saved as JSON; give --compare an earlier result file
+to report every benchmark that got slower by more than --threshold
+
+    python benchmarks/suite.py [--output FILE] [--compare FILE] [--quick]
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from imgur_cli import __version__  # noqa: E402
+from imgur_cli import output  # noqa: E402
+from imgur_cli.cli import ImgurCli  # noqa: E402
+from tests.fake_imgur import fake_gallery_item  # noqa: E402
+
+from bench_comments import synthetic_tree  # noqa: E402
+
+BENCHMARKS = []
+
+
+def benchmark(group):
+    """Register a function yielding (name, func, repeat) benchmark cases"""
+    def register(cases):
+        BENCHMARKS.append((group, cases))
+        return cases
+    return register
+
+
+def measure(func, repeat):
+    """Seconds taken by each of repeat calls of func, after one warm-up call"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings):
+    return {'runs': len(timings), 'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.mean(timings),
+            'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0}
+
+
+@contextlib.contextmanager
+def silenced():
+    """Swallow what commands print"""
+    with contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def subcommand_argv(parser):
+    """
+    A valid command line for every subcommand of parser, filling positional
+    and required arguments with their first choice or a placeholder ID
+    """
+    for group in parser._subparsers._group_actions:
+        for subparser_name, subparser in group.choices.items():
+            if subparser._subparsers is None:
+                continue
+            for command_group in subparser._subparsers._group_actions:
+                for name, command in command_group.choices.items():
+                    argv = [subparser_name, name]
+                    for action in command._actions:
+                        if action.option_strings and not action.required:
+                            continue
+                        if action.nargs in ('?', '*') or action.nargs == 0:
+                            continue
+                        value = (str(list(action.choices)[0]) if action.choices
+                                 else '1')
+                        argv.extend(action.option_strings[:1] + [value])
+                    yield argv
+
+
+@benchmark('startup')
+def startup_cases(options):
+    def cold_start():
+        subprocess.run([sys.executable, '-c', 'from imgur_cli.cli import main; '
+                        'main()', 'help'], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+    yield 'cold_start', cold_start, options.repeat // 2 or 1
+    yield 'generate_parser.full', lambda: ImgurCli().generate_parser(), \
+        options.repeat
+
+
+@benchmark('parse')
+def parse_cases(options):
+    def parse(argv):
+        cli = ImgurCli()
+        cli.generate_parser(argv)
+        cli.parser.parse_args(argv)
+
+    full = ImgurCli()
+    full.generate_parser()
+    for argv in subcommand_argv(full.parser):
+        name = '.'.join(argv[:2])
+        yield name, lambda argv=argv: parse(argv), options.repeat
+
+
+@benchmark('comments')
+def comment_cases(options):
+    from imgur_cli.client import build_comments
+    from imgur_cli.utils import flatten_comment_tree, format_comment_tree
+
+    comments = build_comments(synthetic_tree(options.comments, 0))
+
+    def nested():
+        output.write_json({'comments': format_comment_tree(comments)},
+                          io.StringIO())
+
+    def flat():
+        output.write_ndjson({'comments': flatten_comment_tree(comments)},
+                            io.StringIO())
+
+    yield 'nested_json.{0}'.format(options.comments), nested, options.repeat
+    yield 'flat_ndjson.{0}'.format(options.comments), flat, options.repeat
+
+
+@benchmark('output')
+def output_cases(options):
+    for size in options.items:
+        items = [fake_gallery_item(index) for index in range(size)]
+        for format in ('json', 'compact', 'ndjson', 'csv'):
+            def write(format=format, items=items):
+                output.configure(format=format)
+                try:
+                    output.write({'gallery': iter(items)}, io.StringIO())
+                finally:
+                    output.configure()
+            yield '{0}.{1}'.format(format, size), write, \
+                max(options.repeat // 4, 1)
+
+
+@benchmark('command')
+def command_cases(options):
+    from imgur_cli.cache import ResponseCache
+    from imgur_cli.client import ImgurClient
+    from tests.fake_imgur import FakeImgurServer
+
+    server = FakeImgurServer(pages=3, page_size=60)
+    server.start()
+    cache_dir = tempfile.TemporaryDirectory()
+    try:
+        client = ImgurClient('client_id', 'client_secret', api_url=server.url,
+                             cache=ResponseCache(cache_dir.name))
+
+        def run(argv):
+            cli = ImgurCli()
+            cli.client = client
+            with silenced():
+                status = cli.main(argv)
+            if status:
+                raise RuntimeError('{0} exited with {1}'.format(argv, status))
+
+        for argv in (['image', 'id', 'abc'],
+                     ['album', 'id', 'abc'],
+                     ['gallery', 'items'],
+                     ['gallery', 'items', '--all-pages'],
+                     ['image', 'id'] + ['img{0}'.format(n) for n in range(50)]):
+            name = '.'.join(argv[:2] + (['all_pages'] if '--all-pages' in argv
+                                        else []) +
+                            (['many'] if len(argv) > 3 else []))
+            yield name, lambda argv=argv: run(argv), options.repeat
+    finally:
+        server.stop()
+        cache_dir.cleanup()
+
+
+def run_suite(options):
+    results = {}
+    for group, cases in BENCHMARKS:
+        if options.only and group not in options.only:
+            continue
+        for name, func, repeat in cases(options):
+            key = '{0}.{1}'.format(group, name)
+            results[key] = summarize(measure(func, repeat))
+            print('{0:<48} {1:10.3f} ms'.format(key,
+                                                results[key]['median'] * 1000))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of the benchmarks whose median grew by more than threshold"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = result['median'] / previous['median'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{0:<48} {1:+7.1%}{2}'.format(name, change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--output', default=None,
+                        help='Result file (default: benchmarks/results/'
+                        '<version>-<timestamp>.json)')
+    parser.add_argument('--compare', default=None, metavar='FILE',
+                        help='Earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Slowdown reported as a regression (default 0.2)')
+    parser.add_argument('--only', action='append',
+                        choices=[group for group, _ in BENCHMARKS],
+                        help='Run only this group (may be repeated)')
+    parser.add_argument('--quick', action='store_true',
+                        help='Fewer runs and smaller inputs')
+    options = parser.parse_args()
+    options.repeat = 5 if options.quick else 20
+    options.items = (1000, 10000) if options.quick else (10000, 100000)
+    options.comments = 10000 if options.quick else 100000
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = run_suite(options)
+    document = {'version': __version__, 'started': started.isoformat(),
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(), 'quick': options.quick,
+                'results': results}
+    path = options.output or os.path.join(
+        ROOT, 'benchmarks', 'results', '{0}-{1}.json'.format(
+            __version__, started.strftime('%Y%m%dT%H%M%S')))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as result_file:
+        json.dump(document, result_file, indent=4, sort_keys=True)
+    print('Results saved to {0}'.format(path))
+
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+asyncio engine for client requests.
+
+ImgurClient and the functions built on it (imgurpython's endpoints, the
+lambdas cmd_* functions hand to paginate and batch) are synchronous. Rather
+than re-implementing every endpoint, the engine replays them: while a call
+runs in replay mode, the client's send_request raises CapturedRequest for the
+first request that has no response yet. The engine sends that request with
+aiohttp without blocking the event loop, then runs the call again with every
+response received so far. Most endpoints make a single request, so the call
+runs twice and the second run only builds the model objects. Because of that,
+replayed functions must not have side effects besides their requests.
+
+When the access token is refused (403), the call raises RefreshNeeded instead
+of refreshing the token itself. The engine refreshes it once, on a thread so
+the loop is not blocked, and replays the call with the new token; calls that
+were refused the same token wait for that refresh rather than repeating it.
+
+Requires the optional aiohttp dependency (pip install imgur-cli[async]).
+"""
+
+import asyncio
+import collections
+import time
+
+from urllib.parse import urlencode
+
+from imgur_cli import exceptions
+from imgur_cli.client import (REFRESHED, REPLAY, CapturedRequest, RefreshNeeded,
+                              build_response)
+from imgur_cli.concurrency import call_started
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+    RETRY_ERRORS = ()
+else:
+    # Failures of a request that may be retried by the RetryPolicy
+    RETRY_ERRORS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                    asyncio.TimeoutError)
+
+CONCURRENCY = 100
+
+
+def _form(data):
+    # Like requests, leave out fields without a value
+    return {key: str(value) for key, value in (data or {}).items()
+            if value is not None}
+
+
+class AsyncEngine:
+    """
+    Runs synchronous client calls as coroutines, with at most concurrency
+    requests in flight on one aiohttp session:
+
+        async with AsyncEngine() as engine:
+            images = await asyncio.gather(*(engine.call(client.get_image, image_id)
+                                            for image_id in ids))
+    """
+
+    def __init__(self, concurrency=CONCURRENCY):
+        if aiohttp is None:
+            raise exceptions.CommandError('The async engine needs aiohttp: '
+                                          'pip install imgur-cli[async]')
+        self.concurrency = concurrency
+        self.session = None
+        self._semaphore = None
+        self._refresh_lock = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._refresh_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def call(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs), sending its requests asynchronously"""
+        call_started.set(time.perf_counter())
+        responses = []
+        refreshed = False
+        while True:
+            token = REPLAY.set(collections.deque(responses))
+            refreshed_token = REFRESHED.set(refreshed)
+            try:
+                return func(*args, **kwargs)
+            except CapturedRequest as request:
+                captured = request
+            except RefreshNeeded as refusal:
+                captured = refusal
+            finally:
+                REPLAY.reset(token)
+                REFRESHED.reset(refreshed_token)
+            if isinstance(captured, RefreshNeeded):
+                await self.refresh(captured.client, captured.access_token)
+                # Send the refused request again, with the new token
+                responses.pop()
+                refreshed = True
+                continue
+            responses.append(await self.send(captured))
+
+    async def refresh(self, client, access_token):
+        """
+        Refresh client's access token on a thread, unless another call already
+        replaced the refused access_token
+        """
+        async with self._refresh_lock:
+            if client.auth.current_access_token == access_token:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, client.auth.refresh)
+
+    async def send(self, request):
+        """
+        Send a captured request, paced by its client's rate limiter and retried
+        as its client's retry policy allows
+        """
+        client = request.client
+        retry = client.retry
+        retries = retry.retries_method(request.method)
+        attempt = 0
+        while True:
+            try:
+                response = await self._send_once(request, attempt)
+            except RETRY_ERRORS:
+                delay = retry.delay(attempt) if retries else None
+                if delay is None:
+                    raise
+            else:
+                delay = None
+                if retries and response.status_code in retry.statuses:
+                    delay = retry.delay(attempt, response.status_code,
+                                        response.headers)
+                if delay is None:
+                    return response
+            if client.metrics is not None:
+                client.metrics.record_backoff(delay)
+            await retry.wait_async(delay)
+            attempt += 1
+
+    async def _send_once(self, request, attempt=0):
+        rate_limiter = request.client.rate_limiter
+        connect, read = request.client.timeout
+        kwargs = {'headers': request.headers,
+                  'timeout': aiohttp.ClientTimeout(sock_connect=connect,
+                                                   sock_read=read)}
+        if request.method in ('delete', 'get'):
+            kwargs['params'] = _form(request.data)
+        else:
+            kwargs['data'] = _form(request.data)
+        metrics = request.client.metrics
+        async with self._semaphore:
+            await rate_limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                async with self.session.request(request.method.upper(),
+                                                request.url, **kwargs) as response:
+                    content = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if metrics is not None:
+                    metrics.record(request.method, request.url, 'error',
+                                   time.perf_counter() - started)
+                raise
+        credits = rate_limiter.update(response.headers)
+        result = build_response(response.status, request.url,
+                                dict(response.headers), content)
+        if metrics is not None:
+            sent = (len(urlencode(kwargs['data'])) if kwargs.get('data')
+                    else 0)
+            metrics.record_response(request.method, request.url, result,
+                                    time.perf_counter() - started, credits,
+                                    bytes_out=sent, retried=attempt > 0)
+        return result
+
+
+def imap_ordered(func, iterable, workers):
+    """
+    concurrency.imap_ordered on an event loop: lazily yield func(item) for each
+    item, in order, with at most workers calls in flight as tasks. Closing the
+    generator cancels the calls still running
+    """
+    engine = AsyncEngine(workers)
+    loop = asyncio.new_event_loop()
+    pending = collections.deque()
+    try:
+        loop.run_until_complete(engine.__aenter__())
+        for item in iterable:
+            if len(pending) >= workers:
+                yield loop.run_until_complete(pending.popleft())
+            pending.append(loop.create_task(engine.call(func, item)))
+        while pending:
+            yield loop.run_until_complete(pending.popleft())
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending,
+                                                   return_exceptions=True))
+        if engine.session is not None:
+            loop.run_until_complete(engine.__aexit__(None, None, None))
+        loop.close()
@@ -0,0 +1,48 @@
+"""
+Concurrent lookups of many IDs.
+
+IDs come from the command line or stdin and are read lazily, so a list
+of any length is fetched through a bounded window of workers sharing one
+client. Every ID produces exactly one record, in input order: the item itself,
+or {'id': ..., 'error': ...} when it could not be fetched, so one bad ID never
+aborts the rest. Per-item latency percentiles and throughput are printed to
+stderr once done.
+"""
+
+import sys
+
+from imgurpython.helpers.error import ImgurClientError, ImgurClientRateLimitError
+from requests import RequestException
+
+from imgur_cli.concurrency import LatencyStats, imap_requests
+
+LOOKUP_ERRORS = (ImgurClientError, ImgurClientRateLimitError, RequestException,
+                 ValueError)
+
+
+def read_ids(ids, stream=None):
+    """Yield ids, replacing '-' with the non-blank lines of stream (stdin)"""
+    for item_id in ids:
+        if item_id != '-':
+            yield item_id
+            continue
+        lines = stream or sys.stdin
+        yield from (line.strip() for line in lines if line.strip())
+
+
+def fetch_many(fetch, ids, workers=8):
+    """Yield fetch(id), or an error record, for every id in order"""
+    stats = LatencyStats()
+    timed_fetch = stats.timed(fetch)
+
+    def lookup(item_id):
+        try:
+            return timed_fetch(item_id)
+        except LOOKUP_ERRORS as e:
+            return {'id': item_id, 'error': str(e)}
+
+    records = imap_requests(lookup, ids, workers)
+    try:
+        yield from records
+    finally:
+        print(stats.summary('items'), file=sys.stderr)
@@ -0,0 +1,181 @@
+"""
+On-disk cache of API responses for read-only requests.
+
+Only GET routes matching TTLS are cached, each for its own time to live.
+Entries are JSON files named after a hash of the URL and the credentials used.
+A fresh entry is served without a request, so it costs no API credits. A stale
+entry that came with an ETag or Last-Modified header is revalidated with a
+conditional request and renewed by a 304 answer. The directory is kept under
+max_size bytes by evicting the least recently used entries first; every hit
+touches the entry's mtime to keep track of that.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+TTLS = (
+    (re.compile(r'/3/image/[^/]+$'), 3600),
+    (re.compile(r'/3/album/[^/]+$'), 600),
+    (re.compile(r'/3/gallery/[^/]+$'), 300),
+    (re.compile(r'/3/gallery/[^/]+/tags$'), 600),
+    (re.compile(r'/3/memegen/defaults$'), 86400),
+    (re.compile(r'/3/account/(?!me$)[^/]+$'), 600),
+)
+MAX_SIZE = 50 * 1024 * 1024
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+SUFFIX = '.json'
+
+
+class ResponseCache:
+
+    def __init__(self, directory, max_size=MAX_SIZE, ttls=TTLS, clock=time.time):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttls = ttls
+        self.clock = clock
+        # Toggled per command by the CLI's --cache/--no-cache and --refresh
+        self.enabled = True
+        self.refresh = False
+        self._size = None
+
+    def ttl(self, url):
+        """Seconds a response for url stays fresh, None if it is not cacheable"""
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return None
+
+    def key(self, url, headers):
+        identity = '{0}\n{1}'.format(url, headers.get('Authorization', ''))
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """Return the entry stored under key, or None"""
+        path = self._path(key)
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return entry['expires'] > self.clock()
+
+    def validators(self, entry):
+        """Headers turning a request for entry into a conditional one"""
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def store(self, key, url, headers, body, ttl):
+        """Save a response body and return its entry"""
+        now = self.clock()
+        entry = {'url': url, 'stored': now, 'expires': now + ttl, 'body': body,
+                 'headers': {name: headers[name] for name in STORED_HEADERS
+                             if headers.get(name)}}
+        self._write(key, entry)
+        return entry
+
+    def renew(self, key, entry, ttl):
+        """Extend a revalidated entry by another ttl seconds"""
+        entry = dict(entry, expires=self.clock() + ttl)
+        self._write(key, entry)
+        return entry
+
+    def _write(self, key, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.entry')
+        try:
+            with os.fdopen(fd, 'w') as entry_file:
+                json.dump(entry, entry_file)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            os.unlink(temp_path)
+            raise
+        if self._size is None:
+            self._size = sum(entry_size for _, entry_size, _ in self._entries())
+        else:
+            self._size += size
+        if self._size > self.max_size:
+            self.prune()
+
+    def _entries(self):
+        """(path, size, last use) of every entry, least recently used first"""
+        entries = []
+        try:
+            listing = os.scandir(self.directory)
+        except FileNotFoundError:
+            return entries
+        with listing:
+            for item in listing:
+                if not item.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((item.path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def stats(self):
+        entries = self._entries()
+        now = self.clock()
+        expired = 0
+        for path, _, _ in entries:
+            try:
+                with open(path) as entry_file:
+                    expired += json.load(entry_file)['expires'] <= now
+            except (OSError, ValueError, KeyError):
+                expired += 1
+        return {'directory': self.directory, 'entries': len(entries),
+                'expired': expired, 'size': sum(size for _, size, _ in entries),
+                'max_size': self.max_size}
+
+    def prune(self, clear=False):
+        """
+        Remove expired entries (or every entry when clear is set), then the
+        least recently used ones until the cache fits in max_size. Returns the
+        number of entries removed
+        """
+        now = self.clock()
+        kept = []
+        removed = 0
+        for path, size, last_use in self._entries():
+            if not clear:
+                try:
+                    with open(path) as entry_file:
+                        if json.load(entry_file)['expires'] > now:
+                            kept.append((path, size, last_use))
+                            continue
+                except (OSError, ValueError, KeyError):
+                    pass
+            removed += self._remove(path)
+        total = sum(size for _, size, _ in kept)
+        for path, size, _ in kept:
+            if total <= self.max_size:
+                break
+            removed += self._remove(path)
+            total -= size
+        self._size = total
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return 0
+        return 1
@@ -5,22 +5,40 @@ Imgur CLI
 import argparse
 import logging
 import os
+import time
 import traceback
 import sys
 
 from collections import namedtuple
 
-import imgurpython
+_import_started = time.perf_counter()
 
-from imgur_cli import __version__
-from imgur_cli import cli_api
-from imgur_cli import exceptions
-from imgur_cli.utils import cli_arg
+from imgur_cli import __version__  # noqa: E402
+from imgur_cli import cli_api  # noqa: E402
+from imgur_cli import concurrency  # noqa: E402
+from imgur_cli import exceptions  # noqa: E402
+from imgur_cli import filters  # noqa: E402
+from imgur_cli import metrics  # noqa: E402
+from imgur_cli import output  # noqa: E402
+from imgur_cli import profiling  # noqa: E402
+from imgur_cli import retry  # noqa: E402
+from imgur_cli.utils import cache_path, cli_arg, generate_output  # noqa: E402
+
+# Reported by the first --profile run of the process
+_import_time = time.perf_counter() - _import_started
 
 logger = logging.getLogger(__name__)
 
+HTTP_CACHE_DIR = 'http'
+STORE_FILE = 'store.sqlite3'
+TOKENS_FILE = 'tokens.json'
+# Seconds to connect, and to wait for each read of a response
+TIMEOUT = '10,60'
+
 
 def imgur_credentials():
+    from imgurpython.client import ImgurClientError
+
     ImgurCredentials = namedtuple('ImgurCredentials',
                                   ['client_id', 'client_secret', 'access_token',
                                    'refresh_token', 'mashape_key'])
@@ -32,14 +50,61 @@ def imgur_credentials():
     mashape_key = os.environ.get('IMGUR_MASHAPE_KEY')
 
     if not client_id or not client_secret:
-        raise imgurpython.client.ImgurClientError('Client credentials not found. '
-                                                  'Ensure you have both client id '
-                                                  'and client secret')
+        raise ImgurClientError('Client credentials not found. Ensure you have both '
+                               'client id and client secret')
 
     return ImgurCredentials(client_id, client_secret, access_token,
                             refresh_token, mashape_key)
 
 
+def parse_timeout(text):
+    """
+    Parse --timeout: one number of seconds for both the connection and each
+    read, or a connect,read pair
+    """
+    try:
+        values = [float(value) for value in text.split(',')]
+    except ValueError:
+        values = []
+    if len(values) not in (1, 2) or min(values) <= 0:
+        raise argparse.ArgumentTypeError('expected seconds such as 30 or 10,60')
+    return (values[0], values[-1])
+
+
+def imgur_client(credentials, metrics=None, timeout=None):
+    """
+    Create the ImgurClient. imgurpython pulls in requests, so it is only imported
+    once a command actually needs to talk to the API
+    """
+    from imgur_cli.cache import ResponseCache
+    from imgur_cli.client import ImgurClient
+    from imgur_cli.ratelimit import RateLimiter, state_file
+    from imgur_cli.tokens import TokenStore
+
+    rate_limiter = RateLimiter(cache_path(state_file(credentials.client_id)))
+    cache = ResponseCache(cache_path(HTTP_CACHE_DIR))
+    token_store = TokenStore(cache_path(TOKENS_FILE), credentials.client_id)
+    return ImgurClient(*credentials, rate_limiter=rate_limiter, cache=cache,
+                       token_store=token_store, metrics=metrics,
+                       timeout=timeout or parse_timeout(TIMEOUT))
+
+
+def client_errors():
+    """
+    Return the imgurpython and requests exception types that main() reports
+    without a traceback. They are looked up instead of imported: if imgurpython
+    was never loaded, nothing could have raised them
+    """
+    error = sys.modules.get('imgurpython.helpers.error')
+    if error is None:
+        return ()
+    errors = (error.ImgurClientError, error.ImgurClientRateLimitError)
+    request_errors = sys.modules.get('requests.exceptions')
+    if request_errors is not None:
+        errors += (request_errors.RequestException,)
+    return errors
+
+
 class ImgurCli:
 
     def __init__(self):
@@ -47,6 +112,7 @@ class ImgurCli:
         self.parser = None
         self.client = None
         self.subparsers = {}
+        self.profiler = profiling.DISABLED
 
     @property
     def base_parser(self):
@@ -58,15 +124,124 @@ class ImgurCli:
         # Global arguments
         parser.add_argument('-v', '--version', action='version',
                             version='%(prog)s {0}'.format(__version__))
+        parser.add_argument('--format', default=None, choices=output.FORMATS,
+                            help='Output format: indented JSON document, the '
+                            'same without whitespace, one JSON record per line, '
+                            'MessagePack or CSV records (defaults to json, or '
+                            'ndjson when looking up many IDs)')
+        parser.add_argument('--fields', default=None, type=filters.parse_fields,
+                            metavar='<field,...>',
+                            help='Only output these comma separated fields of '
+                            'every item (dotted names reach into nested '
+                            'objects, e.g. id,link,views,datetime)')
+        parser.add_argument('--where', action='append', default=[],
+                            type=filters.parse_condition, metavar='<condition>',
+                            help='Only output the items of listings matching a '
+                            'condition such as views>10000 or nsfw==false '
+                            '(operators: == != > >= < <=); may be repeated, all '
+                            'conditions must match')
+        parser.add_argument('--engine', default='threads',
+                            choices=concurrency.ENGINES,
+                            help='How concurrent requests (--concurrency, many '
+                            'IDs) are run: on a thread pool or as asyncio tasks, '
+                            'which needs aiohttp (defaults to %(default)s)')
+        parser.add_argument('--cache', action='store_true', default=None,
+                            help='Answer read-only requests from the on-disk '
+                            'response cache (also enabled by setting '
+                            'IMGUR_CLI_CACHE=1)')
+        parser.add_argument('--no-cache', action='store_false', dest='cache',
+                            help='Bypass the response cache')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Revalidate cached responses even if they are '
+                            'still fresh')
+        parser.add_argument('--store', action='store_true', default=None,
+                            help='Also save the images, albums, gallery items '
+                            'and comments the command outputs to a local SQLite '
+                            'store for "imgur query" (also enabled by setting '
+                            'IMGUR_CLI_STORE=1)')
+        parser.add_argument('--store-file', default=None, metavar='<path>',
+                            help='SQLite store used by --store and query '
+                            '(defaults to {0} in the cache directory)'.format(
+                                STORE_FILE))
+        parser.add_argument('--retries', type=int, default=retry.ATTEMPTS - 1,
+                            metavar='<n>',
+                            help='Retry read-only requests failing with a '
+                            'connection error, 429 or 5xx up to <n> times, '
+                            'backing off exponentially with jitter and '
+                            'honoring Retry-After (defaults to %(default)s, '
+                            '0 disables)')
+        parser.add_argument('--timeout', default=TIMEOUT, type=parse_timeout,
+                            metavar='<seconds>',
+                            help='Give up on a request after <seconds> without '
+                            'connecting or without receiving data, or '
+                            '<connect>,<read> seconds for each (defaults to '
+                            '%(default)s); timed out read-only requests are '
+                            'retried like connection errors')
+        parser.add_argument('--metrics', default=None, choices=metrics.FORMATS,
+                            help='Once done, write request metrics (latency, '
+                            'status, bytes and credits per endpoint) to stderr '
+                            'as JSON or in the Prometheus text format')
+        parser.add_argument('--metrics-file', default=None, metavar='<path>',
+                            help='Write the --metrics output to <path> instead, '
+                            'replacing it atomically (e.g. a node-exporter '
+                            'textfile collector .prom file)')
+        parser.add_argument('--profile', action='store_true',
+                            help='Print the time spent importing, parsing, '
+                            'loading credentials, in HTTP requests, building '
+                            'models and writing output to stderr')
+        parser.add_argument('--profile-output', default=None, metavar='<file>',
+                            help='With or without --profile, also run the '
+                            'command under cProfile and save its statistics '
+                            'to <file> for pstats')
 
         return parser
 
-    def generate_parser(self):
+    def generate_parser(self, argv=None):
+        """
+        Build the argument parser. When argv is given only the subparser and
+        subcommand it invokes are constructed; help and anything that cannot be
+        resolved fall back to the full tree so argparse can report it
+        """
         self.parser = self.base_parser
         base_subparser = self.parser.add_subparsers(metavar='<subparsers>')
-        self._add_help(self, base_subparser)
-        self._add_subparsers(base_subparser)
-        self._add_subcommands(cli_api)
+        subparser_name, callback = self._resolve_command(argv)
+        if subparser_name is None:
+            self._add_commands(base_subparser)
+            self._add_subparsers(base_subparser)
+            self._add_subcommands(cli_api)
+        else:
+            self._add_subparsers(base_subparser, [subparser_name])
+            if callback is None:
+                self._add_subcommands(cli_api, subparser_name)
+            else:
+                self._add_subcommand(callback)
+
+    def _resolve_command(self, argv):
+        """
+        Find the subparser name and 'cmd_' callback invoked by argv without
+        building any parsers. Either item is None when it cannot be resolved
+        """
+        tokens = self._command_tokens(argv or [])
+        if not tokens or tokens[0] not in cli_api.SUBPARSERS:
+            return None, None
+        subparser_name = tokens[0]
+        if len(tokens) < 2 or tokens[1].startswith('-'):
+            return subparser_name, None
+        attr = 'cmd_{0}_{1}'.format(subparser_name, tokens[1]).replace('-', '_')
+        callback = getattr(cli_api, attr, None)
+        if getattr(callback, 'subparser', None) != subparser_name:
+            return subparser_name, None
+        return subparser_name, callback
+
+    def _command_tokens(self, argv):
+        """Strip the global options (and their values) preceding the subparser"""
+        takes_value = {option for action in self.parser._actions
+                       if action.option_strings and action.nargs != 0
+                       for option in action.option_strings}
+        index = 0
+        while index < len(argv) and argv[index].startswith('-'):
+            index += 2 if argv[index] in takes_value else 1
+        return argv[index:]
 
     def _generate_subcommand(self, name, callback, subparser):
         description = callback.__doc__ or ''
@@ -82,12 +257,17 @@ class ImgurCli:
         subcommand.set_defaults(func=callback)
         self.subcommands[name] = subcommand
 
-    def _add_help(self, cli_api, subparser):
-        callback = getattr(self, 'cmd_help')
-        self._generate_subcommand('help', callback, subparser)
+    def _add_commands(self, subparser):
+        """Add the top-level commands implemented by ImgurCli itself"""
+        for attr in (action for action in dir(self) if action.startswith('cmd_')):
+            callback = getattr(self, attr)
+            name = attr[len('cmd_'):].replace('_', '-')
+            self._generate_subcommand(name, callback, subparser)
 
-    def _add_subparsers(self, subparser):
+    def _add_subparsers(self, subparser, names=None):
         for name, description in cli_api.SUBPARSERS.items():
+            if names is not None and name not in names:
+                continue
             parser = subparser.add_parser(name, help=description,
                                           description=description,
                                           add_help=False)
@@ -99,15 +279,20 @@ class ImgurCli:
                 parser.add_subparsers(metavar='<subcommands>')
             )
 
-    def _add_subcommands(self, cli_api):
+    def _add_subcommands(self, cli_api, subparser_name=None):
         for attr in (action for action in dir(cli_api)
                      if action.startswith('cmd_')):
             callback = getattr(cli_api, attr)
-            subparser_name = getattr(callback, 'subparser', None)
-            name = (attr[len('cmd_{0}_'.format(subparser_name.replace('-', '_'))):]
-                    .replace('_', '-'))
-            subparser = self.subparsers[subparser_name]['subparser']
-            self._generate_subcommand(name, callback, subparser)
+            if subparser_name is not None and callback.subparser != subparser_name:
+                continue
+            self._add_subcommand(callback)
+
+    def _add_subcommand(self, callback):
+        subparser_name = getattr(callback, 'subparser', None)
+        name = (callback.__name__[len('cmd_{0}_'.format(
+            subparser_name.replace('-', '_'))):].replace('_', '-'))
+        subparser = self.subparsers[subparser_name]['subparser']
+        self._generate_subcommand(name, callback, subparser)
 
     @cli_arg('subparser', metavar='<subparser>', nargs='?',
              help='Display help for <subparser>')
@@ -131,34 +316,237 @@ class ImgurCli:
         else:
             self.parser.print_help()
 
-    def main(self, argv):
-        self.generate_parser()
-        if not argv:
-            self.parser.print_help()
+    def cmd_credits(self, args):
+        """
+        Show the API credit budget of IMGUR_CLIENT_ID reported by the last
+        request, without making a network call. Credits reset since are null
+        """
+        from imgur_cli import ratelimit
+
+        client_id = os.environ.get('IMGUR_CLIENT_ID')
+        if not client_id:
+            raise exceptions.CommandError('Client credentials not found. Set '
+                                          'IMGUR_CLIENT_ID')
+        now = time.time()
+        state = ratelimit.load_state(
+            cache_path(ratelimit.state_file(client_id)))
+        if state is None:
+            raise exceptions.CommandError('No credit information recorded yet, '
+                                          'run any other command first')
+        state = ratelimit.fresh_state(state, now)
+        reset = state.get('UserReset')
+        if reset is not None:
+            state['UserResetIn'] = max(int(reset - now), 0)
+        generate_output({'credits': state})
+
+    @cli_arg('action', metavar='<action>', choices=('stats', 'prune'),
+             help='"stats" reports the size of the response cache, "prune" '
+             'removes expired and least recently used entries')
+    @cli_arg('--all', action='store_true',
+             help='With prune, empty the cache entirely')
+    def cmd_cache(self, args):
+        """Inspect or prune the on-disk response cache"""
+        from imgur_cli.cache import ResponseCache
+
+        cache = ResponseCache(cache_path(HTTP_CACHE_DIR))
+        if args.action == 'stats':
+            generate_output({'cache': cache.stats()})
+        else:
+            generate_output({'removed': cache.prune(clear=args.all)})
+
+    @cli_arg('--kind', default=None, choices=('image', 'album', 'comment'),
+             help='Only this kind of item')
+    @cli_arg('--account', default=None, metavar='<username>',
+             help='Only items of this account')
+    @cli_arg('--section', default=None, metavar='<section>',
+             help='Only items listed in this gallery section or subreddit')
+    @cli_arg('--tag', default=None, metavar='<tag>',
+             help='Only items with this tag')
+    @cli_arg('--gallery', action='store_true', default=None,
+             help='Only items in the gallery')
+    @cli_arg('--since', default=None, metavar='<time>',
+             help='Only items posted since a date (2016-01-31, UTC), a '
+             'duration ago (24h, 7d, 2w) or within the last day, week, month '
+             'or year')
+    @cli_arg('--until', default=None, metavar='<time>',
+             help='Only items posted before this time, given like --since')
+    @cli_arg('--sort', default='datetime',
+             choices=('datetime', 'views', 'score', 'ups', 'downs',
+                      'comment_count', 'stored'),
+             help='Sort by this field, highest first (defaults to %(default)s)')
+    @cli_arg('--ascending', action='store_true', help='Sort lowest first')
+    @cli_arg('--limit', default=100, type=int, metavar='<n>',
+             help='Output at most <n> items (defaults to %(default)s, 0 for no '
+             'limit)')
+    @cli_arg('--sql', default=None, metavar='<select>',
+             help='Run a read-only SQL statement against the items and tags '
+             'tables instead')
+    def cmd_query(self, args):
+        """
+        Query the images, albums and comments saved by --store, without making
+        a network call
+        """
+        from imgur_cli import store
+
+        item_store = store.Store(args.store_file or cache_path(STORE_FILE),
+                                 create=False)
+        try:
+            if args.sql:
+                generate_output({'rows': item_store.execute(args.sql)})
+                return
+            since = args.since and store.parse_since(args.since)
+            until = args.until and store.parse_since(args.until)
+            items = item_store.query(kind=args.kind, account=args.account,
+                                     section=args.section, tag=args.tag,
+                                     since=since, until=until,
+                                     gallery=args.gallery, sort=args.sort,
+                                     ascending=args.ascending,
+                                     limit=args.limit or None)
+            generate_output({'items': items})
+        finally:
+            item_store.close()
+
+    @cli_arg('--socket', default=None, metavar='<path>',
+             help='Serve commands on a Unix socket instead of reading stdin. '
+             'Point IMGUR_SHELL_SOCKET at it to have "imgur" forward commands '
+             'to this process')
+    def cmd_shell(self, args):
+        """
+        Run commands read from stdin (or a Unix socket) in one long-lived process,
+        reusing the parser, client and HTTP connections between commands
+        """
+        from imgur_cli import shell
+
+        if args.socket:
+            return shell.serve(self, args.socket)
+        return shell.run_shell(self)
+
+    def dispatch(self, args, argv):
+        """Invoke the callback selected by parsed args"""
+        if not hasattr(args, 'func'):
+            self.subparsers[self._command_tokens(argv)[0]]['parser'].print_help()
             return 0
-        args = self.parser.parse_args(argv)
+        output.configure(format=args.format or 'json', fields=args.fields,
+                         where=args.where)
+        concurrency.configure(engine=args.engine)
+        # Commands implemented by ImgurCli (help, shell, ...) need no client
+        if getattr(args.func, '__self__', None) is self:
+            with self.profiler.phase('command'):
+                return args.func(args)
+        request_metrics = None
+        if args.metrics:
+            command = ' '.join(self._command_tokens(argv)[:2])
+            request_metrics = metrics.RequestMetrics(command)
+        if self.client is None:
+            with self.profiler.phase('imports'):
+                # imgurpython and requests, loaded here to time them apart
+                from imgur_cli import client  # noqa: F401
+            self.profiler.instrument()
+            with self.profiler.phase('credentials'):
+                credentials = imgur_credentials()
+            with self.profiler.phase('client'):
+                self.client = imgur_client(credentials, request_metrics,
+                                           args.timeout)
+        self.client.metrics = request_metrics
+        self.client.timeout = args.timeout
+        self.client.retry.attempts = max(args.retries, 0) + 1
+        if args.cache is None:
+            args.cache = os.environ.get('IMGUR_CLI_CACHE', '') not in ('', '0')
+        self.client.cache.enabled = args.cache
+        self.client.cache.refresh = args.refresh
+        store = self._open_store(args)
+        try:
+            with self.profiler.phase('command'):
+                return args.func(self.client, args)
+        finally:
+            if store is not None:
+                output.record_to(None)
+                store.close()
+            if request_metrics is not None:
+                request_metrics.write(args.metrics, args.metrics_file)
+
+    def _open_store(self, args):
+        """With --store, open the store and have output record into it"""
+        if args.store is None:
+            args.store = os.environ.get('IMGUR_CLI_STORE', '') not in ('', '0')
+        if not args.store:
+            return None
+        from imgur_cli.store import Store
+
+        context = {'account': getattr(args, 'username', None),
+                   'section': (getattr(args, 'section', None) or
+                               getattr(args, 'subreddit', None))}
+        store = Store(args.store_file or cache_path(STORE_FILE), context)
+        output.record_to(store)
+        return store
+
+    def run(self, argv):
+        """
+        Run one command line against the already generated parser, returning its
+        exit status instead of raising. Used by the shell and daemon
+        """
         try:
-            # Short-circuit and deal with help right away
-            if args.func == self.cmd_help:
-                self.cmd_help(args)
+            options = profiling.requested(argv)
+            if options is not None:
+                status = profiling.run(self, self._run, argv, options)
+            else:
+                status = self._run(argv)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception as e:
+            report_error(e)
+            return 1
+        return status or 0
+
+    def _run(self, argv):
+        with self.profiler.phase('parser'):
+            args = self.parser.parse_args(argv)
+        if getattr(args, 'func', None) == self.cmd_shell:
+            raise exceptions.CommandError('shell cannot be nested')
+        return self.dispatch(args, argv)
+
+    def main(self, argv):
+        options = profiling.requested(argv)
+        if options is not None:
+            global _import_time
+            import_time, _import_time = _import_time, None
+            return profiling.run(self, self._main, argv, options, import_time)
+        return self._main(argv)
+
+    def _main(self, argv):
+        with self.profiler.phase('parser'):
+            self.generate_parser(argv)
+            if not argv:
+                self.parser.print_help()
                 return 0
-            credentials = imgur_credentials()
-            self.client = imgurpython.ImgurClient(*credentials)
-            args.func(self.client, args)
-        except AttributeError:
-            self.subparsers[argv[0]]['parser'].print_help()
+            args = self.parser.parse_args(argv)
+        return self.dispatch(args, argv)
+
+
+def report_error(error):
+    """Print client errors plainly and anything unexpected with a traceback"""
+    if isinstance(error, client_errors()):
+        print(error, file=sys.stderr)
+    else:
+        print(traceback.format_exc())
 
 
 def main():
+    argv = sys.argv[1:]
+    socket_path = os.environ.get('IMGUR_SHELL_SOCKET')
+    if socket_path and argv[:1] != ['shell']:
+        from imgur_cli import shell
+
+        status = shell.forward(socket_path, argv)
+        if status is not None:
+            sys.exit(status)
     try:
         imgur_cli = ImgurCli()
-        imgur_cli.main(sys.argv[1:])
-    except imgurpython.client.ImgurClientError as e:
-        print(e, file=sys.stderr)
-        sys.exit(1)
+        status = imgur_cli.main(argv)
     except Exception as e:
-        print(traceback.format_exc())
+        report_error(e)
         sys.exit(1)
+    sys.exit(status or 0)
 
 if __name__ == '__main__':
     main()
@@ -1,9 +1,10 @@
 import os
 
-import imgurpython
-
 from imgur_cli import exceptions
-from imgur_cli.utils import (cli_arg, cli_subparser, data_fields, generate_output,
+from imgur_cli import output
+from imgur_cli.pagination import paginate
+from imgur_cli.utils import (cache_path, cli_arg, cli_subparser, data_fields,
+                             generate_output, flatten_comment_tree,
                              format_comment_tree)
 from imgur_cli.utils import cli_subparser
 from imgur_cli.utils import data_fields
@@ -18,6 +19,50 @@ SUBPARSERS = {'gallery': 'Gallery subparser', 'album': 'Album subparser',
               'auth': 'Authentication subparser'}
 
 
+def _comment_id(value):
+    return value if value == '-' else int(value)
+
+
+def _lookup(fetch, ids, args, name, plural):
+    """
+    Output fetch(id) for a single ID. For several IDs, or IDs read from stdin,
+    stream one record per ID (NDJSON unless --format says otherwise)
+    """
+    if ids != ['-'] and len(ids) == 1:
+        generate_output({name: fetch(ids[0])})
+        return
+    from imgur_cli import batch
+
+    if args.format is None:
+        output.configure(format='ndjson', fields=args.fields, where=args.where)
+    records = batch.fetch_many(fetch, batch.read_ids(ids), args.workers)
+    generate_output({plural: records})
+
+
+def _follow(fetch, args, name):
+    """
+    Poll fetch(page) until interrupted and stream the items not seen before
+    (NDJSON unless --format says otherwise)
+    """
+    from imgur_cli import follow
+
+    if args.all_pages:
+        raise exceptions.CommandError('--follow cannot be combined with '
+                                      '--all-pages')
+    if args.format is None:
+        output.configure(format='ndjson', fields=args.fields, where=args.where)
+    follower = follow.Follower(
+        lambda page: [item.__dict__ for item in fetch(page)], page=args.page,
+        interval=args.interval, max_interval=args.max_interval,
+        seen=follow.SeenSet(args.seen),
+        catch_up=args.max_pages or follow.CATCH_UP_PAGES)
+    try:
+        generate_output({name: follower.follow(args.max_items)},
+                        args.output_file)
+    except KeyboardInterrupt:
+        pass
+
+
 @cli_subparser('account')
 @cli_arg('username', help='Username of Account')
 def cmd_account_user(client, args):
@@ -37,7 +82,7 @@ def cmd_account_user(client, args):
 def cmd_account_gallery_favorites(client, args):
     """Return the images the user has favorited in the gallery"""
     gallery_favorites = client.get_gallery_favorites(args.username)
-    data = [item.__dict__ for item in gallery_favorites]
+    data = (item.__dict__ for item in gallery_favorites)
     generate_output({'gallery_favorites': data}, args.output_file)
 
 
@@ -51,7 +96,7 @@ def cmd_account_favorites(client, args):
     in as the user
     """
     account_favorites = client.get_account_favorites(args.username)
-    data = [item.__dict__ for item in account_favorites]
+    data = (item.__dict__ for item in account_favorites)
     generate_output({'account_favorites': data}, args.output_file)
 
 
@@ -59,12 +104,19 @@ def cmd_account_favorites(client, args):
 @cli_arg('username', help='Username of Account')
 @cli_arg('--page', default=0, metavar='<page>', type=int,
          help='The data paging number (defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
 def cmd_account_submissions(client, args):
     """Return the images a user has submitted to the gallery"""
-    account_submissions = client.get_account_submissions(args.username, args.page)
-    data = [item.__dict__ for item in account_submissions]
+    account_submissions = paginate(
+        lambda page: client.get_account_submissions(args.username, page), args)
+    data = (item.__dict__ for item in account_submissions)
     generate_output({'account_submissions': data}, args.output_file)
 
 
@@ -128,6 +180,12 @@ def cmd_account_send_verification(client, args):
 @cli_arg('username', help='Username of Account')
 @cli_arg('--page', default=0, metavar='<page>', type=int,
          help='Page number (defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
 def cmd_account_albums(client, args):
@@ -135,8 +193,9 @@ def cmd_account_albums(client, args):
     Get all the albums associated with the account. Must be logged in as the user
     to see secret and hidden albums
     """
-    account_albums = client.get_account_albums(args.username, args.page)
-    data = [item.__dict__ for item in account_albums]
+    account_albums = paginate(
+        lambda page: client.get_account_albums(args.username, page), args)
+    data = (item.__dict__ for item in account_albums)
     generate_output({'account_albums': data}, args.output_file)
 
 
@@ -165,11 +224,26 @@ def cmd_account_album_count(client, args):
          help='best | worst | oldest | newest - defaults to %(default)s')
 @cli_arg('--page', default=0, metavar='<page>', type=int,
          help='Page number (defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
+@cli_arg('--max-depth', default=None, metavar='<max_depth>', type=int,
+         help='Leave out replies nested deeper than this (each comment is at '
+         'depth 0)')
+@cli_arg('--max-comments', default=None, metavar='<max_comments>', type=int,
+         help='Stop after this many comments')
+@cli_arg('--flat', action='store_true',
+         help='Output one record per comment, with its parent_id and depth, '
+         'instead of nesting replies')
 def cmd_account_comments(client, args):
     """Return the comments the user has created"""
-    account_comments = client.get_account_comments(args.username, args.sort,
-                                                   args.page)
-    data = format_comment_tree(account_comments)
+    account_comments = paginate(
+        lambda page: client.get_account_comments(args.username, args.sort, page),
+        args)
+    data = _format_comments(account_comments, args)
     generate_output({'account_comments': data})
 
 
@@ -199,12 +273,19 @@ def cmd_account_comment_count(client, args):
 @cli_arg('username', help='Username of Account')
 @cli_arg('--page', default=0, metavar='<page>', type=int,
          help='Page number (defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
 def cmd_account_images(client, args):
     """Return all of the images associated with the account"""
-    account_images = client.get_account_images(args.username, args.page)
-    data = [item.__dict__ for item in account_images]
+    account_images = paginate(
+        lambda page: client.get_account_images(args.username, page), args)
+    data = (item.__dict__ for item in account_images)
     generate_output({'account_images': data}, args.output_file)
 
 
@@ -226,13 +307,44 @@ def cmd_account_image_count(client, args):
     generate_output({'account_image_count': account_image_count})
 
 
+@cli_subparser('account')
+@cli_arg('username', help='Username of Account')
+@cli_arg('--snapshot', default=None, metavar='<path>',
+         help='Snapshot of the last sync (defaults to snapshots/<username>.json '
+         'in the cache directory)')
+@cli_arg('--only', default=None, choices=['images', 'albums'],
+         help='Only sync images or albums')
+@cli_arg('--workers', default=8, metavar='<workers>', type=int,
+         help='Number of concurrent metadata lookups (defaults to %(default)s)')
+@cli_arg('--concurrency', default=4, metavar='<concurrency>', type=int,
+         help='Number of ID pages fetched at once (defaults to %(default)s)')
+@cli_arg('--dry-run', action='store_true',
+         help='Report the changes without updating the snapshot')
+def cmd_account_sync(client, args):
+    """
+    Report the images and albums added to or removed from the account since the
+    last sync, fetching metadata for new items only
+    """
+    from imgur_cli import sync
+
+    kinds = [kind for kind in sync.account_kinds(client, args.username)
+             if args.only in (None, kind.name + 's')]
+    snapshot = args.snapshot or cache_path(
+        os.path.join('snapshots', '{0}.json'.format(args.username)))
+    changes = sync.sync(kinds, snapshot, args.workers, args.concurrency,
+                        args.dry_run)
+    generate_output({'changes': changes})
+
+
 @cli_subparser('album')
-@cli_arg('album_id', help='Album ID')
+@cli_arg('album_id', nargs='+', help='Album ID(s), "-" reads them from stdin')
+@cli_arg('--workers', default=8, metavar='<workers>', type=int,
+         help='Number of concurrent lookups for many IDs (defaults to '
+         '%(default)s)')
 def cmd_album_id(client, args):
-    """Get information about a specific album"""
-    album = client.get_album(args.album_id)
-    data = album.__dict__
-    generate_output({'album': data})
+    """Get information about one or more albums"""
+    _lookup(lambda album_id: client.get_album(album_id).__dict__, args.album_id,
+            args, 'album', 'albums')
 
 
 @cli_subparser('album')
@@ -242,10 +354,30 @@ def cmd_album_id(client, args):
 def cmd_album_images(client, args):
     """Return all of the images in the album"""
     album_images = client.get_album_images(args.album_id)
-    data = [item.__dict__ for item in album_images]
+    data = (item.__dict__ for item in album_images)
     generate_output({'album_images': data}, args.output_file)
 
 
+@cli_subparser('album')
+@cli_arg('album_id', help='Album ID')
+@cli_arg('--directory', default='.', metavar='<directory>',
+         help='Directory to save the images in (defaults to the current one)')
+@cli_arg('--workers', default=4, metavar='<workers>', type=int,
+         help='Number of concurrent downloads (defaults to %(default)s)')
+def cmd_album_download(client, args):
+    """
+    Download every image of the album. Files already present that still match
+    the server's size and ETag are skipped
+    """
+    from imgur_cli import download
+
+    album_images = client.get_album_images(args.album_id)
+    images = (item.__dict__ for item in album_images)
+    downloads = download.download_many(client.session, images, args.directory,
+                                       args.workers, client.timeout)
+    generate_output({'downloads': downloads})
+
+
 @cli_subparser('album')
 @cli_arg('--ids', metavar='<ids>', help='Comma separated list of image ids that you '
          'want to be included in the album; you have to be logged in as the user '
@@ -372,13 +504,22 @@ def cmd_album_remove_images(client, args):
     generate_output({'remove_images': remove_images})
 
 
+def _format_comments(comments, args):
+    if args.flat:
+        return flatten_comment_tree(comments, args.max_depth, args.max_comments)
+    return format_comment_tree(comments, args.max_depth, args.max_comments)
+
+
 @cli_subparser('comment')
-@cli_arg('comment_id', type=int, help='Comment ID')
+@cli_arg('comment_id', nargs='+', type=_comment_id,
+         help='Comment ID(s), "-" reads them from stdin')
+@cli_arg('--workers', default=8, metavar='<workers>', type=int,
+         help='Number of concurrent lookups for many IDs (defaults to '
+         '%(default)s)')
 def cmd_comment_id(client, args):
-    """Get information about a specific comment"""
-    comment = client.get_comment(args.comment_id)
-    data = comment.__dict__
-    generate_output({'comment': data})
+    """Get information about one or more comments"""
+    _lookup(lambda comment_id: client.get_comment(int(comment_id)).__dict__,
+            args.comment_id, args, 'comment', 'comments')
 
 
 @cli_subparser('comment')
@@ -393,10 +534,18 @@ def cmd_comment_delete(client, args):
 @cli_arg('comment_id', type=int, help='Comment ID')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
+@cli_arg('--max-depth', default=None, metavar='<max_depth>', type=int,
+         help='Leave out replies nested deeper than this (the comment itself is '
+         'at depth 0)')
+@cli_arg('--max-comments', default=None, metavar='<max_comments>', type=int,
+         help='Stop after this many comments')
+@cli_arg('--flat', action='store_true',
+         help='Output one record per comment, with its parent_id and depth, '
+         'instead of nesting replies')
 def cmd_comment_replies(client, args):
     """Get the comment with all of the replies for the comment"""
     comment_replies = client.get_comment_replies(args.comment_id)
-    data = format_comment_tree(comment_replies)
+    data = _format_comments(comment_replies, args)
     generate_output({'comment_replies': data}, args.output_file)
 
 
@@ -435,7 +584,7 @@ def cmd_comment_report(client, args):
 def cmd_conversation_list(client, args):
     """Get list of all conversations for the logged in user"""
     conversation_list = client.conversation_list()
-    data = [item.__dict__ for item in conversation_list]
+    data = (item.__dict__ for item in conversation_list)
     generate_output({'conversation_list': data}, args.output_file)
 
 
@@ -454,10 +603,10 @@ def cmd_conversation_id(client, args):
                                            args.page, args.offset)
     data = conversation.__dict__
     try:
-        data['messages'] = [item.__dict__ for item in data['messages']]
+        data['messages'] = (item.__dict__ for item in data['messages'])
     except KeyError:
         pass
-    generate_output({'conversation': data})
+    generate_output({'conversation': data}, args.output_file)
 
 
 @cli_subparser('conversation')
@@ -510,13 +659,41 @@ def cmd_conversation_block(client, args):
          'day | week | month | year | all (Defaults to %(default)s)')
 @cli_arg('--show-viral', action='store_true', help='Show or hide viral images '
          'from the "user" section (Defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
+@cli_arg('--concurrency', default=None, metavar='<concurrency>', type=int,
+         help='With --all-pages, fetch this many pages at once and report page '
+         'throughput and latency on stderr')
+@cli_arg('--follow', action='store_true',
+         help='Keep polling the page until interrupted and output only the '
+         'items not seen before, as NDJSON unless --format is given. With '
+         '--follow, --max-items stops after that many items and --max-pages '
+         'caps the pages fetched per poll when every item on a page is new')
+@cli_arg('--interval', default=60, metavar='<seconds>', type=float,
+         help='With --follow, seconds between polls while new items keep '
+         'coming (defaults to %(default)s)')
+@cli_arg('--max-interval', default=600, metavar='<seconds>', type=float,
+         help='With --follow, the interval doubles after every poll without '
+         'new items up to this many seconds (defaults to %(default)s)')
+@cli_arg('--seen', default=10000, metavar='<n>', type=int,
+         help='With --follow, remember the IDs of the last <n> items seen '
+         '(defaults to %(default)s)')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
 def cmd_gallery_items(client, args):
     """View items in the gallery"""
-    gallery = client.gallery(args.section, args.sort, args.page, args.window,
-                             args.show_viral)
-    data = [item.__dict__ for item in gallery]
+    def fetch(page):
+        return client.gallery(args.section, args.sort, page, args.window,
+                              args.show_viral)
+    if args.follow:
+        _follow(fetch, args, 'gallery')
+        return
+    gallery = paginate(fetch, args)
+    data = (item.__dict__ for item in gallery)
     generate_output({'gallery': data}, args.output_file)
 
 
@@ -535,7 +712,7 @@ def cmd_gallery_items(client, args):
 def cmd_gallery_memes_subgallery(client, args):
     """View images for memes subgallery"""
     memes_subgallery = client.memes_subgallery(args.sort, args.page, args.window)
-    data = [item.__dict__ for item in memes_subgallery]
+    data = (item.__dict__ for item in memes_subgallery)
     generate_output({'memes_subgallery': data}, args.output_file)
 
 
@@ -550,13 +727,23 @@ def cmd_gallery_memes_subgallery(client, args):
          choices=['day', 'week', 'month', 'year', 'all'],
          help='Change the date range of the request if the sort is "top", '
          'day | week | month | year | all (Defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
+@cli_arg('--concurrency', default=None, metavar='<concurrency>', type=int,
+         help='With --all-pages, fetch this many pages at once and report page '
+         'throughput and latency on stderr')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
 def cmd_gallery_subreddit_gallery(client, args):
     """View gallery images for a subreddit"""
-    subreddit_gallery = client.subreddit_gallery(args.subreddit, args.sort,
-                                                 args.window, args.page)
-    data = [item.__dict__ for item in subreddit_gallery]
+    subreddit_gallery = paginate(
+        lambda page: client.subreddit_gallery(args.subreddit, args.sort,
+                                              args.window, page), args)
+    data = (item.__dict__ for item in subreddit_gallery)
     generate_output({'subreddit_gallery': data}, args.output_file)
 
 
@@ -587,8 +774,8 @@ def cmd_gallery_tag(client, args):
     """View images for a gallery tag"""
     gallery_tag = client.gallery_tag(args.tag, args.sort, args.page, args.window)
     data = gallery_tag.__dict__
-    data['items'] = [item.__dict__ for item in data['items']]
-    generate_output({'gallery_tag': data})
+    data['items'] = (item.__dict__ for item in data['items'])
+    generate_output({'gallery_tag': data}, args.output_file)
 
 
 @cli_subparser('gallery')
@@ -606,7 +793,7 @@ def cmd_gallery_tag_image(client, args):
 def cmd_gallery_item_tags(client, args):
     """View tags for a gallery item"""
     gallery_item_tags = client.gallery_item_tags(args.item_id)
-    data = [item.__dict__ for item in gallery_item_tags]
+    data = (item.__dict__ for item in gallery_item_tags)
     generate_output({'gallery_item_tags': data})
 
 
@@ -638,6 +825,15 @@ def cmd_gallery_tag_vote(client, args):
          choices=['day', 'week', 'month', 'year', 'all'],
          help='Change the date range of the request if the sort is "top", '
          'day | week | month | year | all (Defaults to %(default)s)')
+@cli_arg('--all-pages', action='store_true',
+         help='Fetch every page from --page onwards until an empty page')
+@cli_arg('--max-pages', default=None, metavar='<max_pages>', type=int,
+         help='With --all-pages, stop after this many pages')
+@cli_arg('--max-items', default=None, metavar='<max_items>', type=int,
+         help='With --all-pages, stop after this many items')
+@cli_arg('--concurrency', default=None, metavar='<concurrency>', type=int,
+         help='With --all-pages, fetch this many pages at once and report page '
+         'throughput and latency on stderr')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
 def cmd_gallery_search(client, args):
@@ -646,9 +842,10 @@ def cmd_gallery_search(client, args):
         config = data_fields(args.advanced, client.allowed_advanced_search_fields)
     else:
         config = None
-    gallery_search = client.gallery_search(args.q, config, args.sort,
-                                           args.window, args.page)
-    data = [item.__dict__ for item in gallery_search]
+    gallery_search = paginate(
+        lambda page: client.gallery_search(args.q, config, args.sort, args.window,
+                                           page), args)
+    data = (item.__dict__ for item in gallery_search)
     generate_output({'gallery_search': data}, args.output_file)
 
 
@@ -661,7 +858,7 @@ def cmd_gallery_search(client, args):
 def cmd_gallery_random(client, args):
     """View a random set of gallery items"""
     gallery_random = client.gallery_random(args.page)
-    data = [item.__dict__ for item in gallery_random]
+    data = (item.__dict__ for item in gallery_random)
     generate_output({'gallery_random': data}, args.output_file)
 
 
@@ -690,12 +887,15 @@ def cmd_gallery_remove(client, args):
 
 
 @cli_subparser('gallery')
-@cli_arg('item_id', help='Gallery item ID')
+@cli_arg('item_id', nargs='+', help='Gallery item ID(s), "-" reads them from '
+         'stdin')
+@cli_arg('--workers', default=8, metavar='<workers>', type=int,
+         help='Number of concurrent lookups for many IDs (defaults to '
+         '%(default)s)')
 def cmd_gallery_item(client, args):
-    """View item in a gallery"""
-    gallery_item = client.gallery_item(args.item_id)
-    data = gallery_item.__dict__
-    generate_output({'gallery_item': data})
+    """View one or more items in a gallery"""
+    _lookup(lambda item_id: client.gallery_item(item_id).__dict__, args.item_id,
+            args, 'gallery_item', 'gallery_items')
 
 
 @cli_subparser('gallery')
@@ -725,10 +925,18 @@ def cmd_gallery_item_vote(client, args):
          help='best | top | new - defaults to %(default)s')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
+@cli_arg('--max-depth', default=None, metavar='<max_depth>', type=int,
+         help='Leave out replies nested deeper than this (top-level comments '
+         'are at depth 0)')
+@cli_arg('--max-comments', default=None, metavar='<max_comments>', type=int,
+         help='Stop after this many comments')
+@cli_arg('--flat', action='store_true',
+         help='Output one record per comment, with its parent_id and depth, '
+         'instead of nesting replies')
 def cmd_gallery_comments(client, args):
     """Get comments on an item in the gallery"""
     gallery_comments = client.gallery_item_comments(args.item_id, args.sort)
-    data = format_comment_tree(gallery_comments)
+    data = _format_comments(gallery_comments, args)
     generate_output({'gallery_comments': data}, args.output_file)
 
 
@@ -757,19 +965,22 @@ def cmd_gallery_comment_count(client, args):
 
 
 @cli_subparser('image')
-@cli_arg('image_id', help='Image ID')
+@cli_arg('image_id', nargs='+', help='Image ID(s), "-" reads them from stdin')
+@cli_arg('--workers', default=8, metavar='<workers>', type=int,
+         help='Number of concurrent lookups for many IDs (defaults to '
+         '%(default)s)')
 def cmd_image_id(client, args):
-    """Get information about an image"""
-    image = client.get_image(args.image_id)
-    data = image.__dict__
-    generate_output({'image': data})
+    """Get information about one or more images"""
+    _lookup(lambda image_id: client.get_image(image_id).__dict__, args.image_id,
+            args, 'image', 'images')
 
 
 @cli_subparser('image')
 @cli_arg('type', choices=['file', 'url'],
          help="The type of the file that's being sent; file, base64 or URL")
 @cli_arg('image', help='A binary file, base64 data, or a URL for an image '
-                       '(up to 10MB)')
+                       '(up to 10MB). For files, a directory, a glob pattern or '
+                       '"-" (one path per line on stdin) uploads many files')
 @cli_arg('--name', metavar='<name>', help='The name of the file, '
          'this is automatically detected if uploading a file with a POST and '
          'multipart / form-data')
@@ -778,9 +989,27 @@ def cmd_image_id(client, args):
          help='The id of the album you want to add the image to')
 @cli_arg('--description', metavar='<description>',
          help='The description of the image')
+@cli_arg('--workers', default=4, metavar='<workers>', type=int,
+         help='Number of concurrent uploads when uploading many files '
+         '(defaults to %(default)s)')
+@cli_arg('--manifest', default=None, metavar='<manifest>',
+         help='JSON lines file recording path, hash, id, deletehash and link of '
+         'every uploaded file. Files already in it are skipped, so an '
+         'interrupted upload can be resumed. Defaults to .imgur-uploads.jsonl '
+         'in the directory uploaded; glob patterns and stdin are only '
+         'resumable with --manifest')
 def cmd_image_upload(client, args):
     """Upload a new image"""
+    from imgur_cli import upload
+
     config = data_fields(args, client.allowed_image_fields)
+    if args.type == 'file' and upload.is_bulk(args.image):
+        paths = upload.expand_paths(args.image)
+        manifest = upload.Manifest(args.manifest or
+                                   upload.default_manifest(args.image))
+        uploads = upload.upload_many(client, paths, config, args.workers, manifest)
+        generate_output({'uploads': uploads})
+        return
     if args.type == 'file':
         image = client.upload_from_path(args.image, config)
     else:
@@ -817,8 +1046,14 @@ def cmd_image_favorite(client, args):
 def cmd_memegen_default_memes(client, args):
     """Get the list of default memes"""
     default_memes = client.default_memes()
-    data = [item.__dict__ for item in default_memes]
-    generate_output({'default_memes': args.output_file})
+    data = (item.__dict__ for item in default_memes)
+    generate_output({'default_memes': data}, args.output_file)
+
+
+def _format_reply(reply, args):
+    formatted_reply = reply.__dict__
+    formatted_reply['content'] = _format_comments(formatted_reply['content'], args)
+    return formatted_reply
 
 
 @cli_subparser('notification')
@@ -827,17 +1062,21 @@ def cmd_memegen_default_memes(client, args):
          'notification (defaults to %(default)s)')
 @cli_arg('--output-file', default=None, metavar='<output_file>',
          help='Save output to a JSON file')
+@cli_arg('--max-depth', default=None, metavar='<max_depth>', type=int,
+         help='Leave out replies nested deeper than this (the reply itself is '
+         'at depth 0)')
+@cli_arg('--max-comments', default=None, metavar='<max_comments>', type=int,
+         help='Stop after this many comments of each reply')
+@cli_arg('--flat', action='store_true',
+         help='Output one record per comment, with its parent_id and depth, '
+         'instead of nesting replies')
 def cmd_notification_all(client, args):
     """Get all notifications for the user that's currently logged in"""
     notifications_all = client.get_notifications(args.new)
-    notifications_all['messages'] = [message.__dict__ for message in
-                                     notifications_all['messages']]
-    formatted_replies = []
-    for reply in notifications_all['replies']:
-        formatted_reply = reply.__dict__
-        formatted_reply['content'] = format_comment_tree(formatted_reply['content'])
-        formatted_replies.append(formatted_reply)
-    notifications_all['replies'] = formatted_replies
+    notifications_all['messages'] = (message.__dict__ for message in
+                                     notifications_all['messages'])
+    notifications_all['replies'] = (_format_reply(reply, args) for reply in
+                                    notifications_all['replies'])
     generate_output({'notifications_all': notifications_all}, args.output_file)
 
 
@@ -884,6 +1123,7 @@ def cmd_auth_set_user_auth(client, args):
     credentials = client.authorize(args.pin, 'pin')
     access_token = credentials['access_token']
     refresh_token = credentials['refresh_token']
-    client.set_user_auth(access_token, refresh_token)
+    client.set_user_auth(access_token, refresh_token,
+                         credentials.get('expires_in'))
     print('Authorization done!\n\tAccess Token: {0}\n\tRefresh Token: {1}'
           .format(access_token, refresh_token))
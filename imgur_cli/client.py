@@ -0,0 +1,430 @@
+"""
+ImgurClient used by the CLI.
+
+imgurpython sends every request through the module level requests.get/post/...
+helpers, which open a new TCP+TLS connection each time. This subclass routes all
+traffic, including OAuth token refreshes, through one pooled keep-alive
+requests.Session, and uploads files as multipart bodies streamed from disk.
+Unlike imgurpython's, creating a client sends no GET /credits request.
+"""
+
+import contextvars
+import time
+
+import imgurpython
+import requests
+
+from imgurpython.client import API_URL, MASHAPE_URL, AuthWrapper
+from imgurpython.imgur.models.comment import Comment
+from imgurpython.imgur.models.notification import Notification
+from imgurpython.helpers.error import ImgurClientError, ImgurClientRateLimitError
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from imgur_cli.multipart import MultipartBody
+from imgur_cli.ratelimit import RateLimiter
+from imgur_cli.retry import RetryPolicy
+
+POOL_SIZE = 10
+CONNECT_RETRIES = 3
+# Seconds to wait for a connection, and for each read of the response after it
+TIMEOUT = (10.0, 60.0)
+# Failures of a request that may be retried by the RetryPolicy
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError)
+
+# Responses handed back by send_request while the async engine replays a call,
+# see imgur_cli.aio
+REPLAY = contextvars.ContextVar('replay', default=None)
+# Whether the engine already refreshed the access token for the replayed call
+REFRESHED = contextvars.ContextVar('refreshed', default=False)
+
+
+class CapturedRequest(BaseException):
+    """
+    Raised by send_request during a replay for a request that has no response
+    yet. It derives from BaseException so that no "except Exception" between
+    the client and the engine swallows it
+    """
+
+    def __init__(self, client, method, url, headers, data=None):
+        super().__init__(method, url)
+        self.client = client
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.data = data
+
+
+class RefreshNeeded(BaseException):
+    """
+    Raised by make_request during a replay when the access token was refused.
+    The engine refreshes it once, off the event loop, and runs the call again
+    instead of the call refreshing it synchronously on every replay
+    """
+
+    def __init__(self, client, access_token):
+        super().__init__(access_token)
+        self.client = client
+        self.access_token = access_token
+
+
+def create_session(pool_size=POOL_SIZE, connect_retries=CONNECT_RETRIES):
+    """
+    Create a keep-alive session able to hold pool_size connections per host.
+    Only connection failures are retried: the request never reached the server,
+    so replaying it is safe for every HTTP method. Everything else, including
+    Retry-After, is left to the client's RetryPolicy
+    """
+    retries = Retry(total=connect_retries, connect=connect_retries, read=0,
+                    status=0, redirect=0, backoff_factor=0.1,
+                    respect_retry_after_header=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retries)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def build_comments(response):
+    """
+    imgurpython's format_comment_tree without the recursion: wrap a comment or a
+    list of comments and all of their nested replies in Comment objects
+    """
+    comments = [Comment(item) for item in
+                (response if isinstance(response, list) else [response])]
+    stack = list(comments)
+    while stack:
+        comment = stack.pop()
+        comment.children = [Comment(child) for child in comment.children]
+        stack.extend(comment.children)
+    return comments if isinstance(response, list) else comments[0]
+
+
+def build_notification(item, replies=False):
+    """
+    imgurpython's build_notification with the comment of a reply wrapped by
+    build_comments instead of its recursive format_comment_tree
+    """
+    notification = Notification(item['id'], item['account_id'], item['viewed'],
+                                item['content'])
+    if replies or 'comment' in notification.content:
+        notification.content = build_comments(item['content'])
+    return notification
+
+
+def build_response(status_code, url, headers, content):
+    """Build a requests.Response from a response received some other way"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.encoding = 'utf-8'
+    return response
+
+
+def cached_response(entry, url, headers=None):
+    """Rebuild a requests.Response from a cache entry"""
+    response = build_response(200, url, entry['headers'],
+                              entry['body'].encode('utf-8'))
+    response.headers.update(headers or {})
+    return response
+
+
+class SessionAuthWrapper(AuthWrapper):
+    """
+    AuthWrapper refreshing the access token through the client's session. With
+    a token_store, access tokens are shared with other runs and processes
+    """
+
+    def __init__(self, session, access_token, refresh_token, client_id,
+                 client_secret, api_url=API_URL, token_store=None, metrics=None,
+                 timeout=TIMEOUT):
+        super().__init__(access_token, refresh_token, client_id, client_secret)
+        self.session = session
+        self.api_url = api_url
+        self.token_store = token_store
+        self.metrics = metrics
+        self.timeout = timeout
+
+    def ensure_fresh(self):
+        """
+        Adopt the stored access token, refreshing it first if it is about to
+        expire. Without a stored token the given one is kept, unless there is
+        none at all
+        """
+        entry = self.token_store.load(self.refresh_token)
+        if self.token_store.is_fresh(entry):
+            self.current_access_token = entry['access_token']
+        elif entry is not None or self.current_access_token is None:
+            self.refresh()
+
+    def remember(self, token_data):
+        """Store the access token of an OAuth token response"""
+        if self.token_store is not None:
+            with self.token_store.locked():
+                self.token_store.save(self.refresh_token, token_data)
+
+    def refresh(self):
+        if self.token_store is None:
+            self.request_token()
+            return
+        with self.token_store.locked():
+            # Another process may have refreshed while this one waited
+            entry = self.token_store.load(self.refresh_token)
+            if (self.token_store.is_fresh(entry) and
+                    entry['access_token'] != self.current_access_token):
+                self.current_access_token = entry['access_token']
+                return
+            self.token_store.save(self.refresh_token, self.request_token())
+
+    def request_token(self):
+        """Exchange the refresh token for a new access token"""
+        data = {
+            'refresh_token': self.refresh_token,
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'grant_type': 'refresh_token'
+        }
+        url = self.api_url + 'oauth2/token'
+        started = time.perf_counter()
+        response = self.session.post(url, data=data, timeout=self.timeout)
+        if self.metrics is not None:
+            self.metrics.record_response('post', url, response,
+                                         time.perf_counter() - started)
+        if response.status_code != 200:
+            raise ImgurClientError('Error refreshing access token!',
+                                   response.status_code)
+        token_data = response.json()
+        self.current_access_token = token_data['access_token']
+        return token_data
+
+
+class ImgurClient(imgurpython.ImgurClient):
+
+    def __init__(self, client_id, client_secret, access_token=None,
+                 refresh_token=None, mashape_key=None, session=None,
+                 api_url=None, rate_limiter=None, cache=None, token_store=None,
+                 metrics=None, retry=None, timeout=TIMEOUT):
+        self.session = session or create_session()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retry = retry or RetryPolicy()
+        self.cache = cache
+        self.token_store = token_store
+        self._metrics = metrics
+        self._timeout = timeout
+        self.api_url = api_url or (MASHAPE_URL if mashape_key is not None
+                                   else API_URL)
+        # Not imgurpython's __init__, which spends a request of every run on
+        # GET /credits: the credits the rate limiter saved stand in for them
+        # until the first response reports the current ones
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.mashape_key = mashape_key
+        self.auth = None
+        self.credits = {key: None if value is None else str(value)
+                        for key, value in self.rate_limiter.credits.items()}
+        if refresh_token is not None:
+            self.set_user_auth(access_token, refresh_token)
+            if token_store is not None:
+                self.auth.ensure_fresh()
+
+    def set_user_auth(self, access_token, refresh_token, expires_in=None):
+        """
+        Act on behalf of a user. When expires_in is known, the access token is
+        also stored for later runs
+        """
+        self.auth = SessionAuthWrapper(self.session, access_token, refresh_token,
+                                       self.client_id, self.client_secret,
+                                       self.api_url, self.token_store,
+                                       self.metrics, self.timeout)
+        if expires_in is not None:
+            self.auth.remember({'access_token': access_token,
+                                'expires_in': expires_in})
+
+    @property
+    def metrics(self):
+        """RequestMetrics recording every request sent, or None"""
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+        if self.auth is not None:
+            self.auth.metrics = metrics
+
+    @property
+    def timeout(self):
+        """
+        Seconds to wait for a connection and for each read of a response, as a
+        (connect, read) pair
+        """
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._timeout = timeout
+        if self.auth is not None:
+            self.auth.timeout = timeout
+
+    def build_url(self, route):
+        return self.api_url + ('3/%s' % route if 'oauth2' not in route else route)
+
+    def send(self, method, url, headers, data=None):
+        """
+        Send a single HTTP request, answering cacheable GETs from the response
+        cache when it holds a fresh entry and revalidating stale ones
+        """
+        cache = self.cache
+        ttl = None
+        if cache is not None and cache.enabled and method == 'get' and not data:
+            ttl = cache.ttl(url)
+        if ttl is None:
+            return self.send_request(method, url, headers, data)
+
+        key = cache.key(url, headers)
+        entry = cache.get(key)
+        if entry is not None and not cache.refresh and cache.is_fresh(entry):
+            return cached_response(entry, url)
+        if entry is not None:
+            headers = dict(headers, **cache.validators(entry))
+        response = self.send_request(method, url, headers, data)
+        if response.status_code == 304 and entry is not None:
+            entry = cache.renew(key, entry, ttl)
+            return cached_response(entry, url, response.headers)
+        if response.status_code == 200:
+            cache.store(key, url, response.headers, response.text, ttl)
+        return response
+
+    def send_request(self, method, url, headers, data=None):
+        """
+        Send an HTTP request through the session, paced by the limiter. Failed
+        idempotent requests are retried as the retry policy allows
+        """
+        responses = REPLAY.get()
+        if responses is not None:
+            if responses:
+                return responses.popleft()
+            raise CapturedRequest(self, method, url, headers, data)
+        retry = self.retry
+        retries = retry.retries_method(method)
+        attempt = 0
+        while True:
+            try:
+                response = self._send_once(method, url, headers, data, attempt)
+            except RETRY_ERRORS:
+                delay = retry.delay(attempt) if retries else None
+                if delay is None:
+                    raise
+            else:
+                delay = None
+                if retries and response.status_code in retry.statuses:
+                    delay = retry.delay(attempt, response.status_code,
+                                        response.headers)
+                if delay is None:
+                    return response
+            if self.metrics is not None:
+                self.metrics.record_backoff(delay)
+            retry.wait(delay)
+            attempt += 1
+
+    def _send_once(self, method, url, headers, data, attempt=0):
+        if isinstance(data, MultipartBody):
+            # Sent again after a token refresh: start from the top
+            data.seek(0)
+            headers = dict(headers, **{'Content-Type': data.content_type})
+        self.rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            if method in ('delete', 'get'):
+                response = self.session.request(method, url, headers=headers,
+                                                params=data, data=data,
+                                                timeout=self.timeout)
+            else:
+                response = self.session.request(method, url, headers=headers,
+                                                data=data, timeout=self.timeout)
+        except requests.RequestException:
+            if self.metrics is not None:
+                self.metrics.record(method, url, 'error',
+                                    time.perf_counter() - started)
+            raise
+        credits = self.rate_limiter.update(response.headers)
+        if self.metrics is not None:
+            self.metrics.record_response(method, url, response,
+                                         time.perf_counter() - started, credits,
+                                         retried=attempt > 0)
+        return response
+
+    def make_request(self, method, route, data=None, force_anon=False):
+        method = method.lower()
+        url = self.build_url(route)
+
+        response = self.send(method, url, self.prepare_headers(force_anon), data)
+        if response.status_code == 403 and self.auth is not None:
+            if REPLAY.get() is None:
+                self.auth.refresh()
+                response = self.send(method, url, self.prepare_headers(), data)
+            elif not REFRESHED.get():
+                raise RefreshNeeded(self, self.auth.current_access_token)
+
+        self.credits = {
+            'UserLimit': response.headers.get('X-RateLimit-UserLimit'),
+            'UserRemaining': response.headers.get('X-RateLimit-UserRemaining'),
+            'UserReset': response.headers.get('X-RateLimit-UserReset'),
+            'ClientLimit': response.headers.get('X-RateLimit-ClientLimit'),
+            'ClientRemaining': response.headers.get('X-RateLimit-ClientRemaining')
+        }
+
+        if response.status_code == 429:
+            raise ImgurClientRateLimitError()
+
+        try:
+            response_data = response.json()
+        except ValueError:
+            raise ImgurClientError('JSON decoding of response failed.')
+
+        if ('data' in response_data and isinstance(response_data['data'], dict) and
+                'error' in response_data['data']):
+            raise ImgurClientError(response_data['data']['error'],
+                                   response.status_code)
+
+        return response_data['data'] if 'data' in response_data else response_data
+
+    def upload_from_path(self, path, config=None, anon=True):
+        """
+        Upload the file at path, streaming it from disk as a multipart body
+        instead of reading and base64 encoding all of it first
+        """
+        config = config or {}
+        fields = {'type': 'file'}
+        fields.update((meta, config[meta])
+                      for meta in sorted(self.allowed_image_fields)
+                      if meta in config)
+        with MultipartBody(fields, 'image', path) as body:
+            return self.make_request('POST', 'upload', body, anon)
+
+    def get_comment_replies(self, comment_id):
+        replies = self.make_request('GET', 'comment/%d/replies' % comment_id)
+        return build_comments(replies)
+
+    def gallery_item_comments(self, item_id, sort='best'):
+        response = self.make_request('GET', 'gallery/%s/comments/%s' %
+                                     (item_id, sort))
+        return build_comments(response)
+
+    def get_notifications(self, new=True):
+        self.logged_in()
+        response = self.make_request('GET', 'notification',
+                                     {'new': str(new).lower()})
+        return {'messages': [build_notification(item)
+                             for item in response['messages']],
+                'replies': [build_notification(item, replies=True)
+                            for item in response['replies']]}
+
+    def get_notification(self, notification_id):
+        self.logged_in()
+        response = self.make_request('GET', 'notification/%d' % notification_id)
+        return build_notification(response)
@@ -0,0 +1,107 @@
+"""
+Bounded thread pool helpers shared by the commands that issue many requests
+"""
+
+import collections
+import contextvars
+import math
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+ENGINES = ('threads', 'async')
+
+options = {'engine': 'threads'}
+
+# When a call started, for calls the async engine runs more than once
+call_started = contextvars.ContextVar('call_started', default=None)
+
+
+def configure(engine='threads'):
+    """Select the engine used by imap_requests()"""
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine {0}'.format(engine))
+    options['engine'] = engine
+
+
+def imap_ordered(func, iterable, workers):
+    """
+    Lazily yield func(item) for each item of iterable, in order, keeping at most
+    workers calls in flight. iterable may be infinite: nothing past the window is
+    submitted until the consumer asks for it, and closing the generator cancels
+    calls that have not started yet
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        try:
+            for item in iterable:
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def imap_requests(func, iterable, workers):
+    """
+    imap_ordered for functions making client requests, run on the configured
+    engine: a thread pool, or tasks on an asyncio event loop
+    """
+    if options['engine'] == 'async':
+        from imgur_cli import aio
+
+        return aio.imap_ordered(func, iterable, workers)
+    return imap_ordered(func, iterable, workers)
+
+
+class LatencyStats:
+    """Thread-safe collector of call latencies"""
+
+    def __init__(self):
+        self.latencies = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def timed(self, func):
+        """
+        Wrap func so every call records its latency. Calls interrupted by a
+        BaseException (such as a request captured by the async engine, which
+        runs the call again) are not recorded
+        """
+        def _timed(*args, **kwargs):
+            start = call_started.get() or time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.record(time.perf_counter() - start)
+                raise
+            self.record(time.perf_counter() - start)
+            return result
+        return _timed
+
+    def record(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def percentile(self, percent):
+        """Nearest-rank percentile in seconds, or None without samples"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        rank = max(math.ceil(percent / 100.0 * len(latencies)), 1)
+        return latencies[rank - 1]
+
+    def summary(self, unit='requests'):
+        count = len(self.latencies)
+        elapsed = time.perf_counter() - self.started
+        if not count:
+            return '0 {0} in {1:.2f}s'.format(unit, elapsed)
+        return ('{0} {1} in {2:.2f}s ({3:.1f} {1}/s), latency p50 {4:.0f} ms, '
+                'p99 {5:.0f} ms'.format(count, unit, elapsed, count / elapsed,
+                                        self.percentile(50) * 1000,
+                                        self.percentile(99) * 1000))
@@ -0,0 +1,167 @@
+"""
+Concurrent downloads of image files.
+
+Every image is streamed from its link to disk in CHUNK_SIZE pieces through the
+client's pooled session, so memory use does not depend on the size of the file.
+Bodies are written to a .part file that is only renamed into place once
+complete, so re-running an interrupted download only fetches what is missing.
+
+A file already present is only skipped when it still matches the server's copy:
+its size must be the one the API reports (when it reports one) and the
+Content-Length of a HEAD request, and the ETag the server sends must be the
+one recorded when the file was downloaded. The ETags are kept in ETAGS_FILE in
+the download directory.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from requests import RequestException
+
+from imgur_cli.client import TIMEOUT
+from imgur_cli.concurrency import imap_ordered
+
+CHUNK_SIZE = 256 * 1024
+PART_SUFFIX = '.part'
+ETAGS_FILE = '.imgur-etags.json'
+
+
+def file_name(image):
+    """Local name for an image: the last segment of its link"""
+    link = image['link'].split('?', 1)[0]
+    return os.path.basename(link) or image['id']
+
+
+class Throughput:
+    """Thread-safe byte counter reporting the overall transfer rate"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.files = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        with self._lock:
+            self.bytes += size
+            self.files += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        megabytes = self.bytes / (1024 * 1024)
+        return '{0} files, {1:.1f} MB in {2:.2f}s ({3:.1f} MB/s)'.format(
+            self.files, megabytes, elapsed, megabytes / elapsed if elapsed else 0)
+
+
+class ETags:
+    """Thread-safe ETags of the files downloaded into a directory"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ETAGS_FILE)
+        try:
+            with open(self.path) as etags_file:
+                self.etags = json.load(etags_file)
+        except (OSError, ValueError):
+            self.etags = {}
+        self.changed = False
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            return self.etags.get(name)
+
+    def set(self, name, etag):
+        with self._lock:
+            if self.etags.get(name) != etag:
+                self.etags[name] = etag
+                self.changed = True
+
+    def save(self):
+        """Write the ETags back, through a temporary file renamed into place"""
+        with self._lock:
+            if not self.changed:
+                return
+            with open(self.path + PART_SUFFIX, 'w') as etags_file:
+                json.dump(self.etags, etags_file, indent=0, sort_keys=True)
+            os.replace(self.path + PART_SUFFIX, self.path)
+            self.changed = False
+
+
+def is_current(session, image, path, etag=None, timeout=TIMEOUT):
+    """Whether the file at path is the server's copy of image, as far as known"""
+    try:
+        local_size = os.path.getsize(path)
+    except OSError:
+        return False
+    if image.get('size') is not None and local_size != image['size']:
+        return False
+    response = session.head(image['link'], allow_redirects=True, timeout=timeout)
+    if response.status_code != 200:
+        return False
+    length = response.headers.get('Content-Length')
+    if length is None or int(length) != local_size:
+        return False
+    server_etag = response.headers.get('ETag')
+    return server_etag is None or etag is None or server_etag == etag
+
+
+def download_image(session, image, directory, throughput=None, etags=None,
+                   timeout=TIMEOUT):
+    """
+    Download one image into directory unless it is already there, as a
+    (connect, read) timeout allows
+    """
+    name = file_name(image)
+    path = os.path.join(directory, name)
+    record = {'id': image['id'], 'link': image['link'], 'path': path}
+    part_path = path + PART_SUFFIX
+    written = 0
+    try:
+        if is_current(session, image, path, etags and etags.get(name), timeout):
+            return dict(record, size=os.path.getsize(path), skipped=True)
+        with session.get(image['link'], stream=True,
+                         timeout=timeout) as response:
+            response.raise_for_status()
+            expected = response.headers.get('Content-Length')
+            etag = response.headers.get('ETag')
+            with open(part_path, 'wb') as part_file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    part_file.write(chunk)
+                    written += len(chunk)
+        if expected is not None and written != int(expected):
+            raise OSError('Incomplete download: {0} of {1} bytes'.format(
+                written, expected))
+        os.replace(part_path, path)
+        if etags is not None and etag is not None:
+            etags.set(name, etag)
+    except (RequestException, OSError) as e:
+        try:
+            os.unlink(part_path)
+        except OSError:
+            pass
+        return dict(record, error=str(e))
+    if throughput is not None:
+        throughput.add(written)
+    return dict(record, size=written)
+
+
+def download_many(session, images, directory, workers=4, timeout=TIMEOUT):
+    """
+    Download images concurrently, yielding one record per image in order and
+    printing the overall throughput to stderr once done
+    """
+    os.makedirs(directory, exist_ok=True)
+    throughput = Throughput()
+    etags = ETags(directory)
+    records = imap_ordered(
+        lambda image: download_image(session, image, directory, throughput,
+                                     etags, timeout),
+        images, workers)
+    try:
+        yield from records
+    finally:
+        etags.save()
+        print(throughput.summary(), file=sys.stderr)
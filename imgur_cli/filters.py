@@ -0,0 +1,114 @@
+"""
+Field projection and filtering of output records.
+
+--where conditions drop the items of a listing that do not match them, and
+--fields keeps only the named fields of every item, before it is serialized.
+Both are applied as items stream out of the client, so the full model
+dictionaries are never encoded. Field names may be dotted to reach into nested
+objects (account_url, tags.0.name, ...).
+
+A condition is <field><operator><value>, with one of the operators in
+OPERATORS. The value is read as JSON when possible (10000, true, null, "a b")
+and as a plain string otherwise. Items missing the field, or whose value cannot
+be compared with the given one, do not match.
+"""
+
+import argparse
+import json
+import operator
+import re
+
+OPERATORS = {'==': operator.eq, '!=': operator.ne, '>=': operator.ge,
+             '<=': operator.le, '>': operator.gt, '<': operator.lt}
+CONDITION = re.compile(r'^\s*([\w.]+)\s*(==|!=|>=|<=|>|<)\s*(.*?)\s*$')
+MISSING = object()
+
+
+class Condition:
+
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def __repr__(self):
+        return 'Condition({0!r}, {1!r}, {2!r})'.format(self.field, self.op,
+                                                       self.value)
+
+    def __eq__(self, other):
+        return (isinstance(other, Condition) and
+                (self.field, self.op, self.value) ==
+                (other.field, other.op, other.value))
+
+    def matches(self, record):
+        value = lookup(record, self.field)
+        if value is MISSING:
+            return False
+        try:
+            return OPERATORS[self.op](value, self.value)
+        except TypeError:
+            return False
+
+
+def parse_condition(text):
+    """Parse a --where condition such as views>10000"""
+    match = CONDITION.match(text)
+    if match is None:
+        raise argparse.ArgumentTypeError(
+            'invalid condition {0!r}, expected <field><operator><value> with '
+            'one of {1}'.format(text, ' '.join(OPERATORS)))
+    field, op, value = match.groups()
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return Condition(field, op, value)
+
+
+def parse_fields(text):
+    """Parse a comma separated --fields list"""
+    fields = [field.strip() for field in text.split(',') if field.strip()]
+    if not fields:
+        raise argparse.ArgumentTypeError('no field names given')
+    return fields
+
+
+def lookup(record, field):
+    """Value of a (dotted) field of record, MISSING if it has none"""
+    value = record
+    for key in field.split('.'):
+        if isinstance(value, dict):
+            value = value.get(key, MISSING)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def project(record, fields):
+    """A copy of record holding only fields, nested the way they were"""
+    if not isinstance(record, dict):
+        return record
+    projected = {}
+    for field in fields:
+        value = lookup(record, field)
+        if value is MISSING:
+            continue
+        keys = field.split('.')
+        target = projected
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return projected
+
+
+def select(items, fields=None, where=()):
+    """Yield the items matching every condition in where, projected to fields"""
+    for item in items:
+        if where and not (isinstance(item, dict) and
+                          all(condition.matches(item) for condition in where)):
+            continue
+        yield project(item, fields) if fields else item
@@ -0,0 +1,109 @@
+"""
+Follow mode for listings (gallery items --follow).
+
+Instead of fetching a listing from cron and deduplicating downstream, one
+long-running process polls its first page and streams only the items it has
+not seen before. Seen IDs are kept in a bounded set that forgets the least
+recently listed ones first, so memory stays flat however long it runs; an item
+still on the polled page is refreshed on every poll and never forgotten while
+the set holds more IDs than a page.
+
+The poll interval adapts to how busy the listing is: it starts at interval,
+doubles after every poll that found nothing new (or failed) up to
+max_interval, and drops back to interval as soon as new items show up. When
+every item of a page is new, the next pages are fetched too, up to catch_up
+pages per poll, so a burst of posts between two polls is not missed.
+"""
+
+import collections
+import sys
+import time
+
+from imgurpython.helpers.error import ImgurClientError, ImgurClientRateLimitError
+from requests import RequestException
+
+INTERVAL = 60.0
+MAX_INTERVAL = 600.0
+BACKOFF = 2.0
+SEEN_SIZE = 10000
+CATCH_UP_PAGES = 5
+POLL_ERRORS = (ImgurClientError, ImgurClientRateLimitError, RequestException)
+
+
+class SeenSet:
+    """The IDs seen most recently, forgetting the oldest beyond maxsize"""
+
+    def __init__(self, maxsize=SEEN_SIZE):
+        self.maxsize = maxsize
+        self._ids = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, item_id):
+        return item_id in self._ids
+
+    def add(self, item_id):
+        """Remember item_id, returning whether it was new"""
+        if item_id in self._ids:
+            self._ids.move_to_end(item_id)
+            return False
+        self._ids[item_id] = None
+        if len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+        return True
+
+
+class Follower:
+
+    def __init__(self, fetch, page=0, interval=INTERVAL,
+                 max_interval=MAX_INTERVAL, seen=None, catch_up=CATCH_UP_PAGES,
+                 sleep=time.sleep, stream=None):
+        """fetch(page) returns the items of a page of the listing, as dicts"""
+        self.fetch = fetch
+        self.page = page
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.seen = SeenSet() if seen is None else seen
+        self.catch_up = max(catch_up, 1)
+        self.sleep = sleep
+        self.stream = stream
+        self.delay = interval
+        self.polls = 0
+
+    def poll(self):
+        """Return the items not seen before, in listing order"""
+        first = not self.polls
+        self.polls += 1
+        new = []
+        for page in range(self.page, self.page + self.catch_up):
+            items = self.fetch(page)
+            fresh = [item for item in items if self.seen.add(item['id'])]
+            new.extend(fresh)
+            # The first poll only takes in the first page
+            if first or not items or len(fresh) < len(items):
+                break
+        return new
+
+    def follow(self, max_items=None):
+        """
+        Poll until interrupted (or max_items items were yielded), yielding every
+        new item as soon as its poll returns
+        """
+        count = 0
+        while True:
+            try:
+                new = self.poll()
+            except POLL_ERRORS as e:
+                print('Poll failed: {0}'.format(e), file=self.stream or sys.stderr)
+                new = []
+            for item in new:
+                yield item
+                count += 1
+                if max_items is not None and count >= max_items:
+                    return
+            if new:
+                self.delay = self.interval
+            else:
+                self.delay = min(self.delay * BACKOFF, self.max_interval)
+            self.sleep(self.delay)
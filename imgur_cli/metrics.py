@@ -0,0 +1,248 @@
+"""
+Request-level metrics (--metrics).
+
+With metrics enabled, every HTTP request the client sends (cached answers need
+none) is recorded with its endpoint, status, latency, bytes sent and received,
+whether it was a retry and the user and client credits it consumed according to
+the X-RateLimit-* headers; so is the time spent backing off before retries.
+Credits consumed are the drop in remaining credits since the previous response
+of the run. The first response only sets the baseline, since other processes
+may have spent credits since the budget was last saved.
+
+Requests are aggregated per method, endpoint template and status. Endpoint
+templates replace IDs, usernames and page numbers in the URL with {id}, so that
+they do not multiply the number of series: any path segment that is not one of
+the words of Imgur's routes counts as an ID.
+
+When the command is done the aggregate is written as JSON or in the Prometheus
+text format, to stderr or to a file. Files are replaced atomically, so they can
+be dropped into node-exporter's textfile collector directory, which then
+exports the figures of the latest run of every command.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+from imgur_cli.concurrency import LatencyStats
+
+FORMATS = ('json', 'prometheus')
+# Path segments of Imgur's routes (and the values of their section, sort,
+# window and vote parameters) that are kept as they are in endpoint templates
+ROUTE_WORDS = frozenset((
+    'account', 'add', 'add_tags', 'album', 'albums', 'all', 'best', 'block',
+    'block_tag', 'comment', 'comments', 'conversations', 'count', 'credits',
+    'day', 'defaults', 'down', 'favorite', 'favorites', 'filtered_out', 'g',
+    'gallery', 'gallery_favorites', 'hot', 'ids', 'image', 'images', 'me',
+    'memegen', 'memes', 'month', 'new', 'notification', 'oauth2', 'r', 'random',
+    'remove_images', 'remove_tags', 'replies', 'report', 'rising', 'search',
+    'settings', 'submissions', 't', 'tag', 'tags', 'time', 'token', 'top',
+    'unblock_tag', 'up', 'upload', 'user', 'verifyemail', 'veto', 'viral',
+    'vote', 'week', 'year'))
+# Upper bounds of the Prometheus latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def endpoint(url):
+    """The endpoint template of url, such as /3/gallery/{id}/comments/best"""
+    segments = urlsplit(url).path.split('/')
+    # The first segment is the API version
+    return '/'.join(segment if not segment or segment in ROUTE_WORDS or index == 1
+                    else '{id}' for index, segment in enumerate(segments))
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.count = 0
+        self.latency = LatencyStats()
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+        self.credits = {'User': 0, 'Client': 0}
+
+    def add(self, latency, bytes_in, bytes_out, retries, credits):
+        self.count += 1
+        self.latency.record(latency)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.retries += retries
+        for budget, consumed in (credits or {}).items():
+            self.credits[budget] += consumed
+
+    def summary(self):
+        latencies = self.latency.latencies
+        return {'count': self.count,
+                'latency': {'sum': sum(latencies), 'max': max(latencies),
+                            'p50': self.latency.percentile(50),
+                            'p99': self.latency.percentile(99)},
+                'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                'retries': self.retries,
+                'user_credits': self.credits['User'],
+                'client_credits': self.credits['Client']}
+
+
+class RequestMetrics:
+    """Thread-safe aggregate of the requests made for one command"""
+
+    def __init__(self, command=None, clock=time.time):
+        self.command = command
+        self.clock = clock
+        self.started = clock()
+        self.endpoints = {}
+        self.backoff = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, method, url, status, latency, bytes_in=0, bytes_out=0,
+               retries=0, credits=None):
+        """
+        Record one request. status is the HTTP status, or 'error' when no
+        response arrived; credits maps 'User' and 'Client' to the credits used
+        """
+        key = (method.upper(), endpoint(url), str(status))
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.add(latency, bytes_in, bytes_out, retries, credits)
+
+    def record_response(self, method, url, response, latency, credits=None,
+                        bytes_out=None, retried=False):
+        """
+        Record a requests.Response, taking the connection retries from urllib3
+        and, unless bytes_out is given, the bytes sent from its request.
+        retried marks the response to a retry of an earlier failed attempt
+        """
+        request = response.request
+        if bytes_out is None and request is not None:
+            bytes_out = int(request.headers.get('Content-Length') or 0)
+        retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+        self.record(method, url, response.status_code, latency,
+                    bytes_in=len(response.content), bytes_out=bytes_out or 0,
+                    retries=len(retries or ()) + retried, credits=credits)
+
+    def record_backoff(self, delay):
+        """Count delay seconds spent waiting before a retry"""
+        with self._lock:
+            self.backoff += delay
+
+    def summary(self):
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+        records = [dict(stats.summary(), method=method, endpoint=path,
+                        status=status)
+                   for (method, path, status), stats in endpoints]
+        return {'command': self.command, 'started': self.started,
+                'duration': self.clock() - self.started,
+                'requests': sum(record['count'] for record in records),
+                'user_credits': sum(record['user_credits'] for record in records),
+                'client_credits': sum(record['client_credits']
+                                      for record in records),
+                'retries': sum(record['retries'] for record in records),
+                'backoff_seconds': self.backoff,
+                'endpoints': records}
+
+    def prometheus(self):
+        """The aggregate in the Prometheus text exposition format"""
+        summary = self.summary()
+        command = _label_value(self.command or '')
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP imgur_cli_{0} {1}'.format(name, help_text))
+            lines.append('# TYPE imgur_cli_{0} {1}'.format(name, kind))
+            for suffix, labels, value in samples:
+                lines.append('imgur_cli_{0}{1}{{{2}}} {3}'.format(
+                    name, suffix, ','.join('{0}="{1}"'.format(key, label)
+                                           for key, label in labels),
+                    _number(value)))
+
+        def per_endpoint(field):
+            return [('', _labels(command, record), record[field])
+                    for record in summary['endpoints']]
+
+        metric('requests_total', 'counter', 'HTTP requests sent to the API.',
+               per_endpoint('count'))
+        samples = []
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+        for (method, path, status), stats in endpoints:
+            labels = _labels(command, {'method': method, 'endpoint': path,
+                                       'status': status})
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                samples.append(('_bucket', labels + [('le', _number(bound))],
+                                count))
+            samples.append(('_bucket', labels + [('le', '+Inf')], stats.count))
+            samples.append(('_sum', labels, sum(stats.latency.latencies)))
+            samples.append(('_count', labels, stats.count))
+        metric('request_duration_seconds', 'histogram',
+               'Latency of API requests.', samples)
+        metric('response_bytes_total', 'counter',
+               'Bytes received in response bodies.', per_endpoint('bytes_in'))
+        metric('request_bytes_total', 'counter', 'Bytes sent in request bodies.',
+               per_endpoint('bytes_out'))
+        metric('request_retries_total', 'counter',
+               'Retried API requests, including connection retries.',
+               per_endpoint('retries'))
+        metric('user_credits_consumed_total', 'counter',
+               'User rate limit credits consumed.', per_endpoint('user_credits'))
+        metric('client_credits_consumed_total', 'counter',
+               'Client rate limit credits consumed.',
+               per_endpoint('client_credits'))
+        metric('retry_backoff_seconds_total', 'counter',
+               'Time spent waiting before retrying failed requests.',
+               [('', [('command', command)], summary['backoff_seconds'])])
+        metric('command_duration_seconds', 'gauge',
+               'Wall-clock duration of the command.',
+               [('', [('command', command)], summary['duration'])])
+        metric('command_last_run_timestamp_seconds', 'gauge',
+               'When the command last started.',
+               [('', [('command', command)], summary['started'])])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, format, path=None, stream=None):
+        """
+        Write the aggregate as format to path, replacing it atomically, or to
+        stream (stderr) without a path
+        """
+        if format == 'prometheus':
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.summary(), sort_keys=True) + '\n'
+        if path is None:
+            (stream or sys.stderr).write(text)
+            return
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics')
+        try:
+            with os.fdopen(fd, 'w') as metrics_file:
+                metrics_file.write(text)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+
+
+def _labels(command, record):
+    return [('command', command), ('method', record['method']),
+            ('endpoint', _label_value(record['endpoint'])),
+            ('status', record['status'])]
+
+
+def _label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
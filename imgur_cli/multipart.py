@@ -0,0 +1,99 @@
+"""
+Streaming multipart/form-data request bodies.
+
+imgurpython's upload_from_path reads the whole file into memory and base64
+encodes it, and requests then form-encodes the result, so a 10MB image takes
+several times its size in transient copies. requests' own files= support builds
+the multipart body in memory too. A MultipartBody is a read-only file object
+over the encoded form instead: the connection reads it one block at a time and
+the file's part is read from disk as it is sent, so an upload holds one block of
+the file in memory whatever its size. Its length is known up front, so it is
+sent with a Content-Length rather than chunked, and it can be rewound to send
+it again.
+"""
+
+import mimetypes
+import os
+import uuid
+
+
+def _quote(value):
+    """Escape a field or file name for a Content-Disposition header"""
+    return (str(value).replace('\\', '\\\\').replace('"', '%22')
+            .replace('\r', '%0D').replace('\n', '%0A'))
+
+
+class MultipartBody:
+
+    def __init__(self, fields, name, path, filename=None):
+        """
+        The form with fields (a dict of text values) followed by the file at
+        path as field name
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={0}'.format(
+            self.boundary)
+        filename = filename or os.path.basename(path)
+        parts = ['--{0}\r\nContent-Disposition: form-data; name="{1}"\r\n\r\n'
+                 '{2}\r\n'.format(self.boundary, _quote(key), value)
+                 for key, value in fields.items()]
+        parts.append('--{0}\r\nContent-Disposition: form-data; name="{1}"; '
+                     'filename="{2}"\r\nContent-Type: {3}\r\n\r\n'.format(
+                         self.boundary, _quote(name), _quote(filename),
+                         mimetypes.guess_type(filename)[0] or
+                         'application/octet-stream'))
+        self._head = ''.join(parts).encode('utf-8')
+        self._tail = '\r\n--{0}--\r\n'.format(self.boundary).encode('utf-8')
+        self._file = open(path, 'rb')
+        self._file_end = len(self._head) + os.fstat(self._file.fileno()).st_size
+        self.length = self._file_end + len(self._tail)
+        self._position = 0
+
+    def __len__(self):
+        return self.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        self._position = min(max(offset, 0), self.length)
+        return self._position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length - self._position
+        chunks = []
+        while size > 0 and self._position < self.length:
+            chunk = self._read_at(self._position, size)
+            self._position += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _read_at(self, position, size):
+        head = len(self._head)
+        if position < head:
+            return self._head[position:position + size]
+        if position < self._file_end:
+            if self._file.tell() != position - head:
+                self._file.seek(position - head)
+            chunk = self._file.read(min(size, self._file_end - position))
+            if not chunk:
+                raise OSError('{0} shrank while being uploaded'.format(
+                    self._file.name))
+            return chunk
+        offset = position - self._file_end
+        return self._tail[offset:offset + size]
@@ -0,0 +1,320 @@
+"""
+Streaming output writers.
+
+Commands hand generate_output a dict such as {'gallery': <items>}. Iterator
+values (paginated listings, generator expressions over API models) are written
+item by item and flushed as they arrive rather than being collected first, so
+the first item reaches the reader immediately and memory does not grow with the
+size of the listing.
+
+json     one indented JSON document, identical to json.dumps(result, indent=4)
+compact  the same document without any whitespace
+ndjson   one compact JSON value per line: every element of list or iterator
+         values, dict values as they are, anything else as {name: value}
+msgpack  the ndjson records as a stream of MessagePack objects (needs msgpack)
+csv      the ndjson records as CSV rows, nested fields flattened to dotted
+         column names and lists and booleans written as JSON
+
+Compact JSON (compact, ndjson and nested csv values) is encoded with orjson
+when it is installed, which is several times faster than the json module.
+Values nested too deeply for json or orjson (a long reply chain of comments)
+are encoded by _iterdumps instead, which walks them with an explicit stack.
+
+Every format first applies the --where conditions and --fields projection (see
+imgur_cli.filters) to the items of listings, and the projection to single
+items, so that only the selected data is ever encoded. Containers wrapping
+listings (a gallery tag with its items, notifications) are not items: their
+listings are filtered and projected instead.
+
+With --store, the records are also added to the local store (see
+imgur_cli.store) as they stream past, before --where and --fields cut them down.
+"""
+
+import collections.abc
+import csv
+import json
+
+from imgur_cli import exceptions
+
+INDENT = ' ' * 4
+FORMATS = ('json', 'compact', 'ndjson', 'msgpack', 'csv')
+# Records read ahead to find the CSV columns
+CSV_SAMPLE = 1000
+
+options = {'format': 'json', 'fields': None, 'where': (), 'store': None}
+_encoders = {}
+
+
+def configure(format='json', fields=None, where=()):
+    """
+    Select the output format used by write(), and the fields and conditions
+    items are reduced to before being written
+    """
+    if format not in FORMATS:
+        raise ValueError('Unknown output format {0}'.format(format))
+    if format == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            raise exceptions.CommandError('msgpack output needs the msgpack '
+                                          'package: pip install msgpack')
+    options.update(format=format, fields=fields, where=tuple(where or ()))
+
+
+def record_to(store):
+    """Have write() add the records it outputs to store, or stop with None"""
+    options['store'] = store
+
+
+def _select(result):
+    """Apply the configured --where and --fields to the values of result"""
+    fields, where = options['fields'], options['where']
+    if not (fields or where) or not isinstance(result, dict):
+        return result
+    from imgur_cli import filters
+
+    selected = {}
+    for name, value in result.items():
+        if _is_iterator(value):
+            value = filters.select(value, fields, where)
+        elif isinstance(value, list):
+            value = list(filters.select(value, fields, where))
+        elif _is_container(value):
+            value = _select(value)
+        elif isinstance(value, dict) and fields:
+            value = filters.project(value, fields)
+        selected[name] = value
+    return selected
+
+
+def _is_container(value):
+    """Whether value is a dict wrapping streamed listings rather than an item"""
+    return isinstance(value, dict) and any(_is_iterator(item)
+                                           for item in value.values())
+
+
+def write(result, stream):
+    if options['store'] is not None:
+        result = options['store'].capture(result)
+    WRITERS[options['format']](_select(result), stream)
+
+
+def _default(value):
+    # Nested iterators that are not streamed are materialized when encoded
+    if isinstance(value, collections.abc.Iterable):
+        return list(value)
+    raise TypeError('{0!r} is not JSON serializable'.format(value))
+
+
+def _is_iterator(value):
+    return isinstance(value, collections.abc.Iterator)
+
+
+def _iterdumps(value, indent=None):
+    """
+    json.dumps(value) without recursion, indented by indent, or without
+    whitespace when it is None
+    """
+    key_separator = ': ' if indent else ':'
+    parts = []
+    stack = [(value, 0)]
+    while stack:
+        value, depth = stack.pop()
+        if depth is None:
+            # Punctuation pushed by the container around it
+            parts.append(value)
+            continue
+        if (isinstance(value, collections.abc.Iterable) and
+                not isinstance(value, (str, bytes, dict, list, tuple))):
+            value = list(value)
+        if not isinstance(value, (dict, list, tuple)) or not value:
+            parts.append(json.dumps(value, default=_default))
+            continue
+        is_dict = isinstance(value, dict)
+        items = value.items() if is_dict else enumerate(value)
+        newline = '\n' + indent * (depth + 1) if indent else ''
+        stack.append(((newline[:-len(indent)] if indent else '') +
+                      ('}' if is_dict else ']'), None))
+        for index, (key, item) in reversed(list(enumerate(items))):
+            stack.append((item, depth + 1))
+            key = json.dumps(key if isinstance(key, str) else str(key))
+            stack.append(((',' if index else '') + newline +
+                          (key + key_separator if is_dict else ''), None))
+        parts.append('{' if is_dict else '[')
+    return ''.join(parts)
+
+
+def _compact_dumps(value):
+    """json.dumps(value) without whitespace, through orjson when installed"""
+    dumps = _encoders.get('compact')
+    if dumps is None:
+        try:
+            import orjson
+        except ImportError:
+            def dumps(value):
+                return json.dumps(value, separators=(',', ':'), default=_default)
+        else:
+            def dumps(value):
+                return orjson.dumps(value, default=_default,
+                                    option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        _encoders['compact'] = dumps
+    try:
+        return dumps(value)
+    except (RecursionError, TypeError):
+        # orjson raises its JSONEncodeError, a TypeError, when nested too deep
+        return _iterdumps(value)
+
+
+def _dumps(value, level=0):
+    """json.dumps value as if it were nested level deep in the document"""
+    try:
+        data = json.dumps(value, indent=len(INDENT), separators=(',', ': '),
+                          default=_default)
+    except RecursionError:
+        data = _iterdumps(value, INDENT)
+    return data.replace('\n', '\n' + INDENT * level)
+
+
+def write_json(result, stream):
+    """Write result to stream as indented JSON, streaming iterator values"""
+    _write_json_value(result, stream, 0)
+    stream.write('\n')
+    stream.flush()
+
+
+def _write_json_value(value, stream, level):
+    if _is_iterator(value):
+        _write_json_array(value, stream, level)
+    elif isinstance(value, dict) and any(_is_iterator(item) or isinstance(item, dict)
+                                         for item in value.values()):
+        _write_json_object(value, stream, level)
+    else:
+        stream.write(_dumps(value, level))
+
+
+def _write_json_object(value, stream, level):
+    indent = INDENT * (level + 1)
+    for index, (key, item) in enumerate(value.items()):
+        stream.write('{0}\n{1}{2}: '.format(',' if index else '{', indent,
+                                            json.dumps(key)))
+        _write_json_value(item, stream, level + 1)
+    stream.write('\n{0}}}'.format(INDENT * level) if value else '{}')
+
+
+def _write_json_array(items, stream, level):
+    indent = INDENT * (level + 1)
+    empty = True
+    for item in items:
+        stream.write('{0}\n{1}{2}'.format('[' if empty else ',', indent,
+                                          _dumps(item, level + 1)))
+        stream.flush()
+        empty = False
+    stream.write('[]' if empty else '\n{0}]'.format(INDENT * level))
+
+
+def write_compact(result, stream):
+    """Write result to stream as a single line of JSON, streaming iterator values"""
+    _write_compact_value(result, stream)
+    stream.write('\n')
+    stream.flush()
+
+
+def _write_compact_value(value, stream):
+    if _is_iterator(value):
+        stream.write('[')
+        for index, item in enumerate(value):
+            stream.write((',' if index else '') + _compact_dumps(item))
+        stream.write(']')
+    elif isinstance(value, dict) and any(_is_iterator(item) or isinstance(item, dict)
+                                         for item in value.values()):
+        stream.write('{')
+        for index, (key, item) in enumerate(value.items()):
+            stream.write('{0}{1}:'.format(',' if index else '', json.dumps(key)))
+            _write_compact_value(item, stream)
+        stream.write('}')
+    else:
+        stream.write(_compact_dumps(value))
+
+
+def _records(result):
+    """The records of result: one per line in ndjson, one per row in csv"""
+    if not isinstance(result, dict):
+        result = {None: result}
+    for name, value in result.items():
+        if _is_iterator(value) or isinstance(value, list):
+            yield from value
+        elif isinstance(value, dict) or name is None:
+            yield value
+        else:
+            yield {name: value}
+
+
+def write_ndjson(result, stream):
+    """Write result to stream as newline delimited JSON, one record per line"""
+    for record in _records(result):
+        stream.write(_compact_dumps(record) + '\n')
+        stream.flush()
+
+
+def write_msgpack(result, stream):
+    """Write the ndjson records of result to stream as MessagePack objects"""
+    import msgpack
+
+    # Text streams (stdout, the shell daemon's frames) are written through
+    # their binary buffer
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is not None:
+        stream.flush()
+        stream = buffer
+    packer = msgpack.Packer(default=_default)
+    for record in _records(result):
+        stream.write(packer.pack(record))
+        stream.flush()
+
+
+def _flatten(record, prefix=''):
+    """Flatten nested dicts to dotted keys; lists and booleans become JSON"""
+    if not isinstance(record, dict):
+        return {prefix or 'value': _csv_value(record)}
+    row = {}
+    for key, value in record.items():
+        name = '{0}{1}'.format(prefix, key)
+        if isinstance(value, dict):
+            row.update(_flatten(value, name + '.'))
+        else:
+            row[name] = _csv_value(value)
+    return row
+
+
+def _csv_value(value):
+    if isinstance(value, bool) or (
+            isinstance(value, collections.abc.Iterable) and
+            not isinstance(value, (str, bytes))):
+        return _compact_dumps(value)
+    return value
+
+
+def write_csv(result, stream):
+    """
+    Write the ndjson records of result to stream as CSV. The columns are those
+    of the first CSV_SAMPLE records; fields first seen later are left out
+    """
+    rows = (_flatten(record) for record in _records(result))
+    sample = []
+    for row in rows:
+        sample.append(row)
+        if len(sample) >= CSV_SAMPLE:
+            break
+    columns = list(dict.fromkeys(key for row in sample for key in row))
+    writer = csv.DictWriter(stream, columns, extrasaction='ignore',
+                            lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(sample)
+    for row in rows:
+        writer.writerow(row)
+        stream.flush()
+    stream.flush()
+
+
+WRITERS = {'json': write_json, 'compact': write_compact, 'ndjson': write_ndjson,
+           'msgpack': write_msgpack, 'csv': write_csv}
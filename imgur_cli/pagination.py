@@ -0,0 +1,77 @@
+"""
+Walk paged Imgur endpoints lazily, keeping only a bounded number of pages in memory
+"""
+
+import itertools
+import sys
+
+from imgur_cli.concurrency import LatencyStats, imap_requests
+
+
+def iter_pages(fetch, start=0, max_pages=None):
+    """
+    Yield (page, items) for fetch(page), fetch(page + 1), ... until a page comes
+    back empty or max_pages pages have been fetched
+    """
+    pages = itertools.count(start)
+    if max_pages is not None:
+        pages = itertools.islice(pages, max_pages)
+    for page in pages:
+        items = fetch(page)
+        if not items:
+            return
+        yield page, items
+
+
+def iter_pages_concurrent(fetch, start=0, max_pages=None, concurrency=4):
+    """
+    Like iter_pages, but keep a sliding window of concurrency pages in flight on
+    the configured engine (threads or asyncio). Pages are still yielded in
+    order, and pages requested past the first empty one are discarded
+    """
+    pages = itertools.count(start)
+    if max_pages is not None:
+        pages = itertools.islice(pages, max_pages)
+    results = imap_requests(lambda page: (page, fetch(page)), pages, concurrency)
+    try:
+        for page, items in results:
+            if not items:
+                return
+            yield page, items
+    finally:
+        results.close()
+
+
+def iter_items(fetch, start=0, max_pages=None, max_items=None, concurrency=None):
+    """Yield the items of every page, stopping after max_items items"""
+    if concurrency and concurrency > 1:
+        pages = iter_pages_concurrent(fetch, start, max_pages, concurrency)
+    else:
+        pages = iter_pages(fetch, start, max_pages)
+    items = itertools.chain.from_iterable(items for page, items in pages)
+    if max_items is not None:
+        items = itertools.islice(items, max_items)
+    return items
+
+
+def paginate(fetch, args):
+    """
+    Return fetch(args.page), or with --all-pages a generator over every item
+    from args.page onwards honouring --max-pages, --max-items and --concurrency
+    """
+    if not getattr(args, 'all_pages', False):
+        return fetch(args.page)
+    concurrency = getattr(args, 'concurrency', None)
+    if concurrency is None:
+        return iter_items(fetch, args.page, args.max_pages, args.max_items)
+    stats = LatencyStats()
+    items = iter_items(stats.timed(fetch), args.page, args.max_pages,
+                       args.max_items, concurrency)
+    return _report_when_done(items, stats)
+
+
+def _report_when_done(items, stats):
+    try:
+        yield from items
+    finally:
+        print(stats.summary('pages'), file=sys.stderr)
@@ -0,0 +1,198 @@
+"""
+Per-phase timing of a command (--profile).
+
+A Profiler splits the wall-clock time of a command into PHASES: importing the
+CLI and the HTTP stack, building the parser, loading credentials, creating the
+client, the command itself, HTTP requests, building imgurpython models and
+writing output. Phases nest, and time is charged to the innermost one only, so
+the time a streamed listing spends fetching pages inside output counts as
+http and models, not output. Phases entered on worker threads (concurrent
+pages, many IDs) are added up across threads and may exceed the wall time;
+with --engine async, HTTP runs on the event loop and is not told apart from the
+phase waiting for it.
+
+HTTP, models and output are measured by wrapping the functions involved while a
+Profiler is installed, so a command run without --profile executes exactly the
+same code as before. --profile-output additionally runs the command under
+cProfile and dumps its statistics for pstats or snakeviz.
+"""
+
+import argparse
+import contextlib
+import functools
+import sys
+import threading
+import time
+
+PHASES = ('imports', 'parser', 'credentials', 'client', 'command', 'http',
+          'models', 'output')
+
+
+def requested(argv):
+    """
+    Return the parsed --profile and --profile-output options of argv, or None
+    when neither is given. This runs before the real parser is built, so that
+    building it can be timed too
+    """
+    if not any(arg.startswith('--profile') for arg in argv):
+        return None
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', action='store_true')
+    parser.add_argument('--profile-output', default=None)
+    options, _ = parser.parse_known_args(argv)
+    if not (options.profile or options.profile_output):
+        return None
+    return options
+
+
+class DisabledProfiler:
+    """Stand-in used when not profiling: every phase is a no-op"""
+
+    _phase = contextlib.nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def instrument(self):
+        pass
+
+
+DISABLED = DisabledProfiler()
+
+
+class Profiler:
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._restore = []
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _charge(self, name, elapsed, calls=0):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + elapsed
+            self.calls[name] = self.calls.get(name, 0) + calls
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Charge the time spent in the block to name, pausing the outer phase"""
+        stack = self._stack()
+        now = self.clock()
+        if stack:
+            outer, started = stack[-1]
+            self._charge(outer, now - started)
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = self.clock()
+            _, started = stack.pop()
+            self._charge(name, now - started, calls=1)
+            if stack:
+                stack[-1][1] = now
+
+    def add(self, name, elapsed):
+        """Record elapsed seconds measured elsewhere as one call of name"""
+        self._charge(name, elapsed, calls=1)
+
+    def _wrap(self, owner, attribute, name):
+        func = getattr(owner, attribute)
+        if getattr(func, '__profiled__', False):
+            return
+        phase = self.phase
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        timed.__profiled__ = True
+        setattr(owner, attribute, timed)
+        self._restore.append((owner, attribute, func))
+
+    def instrument(self):
+        """
+        Wrap the functions timed as http, models and output, as far as their
+        modules are loaded already. Call again once more modules are
+        """
+        from imgur_cli import output
+
+        self._wrap(output, 'write', 'output')
+        client = sys.modules.get('imgur_cli.client')
+        if client is not None:
+            self._wrap(client.ImgurClient, 'send_request', 'http')
+            self._wrap(client.SessionAuthWrapper, 'request_token', 'http')
+        models = sys.modules.get('imgurpython.imgur.models')
+        for module_name, module in list(sys.modules.items()):
+            if models is None or not module_name.startswith(models.__name__ + '.'):
+                continue
+            for value in list(vars(module).values()):
+                if (isinstance(value, type) and value.__module__ == module_name
+                        and '__init__' in vars(value)):
+                    self._wrap(value, '__init__', 'models')
+
+    def uninstall(self):
+        """Put back every function wrapped by instrument()"""
+        while self._restore:
+            owner, attribute, func = self._restore.pop()
+            setattr(owner, attribute, func)
+
+    def summary(self, wall):
+        """A table of the time spent in every phase, for wall seconds in total"""
+        header = '{0:<12} {1:>9} {2:>7} {3:>8}'
+        lines = [header.format('phase', 'seconds', '%', 'calls')]
+        measured = 0.0
+        for name, total in self.totals.items():
+            if not self.calls.get(name):
+                continue
+            measured += total
+            lines.append('{0:<12} {1:9.4f} {2:6.1f}% {3:8}'.format(
+                name, total, 100 * total / wall if wall else 0,
+                self.calls[name]))
+        other = max(wall - measured, 0.0)
+        lines.append('{0:<12} {1:9.4f} {2:6.1f}%'.format(
+            'other', other, 100 * other / wall if wall else 0))
+        lines.append('{0:<12} {1:9.4f}'.format('total', wall))
+        return '\n'.join(lines)
+
+
+def run(cli, main, argv, options, import_time=None, stream=None):
+    """
+    Run main(argv) with cli.profiler collecting phases, then print the
+    breakdown to stream (stderr) and dump cProfile statistics if asked to
+    """
+    profiler = Profiler()
+    if import_time is not None:
+        profiler.add('imports', import_time)
+    profile = None
+    if options.profile_output:
+        import cProfile
+
+        profile = cProfile.Profile()
+    cli.profiler = profiler
+    profiler.instrument()
+    started = time.perf_counter()
+    try:
+        if profile is not None:
+            profile.enable()
+        try:
+            return main(argv)
+        finally:
+            if profile is not None:
+                profile.disable()
+    finally:
+        wall = time.perf_counter() - started + (import_time or 0.0)
+        profiler.uninstall()
+        cli.profiler = DISABLED
+        print(profiler.summary(wall), file=stream or sys.stderr)
+        if profile is not None:
+            profile.dump_stats(options.profile_output)
+            print('cProfile statistics saved to {0}'.format(
+                options.profile_output), file=stream or sys.stderr)
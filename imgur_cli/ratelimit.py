@@ -0,0 +1,212 @@
+"""
+Client-side pacing driven by Imgur's X-RateLimit-* credit headers.
+
+Every response reports how many user and client credits are left and when the
+user credits reset. While plenty are left requests go out at full speed. Once
+the user budget drops below SLOW_FRACTION of its limit, a token bucket spreads
+the remaining credits evenly until the reset time. At RESERVE credits, requests
+pause until the reset. Client credits only reset daily, so running out of
+those raises ImgurClientRateLimitError instead of waiting, once a response in
+this process has reported it. All callers share one lock, so concurrent
+workers slow down together.
+
+The last known budget of every client ID is saved as JSON so "imgur credits"
+can show it without a network call, and so the next run starts out paced.
+Saved credits that have been reset since are ignored: user credits past their
+UserReset time, and client credits saved more than CLIENT_WINDOW ago.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+HEADERS = ('UserLimit', 'UserRemaining', 'UserReset', 'ClientLimit',
+           'ClientRemaining')
+RESERVE = 10
+SLOW_FRACTION = 0.2
+BURST = 10
+# Client credits reset once a day, at a time the API does not report
+CLIENT_WINDOW = 86400
+
+
+def state_file(client_id):
+    """Name of the file holding the budget of client_id"""
+    digest = hashlib.sha256(client_id.encode('utf-8')).hexdigest()[:16]
+    return os.path.join('credits', digest + '.json')
+
+
+def load_state(path):
+    """Return the budget saved at path, or None if nothing was recorded"""
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return None
+
+
+def fresh_state(state, now):
+    """A copy of state without the credits that have been reset since"""
+    state = dict(state)
+    updated = state.get('updated')
+    if updated is None or now - updated >= CLIENT_WINDOW:
+        state['ClientRemaining'] = None
+    reset = state.get('UserReset')
+    if reset is None or reset <= now:
+        state['UserRemaining'] = None
+    return state
+
+
+def save_state(path, state):
+    """Atomically replace the budget saved at path"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.credits')
+    try:
+        with os.fdopen(fd, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, path)
+    except OSError:
+        os.unlink(temp_path)
+        raise
+
+
+class RateLimiter:
+
+    def __init__(self, state_path=None, reserve=RESERVE,
+                 slow_fraction=SLOW_FRACTION, burst=BURST, clock=time.time,
+                 sleep=time.sleep):
+        self.state_path = state_path
+        self.reserve = reserve
+        self.slow_fraction = slow_fraction
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.credits = dict.fromkeys(HEADERS)
+        self.tokens = burst
+        self.last_refill = clock()
+        self.waited = 0.0
+        # Whether a response in this process reported the client credits
+        self.live = False
+        self._lock = threading.Lock()
+        state = load_state(state_path) if state_path else None
+        if state:
+            state = fresh_state(state, clock())
+            self.credits.update((key, state.get(key)) for key in HEADERS)
+        # Remaining credits as last reported by a response in this process,
+        # unlike self.credits which acquire() counts down ahead of the
+        # responses. Saved credits may have been spent by other processes
+        # since, so they are no baseline for what this one consumes
+        self.reported = {'User': None, 'Client': None}
+
+    def update(self, headers):
+        """
+        Record the credits reported by a response's headers. Returns the user
+        and client credits consumed since the previous response, as far as they
+        are known
+        """
+        credits = {}
+        for key in HEADERS:
+            try:
+                credits[key] = int(headers.get('X-RateLimit-' + key))
+            except (TypeError, ValueError):
+                pass
+        if not credits:
+            return {}
+        with self._lock:
+            consumed = self._consumed(credits)
+            self.credits.update(credits)
+            self.live = self.live or 'ClientRemaining' in credits
+            state = dict(self.credits, updated=int(self.clock()))
+        if self.state_path:
+            try:
+                save_state(self.state_path, state)
+            except OSError:
+                # The budget is only informational, never fail a request over it
+                pass
+        return consumed
+
+    def _consumed(self, credits):
+        consumed = {}
+        for budget in ('User', 'Client'):
+            remaining = credits.get(budget + 'Remaining')
+            if remaining is None:
+                continue
+            previous = self.reported[budget]
+            self.reported[budget] = remaining
+            if previous is None:
+                continue
+            if remaining <= previous:
+                consumed[budget] = previous - remaining
+            elif (budget == 'User' and credits.get('UserLimit') is not None and
+                    credits.get('UserReset') != self.credits['UserReset']):
+                # A new window started since the previous response
+                consumed[budget] = credits['UserLimit'] - remaining
+            else:
+                # Responses to concurrent requests can arrive out of order
+                consumed[budget] = 0
+        return consumed
+
+    def acquire(self):
+        """Block until a request may be sent, then count it against the budget"""
+        with self._lock:
+            while True:
+                wait = self._wait(self.clock())
+                if wait <= 0:
+                    break
+                self.waited += wait
+                self.sleep(wait)
+            self._consume()
+
+    async def acquire_async(self):
+        """acquire() for coroutines, waiting without blocking the event loop"""
+        import asyncio
+
+        while True:
+            with self._lock:
+                wait = self._wait(self.clock())
+                if wait <= 0:
+                    self._consume()
+                    return
+                self.waited += wait
+            await asyncio.sleep(wait)
+
+    def _consume(self):
+        self.tokens -= 1
+        for key in ('UserRemaining', 'ClientRemaining'):
+            if self.credits[key] is not None:
+                self.credits[key] -= 1
+
+    def _wait(self, now):
+        client_remaining = self.credits['ClientRemaining']
+        if (self.live and client_remaining is not None and
+                client_remaining <= self.reserve):
+            from imgurpython.helpers.error import ImgurClientRateLimitError
+
+            raise ImgurClientRateLimitError()
+
+        remaining = self.credits['UserRemaining']
+        limit = self.credits['UserLimit']
+        reset = self.credits['UserReset']
+        if remaining is None or limit is None or reset is None:
+            return 0
+        until_reset = reset - now
+        if until_reset <= 0:
+            # The window rolled over; the next response reports the new budget
+            self.credits['UserRemaining'] = None
+            return 0
+        if remaining <= self.reserve:
+            return until_reset + 1
+        if remaining > limit * self.slow_fraction:
+            self.tokens = self.burst
+            self.last_refill = now
+            return 0
+
+        rate = (remaining - self.reserve) / until_reset
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / rate
@@ -0,0 +1,119 @@
+"""
+Retries of idempotent requests.
+
+A GET that fails with a transient error (a connection reset or timeout, a
+5xx status or 429 Too Many Requests) is sent again, up to attempts times in
+total. Before each retry the client backs off for a random delay between zero
+and base * 2 ** retry seconds, capped at cap ("full jitter", so concurrent
+workers do not retry in lockstep). A Retry-After header, or for a 429 with no
+user credits left the X-RateLimit-UserReset time, raises the delay to at least
+that long. If the server asks for a longer wait than max_wait, the failure is
+returned right away instead.
+
+Only GET requests are retried. Uploads, album creation, votes and other
+methods change state, and the first attempt may have taken effect even if
+its response was lost, so they are never replayed.
+
+The policy only decides whether and how long to wait; the client's threaded
+send_request and the asyncio engine each run the loop, sleeping the way their
+engine has to.
+"""
+
+import random
+import threading
+import time
+
+ATTEMPTS = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 30.0
+MAX_WAIT = 120.0
+RETRY_METHODS = frozenset(('get',))
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+def retry_after(headers, now):
+    """Seconds a Retry-After header (seconds or an HTTP date) asks to wait"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    import email.utils
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - now, 0.0)
+
+
+class RetryPolicy:
+
+    def __init__(self, attempts=ATTEMPTS, base=BASE_DELAY, cap=MAX_DELAY,
+                 max_wait=MAX_WAIT, methods=RETRY_METHODS,
+                 statuses=RETRY_STATUSES, clock=time.time, sleep=time.sleep,
+                 random=random.random):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.max_wait = max_wait
+        self.methods = methods
+        self.statuses = statuses
+        self.clock = clock
+        self.sleep = sleep
+        self.random = random
+        # Counters over the life of the policy
+        self.retries = 0
+        self.backoff = 0.0
+        self._lock = threading.Lock()
+
+    def retries_method(self, method):
+        return self.attempts > 1 and method.lower() in self.methods
+
+    def delay(self, attempt, status=None, headers=None):
+        """
+        Seconds to wait before retrying after attempt (counted from 0) failed
+        with status, or with a connection error when status is None. Returns
+        None if the request must not be retried
+        """
+        if attempt + 1 >= self.attempts:
+            return None
+        if status is not None and status not in self.statuses:
+            return None
+        delay = self.random() * min(self.cap, self.base * 2 ** attempt)
+        if headers is not None:
+            now = self.clock()
+            wait = retry_after(headers, now)
+            if wait is None and status == 429:
+                wait = self._until_reset(headers, now)
+            if wait is not None:
+                if wait > self.max_wait:
+                    return None
+                delay = max(delay, wait)
+        return delay
+
+    def _until_reset(self, headers, now):
+        try:
+            remaining = int(headers.get('X-RateLimit-UserRemaining'))
+            reset = int(headers.get('X-RateLimit-UserReset'))
+        except (TypeError, ValueError):
+            return None
+        return max(reset - now, 0.0) if remaining <= 0 else None
+
+    def record(self, delay):
+        """Count a retry about to wait delay seconds"""
+        with self._lock:
+            self.retries += 1
+            self.backoff += delay
+
+    def wait(self, delay):
+        self.record(delay)
+        self.sleep(delay)
+
+    async def wait_async(self, delay):
+        import asyncio
+
+        self.record(delay)
+        await asyncio.sleep(delay)
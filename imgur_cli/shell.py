@@ -0,0 +1,204 @@
+"""
+Long-lived CLI sessions: an interactive/stdin shell and a Unix socket daemon.
+
+Both keep a single ImgurCli alive (parser, ImgurClient, HTTP connections and
+auth state) and feed it one command line at a time. The daemon speaks a small
+line based JSON protocol: the client sends {"argv": [...], "cwd": ...} and
+receives {"stdout": ...} / {"stderr": ...} frames as output is produced,
+followed by a final {"exit": <status>} frame. Binary output (--format
+msgpack) is sent base64 encoded as {"stdout_base64": ...} frames.
+
+The daemon runs each command in the client's working directory, so relative
+paths (uploads, --output-file, download directories) mean what they would
+locally. Its stdin is not the client's: command lines reading "-" from stdin
+are run locally instead of being forwarded.
+"""
+
+import base64
+import contextlib
+import json
+import os
+import shlex
+import socket
+import socketserver
+import sys
+
+from imgur_cli import exceptions
+
+PROMPT = 'imgur> '
+EXIT_COMMANDS = {'exit', 'quit'}
+
+
+def split_line(line):
+    """Split a shell line into argv; blank lines and comments give []"""
+    return shlex.split(line, comments=True)
+
+
+def run_shell(cli, stream=sys.stdin):
+    """Execute each line read from stream with cli until EOF or exit"""
+    interactive = stream.isatty()
+    status = 0
+    while True:
+        if interactive:
+            print(PROMPT, end='', file=sys.stderr, flush=True)
+        line = stream.readline()
+        if not line:
+            break
+        try:
+            argv = split_line(line)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            status = 1
+            continue
+        if not argv:
+            continue
+        if argv[0] in EXIT_COMMANDS:
+            break
+        status = cli.run(argv)
+    return status
+
+
+class _FrameWriter:
+    """
+    File-like object sending everything written to it as protocol frames. Its
+    buffer takes bytes, sent as base64 frames
+    """
+
+    def __init__(self, wfile, name, binary=False):
+        self.wfile = wfile
+        self.name = name
+        self.binary = binary
+        if not binary:
+            self.buffer = _FrameWriter(wfile, name, binary=True)
+
+    def write(self, data):
+        if data:
+            if self.binary:
+                frame = {self.name + '_base64':
+                         base64.b64encode(data).decode('ascii')}
+            else:
+                frame = {self.name: data}
+            self.wfile.write(json.dumps(frame).encode('utf-8') + b'\n')
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self):
+        return False
+
+
+class _ShellHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+            argv, cwd = request['argv'], request.get('cwd')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            argv = None
+        stdout = _FrameWriter(self.wfile, 'stdout')
+        stderr = _FrameWriter(self.wfile, 'stderr')
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            if argv is None:
+                print('Malformed request', file=sys.stderr)
+                status = 1
+            else:
+                status = self.run(argv, cwd)
+        self.wfile.write(json.dumps({'exit': status}).encode('utf-8') + b'\n')
+
+    def run(self, argv, cwd=None):
+        """Run argv in cwd, going back to the daemon's directory afterwards"""
+        previous = os.getcwd()
+        try:
+            if cwd is not None:
+                os.chdir(cwd)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            return 1
+        try:
+            return self.server.cli.run(argv)
+        finally:
+            os.chdir(previous)
+
+
+class ShellServer(socketserver.UnixStreamServer):
+    """
+    Serve command lines for cli on a Unix socket. Requests are handled one at a
+    time because command output is captured by redirecting sys.stdout, and
+    commands run in the client's working directory
+    """
+
+    def __init__(self, path, cli):
+        self.cli = cli
+        if os.path.exists(path):
+            os.unlink(path)
+        # Created private, as chmod'ing only after bind would leave the socket
+        # open to other users in between
+        umask = os.umask(0o077)
+        try:
+            super().__init__(path, _ShellHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(OSError):
+            os.unlink(self.server_address)
+
+
+def serve(cli, path):
+    """Run the daemon on path until interrupted"""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise exceptions.CommandError('Unix sockets are not supported on this '
+                                      'platform')
+    server = ShellServer(path, cli)
+    print('Listening on {0}'.format(path), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def forward(path, argv, stdout=None, stderr=None):
+    """
+    Thin client: run argv on the daemon listening on path, copying its output to
+    stdout/stderr. Returns the exit status, or None if no daemon is reachable or
+    argv reads stdin, which only a local run can do
+    """
+    if '-' in argv:
+        return None
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    with client, client.makefile('rwb') as connection:
+        request = {'argv': argv, 'cwd': os.getcwd()}
+        connection.write(json.dumps(request).encode('utf-8') + b'\n')
+        connection.flush()
+        for line in connection:
+            frame = json.loads(line.decode('utf-8'))
+            if 'exit' in frame:
+                return frame['exit']
+            for name, stream in (('stdout', stdout), ('stderr', stderr)):
+                if name in frame:
+                    stream.write(frame[name])
+                elif name + '_base64' in frame:
+                    stream.flush()
+                    stream = getattr(stream, 'buffer', stream)
+                    stream.write(base64.b64decode(frame[name + '_base64']))
+                else:
+                    continue
+                stream.flush()
+    # The daemon went away mid-command
+    return 1
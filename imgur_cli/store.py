@@ -0,0 +1,286 @@
+"""
+Local SQLite store of fetched metadata (--store) and its queries (imgur query).
+
+With --store, every image, album, gallery item and comment a command outputs is
+also upserted into a SQLite database, keyed by kind and Imgur ID, as the
+output streams. Rows are buffered and written BATCH_SIZE at a time, each batch
+in a single transaction, so storing a long listing costs a few commits rather
+than one per item, and an interrupted command keeps what was written before.
+
+Each row keeps the full record as JSON next to the columns queries filter and
+sort on: account, datetime, gallery section (the record's own section, such as
+its subreddit, or else the section it was listed from), views, score, votes and
+comment count. Tags go to a table of their own. A record fetched again
+replaces the stored one, except that the account and section it was first
+seen with are kept when the new record does not have them (an image looked up
+by ID does not know it was listed in the hot gallery).
+
+Records are told apart by their fields: comments have a comment and an author,
+albums an images_count (or is_album), images a link and a MIME type. Anything
+else a command outputs (accounts, tags, votes, ...) is not stored.
+"""
+
+import collections.abc
+import datetime
+import json
+import os
+import re
+import sqlite3
+import time
+
+from imgur_cli import exceptions
+
+SCHEMA_VERSION = 1
+BATCH_SIZE = 500
+KINDS = ('image', 'album', 'comment')
+SORT_COLUMNS = ('datetime', 'views', 'score', 'ups', 'downs', 'comment_count',
+                'stored')
+# Seconds covered by --since day, week, month and year, and the units of 7d etc.
+WINDOWS = {'day': 86400, 'week': 7 * 86400, 'month': 30 * 86400,
+           'year': 365 * 86400}
+UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400}
+COLUMNS = ('kind', 'id', 'account', 'datetime', 'section', 'in_gallery', 'nsfw',
+           'views', 'score', 'ups', 'downs', 'comment_count', 'data', 'stored')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    account TEXT,
+    datetime INTEGER,
+    section TEXT,
+    in_gallery INTEGER,
+    nsfw INTEGER,
+    views INTEGER,
+    score INTEGER,
+    ups INTEGER,
+    downs INTEGER,
+    comment_count INTEGER,
+    data TEXT NOT NULL,
+    stored INTEGER NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (kind, id, tag)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_account ON items (account, datetime);
+CREATE INDEX IF NOT EXISTS items_datetime ON items (datetime);
+CREATE INDEX IF NOT EXISTS items_section ON items (section, datetime);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+"""
+
+UPSERT = """
+INSERT INTO items ({0}) VALUES ({1})
+ON CONFLICT (kind, id) DO UPDATE SET
+    account = coalesce(excluded.account, items.account),
+    section = coalesce(excluded.section, items.section),
+    in_gallery = coalesce(excluded.in_gallery, items.in_gallery),
+    {2}
+""".format(', '.join(COLUMNS), ', '.join('?' * len(COLUMNS)),
+           ', '.join('{0} = excluded.{0}'.format(column) for column in COLUMNS
+                     if column not in ('kind', 'id', 'account', 'section',
+                                       'in_gallery')))
+
+
+def kind_of(record):
+    """The kind of item record is, or None if it is not stored"""
+    if not isinstance(record, dict) or record.get('id') is None:
+        return None
+    if 'comment' in record and 'author' in record:
+        return 'comment'
+    if 'images_count' in record or record.get('is_album'):
+        return 'album'
+    if 'link' in record and 'type' in record:
+        return 'image'
+    return None
+
+
+def parse_since(value, now=None):
+    """
+    Epoch seconds of a --since value: a date or time (2016-01-31,
+    2016-01-31T12:00, taken as UTC), a duration back from now (24h, 7d, 2w) or
+    day, week, month or year for the last 1, 7, 30 or 365 days
+    """
+    now = time.time() if now is None else now
+    if value in WINDOWS:
+        return int(now - WINDOWS[value])
+    match = re.match(r'^(\d+)([hdw])$', value)
+    if match:
+        return int(now - int(match.group(1)) * UNITS[match.group(2)])
+    try:
+        moment = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise exceptions.CommandError('Invalid time {0}: use a date such as '
+                                      '2016-01-31, a duration such as 7d or '
+                                      'day, week, month or year'.format(value))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp())
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        return int(value)
+    return value if isinstance(value, int) else None
+
+
+class Store:
+
+    def __init__(self, path, context=None, batch_size=BATCH_SIZE,
+                 clock=time.time, create=True):
+        """
+        Open the store at path. context holds the account and section of the
+        command, used for records that do not name their own
+        """
+        if not create and not os.path.exists(path):
+            raise exceptions.CommandError('No store at {0}: run commands with '
+                                          '--store first'.format(path))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.context = context or {}
+        self.batch_size = batch_size
+        self.clock = clock
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] == 0:
+            with self.connection:
+                self.connection.executescript(SCHEMA)
+                self.connection.execute('PRAGMA user_version = {0}'.format(
+                    SCHEMA_VERSION))
+        self._rows = []
+        self._tags = {}
+
+    def capture(self, result):
+        """
+        Return result with every stored record it holds added to the store as
+        it is read. Iterator values are wrapped, not read ahead
+        """
+        if not isinstance(result, dict):
+            return self._capture(result)
+        return {name: self._capture(value) for name, value in result.items()}
+
+    def _capture(self, value):
+        if isinstance(value, collections.abc.Iterator):
+            return self._stream(value)
+        if isinstance(value, list):
+            for item in value:
+                self.add(item)
+        elif isinstance(value, dict) and not self.add(value):
+            # Containers such as a gallery tag with its items
+            return {key: self._capture(item)
+                    if isinstance(item, (list, collections.abc.Iterator))
+                    else item for key, item in value.items()}
+        return value
+
+    def _stream(self, items):
+        for item in items:
+            self.add(item)
+            yield item
+
+    def add(self, record):
+        """Queue record (and the replies nested in a comment) for storing"""
+        if kind_of(record) is None:
+            return False
+        # An explicit stack, as reply chains can nest deeper than the
+        # recursion limit
+        stack = [record]
+        while stack:
+            record = stack.pop()
+            kind = kind_of(record)
+            if kind is not None:
+                self._queue(kind, record)
+                stack.extend(reversed(record.get('children') or ()))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+        return True
+
+    def _queue(self, kind, record):
+        """Queue the row and tags of record alone, without its replies"""
+        data = {key: value for key, value in record.items() if key != 'children'}
+        account = (record.get('account_url') or record.get('author') or
+                   self.context.get('account'))
+        in_gallery = record.get('in_gallery')
+        if in_gallery is None and 'is_album' in record:
+            # Only gallery listings tell images and albums apart by is_album
+            in_gallery = True
+        score = record.get('score', record.get('points'))
+        self._rows.append((
+            kind, str(record['id']), account, _integer(record.get('datetime')),
+            record.get('section') or self.context.get('section'),
+            None if in_gallery is None else int(bool(in_gallery)),
+            _integer(record.get('nsfw')), _integer(record.get('views')),
+            _integer(score), _integer(record.get('ups')),
+            _integer(record.get('downs')), _integer(record.get('comment_count')),
+            json.dumps(data, default=str), int(self.clock())))
+        tags = record.get('tags')
+        if isinstance(tags, list):
+            names = (tag.get('name') if isinstance(tag, dict) else tag
+                     for tag in tags)
+            self._tags[kind, str(record['id'])] = {
+                str(name).lower() for name in names if name}
+
+    def flush(self):
+        """Write the queued records in one transaction"""
+        if not self._rows:
+            return
+        rows, tags = self._rows, self._tags
+        self._rows, self._tags = [], {}
+        with self.connection:
+            self.connection.executemany(UPSERT, rows)
+            self.connection.executemany(
+                'DELETE FROM tags WHERE kind = ? AND id = ?', list(tags))
+            self.connection.executemany(
+                'INSERT INTO tags (kind, id, tag) VALUES (?, ?, ?)',
+                [(kind, item_id, tag) for (kind, item_id), names in tags.items()
+                 for tag in names])
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+    def query(self, kind=None, account=None, section=None, tag=None, since=None,
+              until=None, gallery=None, sort='datetime', ascending=False,
+              limit=100):
+        """
+        Yield the stored records matching every given filter, sorted by sort
+        (missing values last)
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError('Cannot sort by {0}'.format(sort))
+        clauses, params = [], []
+        for clause, value in (('kind = ?', kind), ('account = ?', account),
+                              ('section = ?', section), ('datetime >= ?', since),
+                              ('datetime < ?', until),
+                              ('(kind, id) IN (SELECT kind, id FROM tags '
+                               'WHERE tag = ?)', tag and tag.lower()),
+                              ('in_gallery = ?', gallery)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = 'SELECT data FROM items{0} ORDER BY {1} IS NULL, {1} {2}'.format(
+            ' WHERE ' + ' AND '.join(clauses) if clauses else '', sort,
+            'ASC' if ascending else 'DESC')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        for data, in self.connection.execute(sql, params):
+            yield json.loads(data)
+
+    def execute(self, sql):
+        """Yield the rows of a read-only SQL statement as dicts"""
+        self.connection.execute('PRAGMA query_only = ON')
+        try:
+            cursor = self.connection.execute(sql)
+        except sqlite3.Error as e:
+            raise exceptions.CommandError('SQL error: {0}'.format(e))
+        columns = [column[0] for column in cursor.description or ()]
+        for row in cursor:
+            yield dict(zip(columns, row))
@@ -0,0 +1,175 @@
+"""
+Incremental mirror of an account's images and albums.
+
+A sync compares the account with a local snapshot (a JSON file holding the
+metadata of every item seen so far) and yields a change set instead of pulling
+every listing in full. For images and albums alike it:
+
+1. reads the item count and the pages of item IDs, which are cheap and hold many
+   IDs each; the count tells how many ID pages there are, so all but the first
+   are fetched concurrently,
+2. diffs the IDs with the snapshot: items no longer listed are removed, and
+3. fetches metadata for the new items only, one lookup per ID through the
+   concurrent batch fetcher. When more items are new than the full listing has
+   pages (on the first sync, say), the listing is read page by page instead,
+   which takes fewer requests. Listings are newest first, so reading them
+   stops at the first page without new items, or once all of them were found.
+
+The snapshot is replaced atomically once the change set has been read to the
+end, so an interrupted sync is simply repeated. Items whose metadata could not
+be fetched are reported with their error and left out of the snapshot, so the
+next sync tries them again.
+"""
+
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+from imgur_cli import batch
+from imgur_cli.pagination import iter_items, iter_pages_concurrent
+
+SNAPSHOT_VERSION = 1
+# Items per page of the account images and albums listings
+LISTING_PAGE_SIZE = 50
+
+
+class Kind:
+    """How to list and look up one kind of item (images or albums)"""
+
+    def __init__(self, name, count, ids, listing, lookup):
+        self.name = name
+        self.count = count
+        self.ids = ids
+        self.listing = listing
+        self.lookup = lookup
+
+
+def account_kinds(client, username):
+    return (Kind('image',
+                 lambda: client.get_account_images_count(username),
+                 lambda page: client.get_account_image_ids(username, page),
+                 lambda page: client.get_account_images(username, page),
+                 client.get_image),
+            Kind('album',
+                 lambda: client.get_account_album_count(username),
+                 lambda page: client.get_account_album_ids(username, page),
+                 lambda page: client.get_account_albums(username, page),
+                 client.get_album))
+
+
+def load_snapshot(path):
+    """Return the snapshot saved at path, or an empty one"""
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        snapshot = None
+    if not snapshot or snapshot.get('version') != SNAPSHOT_VERSION:
+        return {'version': SNAPSHOT_VERSION, 'synced': None, 'items': {}}
+    return snapshot
+
+
+def save_snapshot(path, snapshot):
+    """Atomically replace the snapshot saved at path"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot')
+    try:
+        with os.fdopen(fd, 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temp_path, path)
+    except OSError:
+        os.unlink(temp_path)
+        raise
+
+
+def fetch_ids(kind, concurrency=4):
+    """Every ID listed for kind, in listing order"""
+    count = kind.count()
+    first = kind.ids(0)
+    if not first:
+        return []
+    ids = list(first)
+    if count > len(first):
+        # One page more than the count calls for, in case items were just added
+        pages = math.ceil(count / len(first))
+        ids.extend(iter_items(kind.ids, 1, pages, concurrency=concurrency))
+    return ids
+
+
+def listed_items(kind, wanted, workers):
+    """
+    Yield the items of kind's listing whose IDs are in wanted, discarding them
+    from it. Reading stops once wanted is empty or a page holds none of them,
+    as the rest of the listing is older. The first page, which holds the
+    newest items, is read on its own; the next ones concurrently
+    """
+    items = kind.listing(0)
+    pages = iter_pages_concurrent(kind.listing, 1, concurrency=workers)
+    try:
+        while items:
+            found = [item for item in items if item.id in wanted]
+            for item in found:
+                wanted.discard(item.id)
+                yield item
+            if not wanted or not found:
+                return
+            items = next(pages, (None, None))[1]
+    finally:
+        pages.close()
+
+
+def fetch_new(kind, new_ids, total, workers):
+    """Yield (id, metadata or error record) for new_ids"""
+    if len(new_ids) > math.ceil(total / LISTING_PAGE_SIZE):
+        wanted = set(new_ids)
+        for item in listed_items(kind, wanted, workers):
+            yield item.id, item.__dict__
+        # Listed by ID but missing from the listing: look them up
+        new_ids = [item_id for item_id in new_ids if item_id in wanted]
+        if not new_ids:
+            return
+    records = batch.fetch_many(lambda item_id: kind.lookup(item_id).__dict__,
+                               new_ids, workers)
+    yield from zip(new_ids, records)
+
+
+def sync(kinds, snapshot_path, workers=8, concurrency=4, dry_run=False):
+    """
+    Yield the change records of every kind of item against the snapshot at
+    snapshot_path: {'kind', 'change': 'added' or 'removed', 'id', 'item'},
+    with 'error' instead of 'item' for new items that could not be fetched.
+    The snapshot is updated once every record has been yielded
+    """
+    snapshot = load_snapshot(snapshot_path)
+    summary = []
+    for kind in kinds:
+        known = snapshot['items'].setdefault(kind.name, {})
+        listed = fetch_ids(kind, concurrency)
+        listed_set = set(listed)
+        removed = [item_id for item_id in known if item_id not in listed_set]
+        added = [item_id for item_id in listed if item_id not in known]
+        for item_id in removed:
+            yield {'kind': kind.name, 'change': 'removed', 'id': item_id,
+                   'item': known.pop(item_id)}
+        failed = 0
+        for item_id, item in fetch_new(kind, added, len(listed), workers):
+            if item.get('error') is not None and set(item) == {'id', 'error'}:
+                failed += 1
+                yield {'kind': kind.name, 'change': 'added', 'id': item_id,
+                       'error': item['error']}
+                continue
+            known[item_id] = item
+            yield {'kind': kind.name, 'change': 'added', 'id': item_id,
+                   'item': item}
+        summary.append('{0}s: {1} added, {2} removed, {3} unchanged{4}'.format(
+            kind.name, len(added) - failed, len(removed),
+            len(listed) - len(added),
+            ', {0} failed'.format(failed) if failed else ''))
+    snapshot['synced'] = int(time.time())
+    if not dry_run:
+        save_snapshot(snapshot_path, snapshot)
+    print('; '.join(summary), file=sys.stderr)
@@ -0,0 +1,98 @@
+"""
+Access tokens shared between runs.
+
+Imgur access tokens outlive a single command by far, but the CLI used to start
+from the environment's token every time and only found out it had expired when
+the first request failed, paying a refresh round trip in every process. The
+TokenStore keeps the current access token and its expiry in a JSON file, keyed
+by client id and refresh token, so a run can pick up a token another run
+already refreshed and refresh proactively shortly before expiry instead.
+
+Refreshes are serialized across processes with an exclusive lock on a sidecar
+.lock file. Whoever gets the lock second re-reads the file and adopts the token
+the first one stored instead of refreshing again. The file itself is replaced
+atomically, so reading it needs no lock.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): concurrent refreshes are merely redundant
+    fcntl = None
+
+# Refresh tokens expiring within this many seconds
+EXPIRY_MARGIN = 300
+
+
+class TokenStore:
+
+    def __init__(self, path, client_id, margin=EXPIRY_MARGIN, clock=time.time):
+        self.path = path
+        self.client_id = client_id
+        self.margin = margin
+        self.clock = clock
+
+    def _key(self, refresh_token):
+        identity = '{0}\n{1}'.format(self.client_id, refresh_token)
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def _read(self):
+        try:
+            with open(self.path) as token_file:
+                return json.load(token_file)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, refresh_token):
+        """Return the stored token for refresh_token, or None"""
+        return self._read().get(self._key(refresh_token))
+
+    def is_fresh(self, entry):
+        """Whether entry's access token is usable for longer than the margin"""
+        return (entry is not None and
+                entry.get('expires_at', 0) - self.clock() > self.margin)
+
+    def save(self, refresh_token, token_data):
+        """
+        Store the access token from an OAuth token response (access_token,
+        expires_in) for refresh_token, returning the stored entry
+        """
+        entry = {'access_token': token_data['access_token'],
+                 'expires_at': int(self.clock() +
+                                   int(token_data.get('expires_in') or 0))}
+        tokens = self._read()
+        tokens[self._key(refresh_token)] = entry
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # mkstemp creates the file readable by its owner only
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tokens')
+        try:
+            with os.fdopen(fd, 'w') as token_file:
+                json.dump(tokens, token_file)
+            os.replace(temp_path, self.path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+        return entry
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the exclusive refresh lock shared by every process"""
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,129 @@
+"""
+Bulk image uploads.
+
+A bulk upload expands a directory, a glob pattern or a list of paths read from
+stdin, uploads the files on a bounded pool of workers sharing one client and
+records every finished upload in an append-only JSON lines manifest. Files are
+identified by the SHA-256 of their contents, so re-running an interrupted
+upload with the same manifest skips everything that already made it.
+
+Only the images and videos of a directory are uploaded, as told by their
+extension, and its manifest defaults to MANIFEST_FILE inside it. Glob patterns
+and paths from stdin are taken as they are and have no default manifest.
+"""
+
+import glob
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import threading
+
+from imgurpython.helpers.error import ImgurClientError, ImgurClientRateLimitError
+from requests import RequestException
+
+from imgur_cli.concurrency import imap_ordered
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_FIELDS = ('path', 'hash', 'id', 'deletehash', 'link')
+MANIFEST_FILE = '.imgur-uploads.jsonl'
+MEDIA_TYPES = ('image/', 'video/')
+UPLOAD_ERRORS = (ImgurClientError, ImgurClientRateLimitError, RequestException,
+                 OSError)
+
+
+def is_bulk(spec):
+    """Whether an upload argument names more than a single file"""
+    return spec == '-' or os.path.isdir(spec) or glob.has_magic(spec)
+
+
+def is_media(path):
+    """Whether path names an image or video, going by its extension"""
+    mimetype = mimetypes.guess_type(path)[0]
+    return mimetype is not None and mimetype.startswith(MEDIA_TYPES)
+
+
+def default_manifest(spec):
+    """The manifest used without --manifest: MANIFEST_FILE in a directory"""
+    if spec != '-' and os.path.isdir(spec):
+        return os.path.join(spec, MANIFEST_FILE)
+    return None
+
+
+def expand_paths(spec, stream=None):
+    """
+    List the files named by a directory (its images and videos), glob pattern
+    or '-' (stdin)
+    """
+    if spec == '-':
+        stream = stream or sys.stdin
+        return [line.strip() for line in stream if line.strip()]
+    if os.path.isdir(spec):
+        paths = (os.path.join(spec, name) for name in os.listdir(spec)
+                 if is_media(name))
+    else:
+        paths = glob.iglob(spec, recursive=True)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Thread-safe JSON lines record of finished uploads, keyed by file hash"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as manifest_file:
+                for line in manifest_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Tolerate a line truncated by an interrupted run
+                        continue
+                    self.entries[entry['hash']] = entry
+
+    def get(self, digest):
+        with self._lock:
+            return self.entries.get(digest)
+
+    def add(self, entry):
+        with self._lock:
+            self.entries[entry['hash']] = entry
+            if self.path:
+                with open(self.path, 'a') as manifest_file:
+                    manifest_file.write(json.dumps(entry) + '\n')
+
+
+def upload_file(client, path, config, manifest):
+    """Upload path unless the manifest already has it; return its record"""
+    try:
+        digest = file_hash(path)
+        entry = manifest.get(digest)
+        if entry is not None:
+            return dict(entry, path=path, skipped=True)
+        file_config = dict(config)
+        file_config.setdefault('name', os.path.basename(path))
+        image = client.upload_from_path(path, file_config)
+    except UPLOAD_ERRORS as e:
+        return {'path': path, 'error': str(e)}
+    entry = {'path': path, 'hash': digest}
+    entry.update((field, image.get(field)) for field in MANIFEST_FIELDS[2:])
+    manifest.add(entry)
+    return entry
+
+
+def upload_many(client, paths, config=None, workers=4, manifest=None):
+    """Upload paths concurrently, yielding one record per path in order"""
+    manifest = manifest or Manifest()
+    return imap_ordered(lambda path: upload_file(client, path, config or {},
+                                                 manifest), paths, workers)
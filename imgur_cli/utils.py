@@ -1,4 +1,8 @@
-import json
+import collections.abc
+import os
+import sys
+
+from imgur_cli import output
 
 
 def cli_arg(*args, **kwargs):
@@ -35,13 +39,29 @@ def add_subparser(func, *args, **kwargs):
 
 
 def generate_output(result, output_filename=None):
-    """Generate JSON output and either print it to console or save to a file"""
+    """
+    Generate output in the selected format (see imgur_cli.output) and either
+    print it to console or save to a file. Iterator values in result are
+    streamed item by item
+    """
     if output_filename:
-        with open(output_filename, 'w') as json_file:
-            data = json.dumps(result, json_file, indent=4, separators=(',', ': '))
-            json_file.write(data)
+        with open(output_filename, 'w') as output_file:
+            output.write(result, output_file)
     else:
-        print(json.dumps(result, indent=4, separators=(',', ': ')))
+        output.write(result, sys.stdout)
+
+
+def cache_path(name):
+    """
+    Path of name in the CLI's cache directory: $IMGUR_CLI_CACHE_DIR, else
+    imgur-cli under $XDG_CACHE_HOME or ~/.cache
+    """
+    directory = os.environ.get('IMGUR_CLI_CACHE_DIR')
+    if not directory:
+        base = (os.environ.get('XDG_CACHE_HOME') or
+                os.path.join(os.path.expanduser('~'), '.cache'))
+        directory = os.path.join(base, 'imgur-cli')
+    return os.path.join(directory, name)
 
 
 def data_fields(args, allowed_fields):
@@ -54,23 +74,70 @@ def data_fields(args, allowed_fields):
     return data
 
 
-def format_comment_tree(comments):
-    if isinstance(comments, list):
-        result = []
-        for comment in comments:
-            comment_dict = comment.__dict__
-            comment_dict['children'] = build_comment_tree(comment_dict['children'])
-            result.append(comment_dict)
-    else:
-        result = comments.__dict__
-        result['children'] = build_comment_tree(result['children'])
-    return result
-
-
-def build_comment_tree(children):
-    children_objects = []
-    for child in children:
-        child_dict = child .__dict__
-        child_dict['children'] = build_comment_tree(child_dict['children'])
-        children_objects.append(child_dict)
-    return children_objects
+def _is_comments(comments):
+    return isinstance(comments, (list, collections.abc.Iterator))
+
+
+def walk_comment_tree(comments, max_depth=None, max_comments=None):
+    """
+    Visit a comment (or a list or iterator of comments) and the replies below it
+    depth first without recursion, yielding (fields, depth) in display order.
+    fields is a copy of the comment's attributes without 'children'; top-level
+    comments are at depth 0. Replies deeper than max_depth are skipped and the
+    walk stops after max_comments comments
+    """
+    if not _is_comments(comments):
+        comments = [comments]
+    stack = [(iter(comments), 0)]
+    count = 0
+    while stack:
+        children, depth = stack[-1]
+        comment = next(children, None)
+        if comment is None:
+            stack.pop()
+            continue
+        if max_comments is not None and count >= max_comments:
+            return
+        count += 1
+        fields = dict(comment if isinstance(comment, dict) else comment.__dict__)
+        replies = fields.pop('children', None)
+        yield fields, depth
+        if replies and (max_depth is None or depth < max_depth):
+            stack.append((iter(replies), depth + 1))
+
+
+def iter_comment_trees(comments, max_depth=None, max_comments=None):
+    """Yield every top-level comment, with its replies nested, once complete"""
+    root = None
+    levels = []
+    for fields, depth in walk_comment_tree(comments, max_depth, max_comments):
+        fields['children'] = []
+        if depth == 0:
+            if root is not None:
+                yield root
+            root = fields
+        else:
+            levels[depth - 1].append(fields)
+        # levels[depth] holds the replies of the comment last seen at depth
+        del levels[depth:]
+        levels.append(fields['children'])
+    if root is not None:
+        yield root
+
+
+def format_comment_tree(comments, max_depth=None, max_comments=None):
+    """
+    Convert a comment and its replies to nested dicts. A list or iterator of
+    comments is converted lazily, one top-level comment at a time
+    """
+    trees = iter_comment_trees(comments, max_depth, max_comments)
+    if _is_comments(comments):
+        return trees
+    return next(trees, None)
+
+
+def flatten_comment_tree(comments, max_depth=None, max_comments=None):
+    """Yield comments as a flat adjacency list, adding each one's depth"""
+    for fields, depth in walk_comment_tree(comments, max_depth, max_comments):
+        fields['depth'] = depth
+        yield fields
@@ -36,7 +36,13 @@ classifiers = [
 
     # Specify the Python versions you support here. In particular, ensure
     # that you indicate whether you support Python 2, Python 3 or both.
-    'Programming Language :: Python :: 3.4',
+    'Programming Language :: Python :: 3',
+    'Programming Language :: Python :: 3 :: Only',
+    'Programming Language :: Python :: 3.7',
+    'Programming Language :: Python :: 3.8',
+    'Programming Language :: Python :: 3.9',
+    'Programming Language :: Python :: 3.10',
+    'Programming Language :: Python :: 3.11',
 ]
 
 setup(
@@ -50,7 +56,10 @@ setup(
     author_email=email,
     url=url,
     packages=find_packages(exclude='tests'),
+    python_requires='>=3.7',
     install_requires=requires,
+    extras_require={'async': ['aiohttp >= 3.0'], 'msgpack': ['msgpack'],
+                    'fast': ['orjson']},
     entry_points={
         'console_scripts': [
             'imgur = imgur_cli.cli:main'
@@ -0,0 +1,239 @@
+"""
+Local stand-in for the Imgur API, used by tests and benchmarks.
+
+    with FakeImgurServer(pages=3) as server:
+        client = ImgurClient('id', 'secret', api_url=server.url)
+
+Routes answer with Imgur style {"data": ..., "success": true, "status": 200}
+envelopes and X-RateLimit-* headers. Extra routes can be registered with
+FakeImgurServer.route().
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+CHUNK_SIZE = 64 * 1024
+
+
+def fake_image(image_id, index=0):
+    return {'id': image_id, 'title': 'Image {0}'.format(index), 'description': None,
+            'datetime': 1446568913 + index, 'type': 'image/png', 'animated': False,
+            'width': 640, 'height': 480, 'size': 1024, 'views': index * 10,
+            'bandwidth': 0, 'section': None, 'nsfw': False, 'account_url': None,
+            'link': 'http://i.imgur.com/{0}.png'.format(image_id),
+            'deletehash': 'delete{0}'.format(image_id)}
+
+
+def fake_gallery_item(index):
+    item = fake_image('g{0}'.format(index), index)
+    item.update({'is_album': False, 'ups': index, 'downs': 0, 'points': index,
+                 'score': index, 'comment_count': 0, 'topic': None, 'vote': None,
+                 'favorite': False})
+    return item
+
+
+def fake_album(album_id):
+    return {'id': album_id, 'title': 'Album', 'description': None,
+            'datetime': 1446568913, 'cover': 'cover', 'account_url': None,
+            'privacy': 'public', 'layout': 'blog', 'views': 0,
+            'link': 'http://imgur.com/a/{0}'.format(album_id), 'images_count': 2,
+            'images': []}
+
+
+def fake_comment(comment_id, children=()):
+    return {'id': comment_id, 'image_id': 'abc', 'comment': 'comment',
+            'author': 'author', 'author_id': 1, 'on_album': False,
+            'album_cover': None, 'ups': 1, 'downs': 0, 'points': 1,
+            'datetime': 1446568913, 'parent_id': 0, 'deleted': False, 'vote': None,
+            'children': list(children)}
+
+
+class FakeImgurHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.dispatch(self, 'GET')
+
+    def do_HEAD(self):
+        self.server.dispatch(self, 'HEAD')
+
+    def do_POST(self):
+        self.server.dispatch(self, 'POST')
+
+    def do_DELETE(self):
+        self.server.dispatch(self, 'DELETE')
+
+    def read_body(self, keep=False):
+        """
+        Consume the request body in chunks, returning the number of bytes and,
+        with keep, the body itself
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        remaining = length
+        chunks = []
+        while remaining:
+            chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if keep:
+                chunks.append(chunk)
+        return length, b''.join(chunks) if keep else None
+
+    def send_json(self, status, payload, headers=None):
+        # 304 Not Modified never carries a body
+        body = json.dumps(payload).encode('utf-8') if status != 304 else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, body, head=False):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"{0}"'.format(hashlib.md5(body).hexdigest()))
+        self.end_headers()
+        if head:
+            return
+        for start in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[start:start + CHUNK_SIZE])
+
+
+class FakeImgurServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for hundreds of concurrent connections without SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, pages=3, page_size=60, latency=0.0, keep_bodies=False):
+        super().__init__(('127.0.0.1', 0), FakeImgurHandler)
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = []
+        self.bytes_received = 0
+        # (Content-Type, body) of every request, with keep_bodies
+        self.keep_bodies = keep_bodies
+        self.bodies = []
+        self.rate_limit = {'X-RateLimit-UserLimit': 2000,
+                           'X-RateLimit-UserRemaining': 1999,
+                           'X-RateLimit-UserReset': int(time.time()) + 3600,
+                           'X-RateLimit-ClientLimit': 12500,
+                           'X-RateLimit-ClientRemaining': 12499}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.routes = []
+        # Raw bodies served as-is by path, standing in for i.imgur.com
+        self.files = {}
+        self.route('GET', r'3/credits', self.credits)
+        self.route('GET', r'3/image/(?P<id>\w+)', self.image)
+        self.route('GET', r'3/album/(?P<id>\w+)', self.album)
+        self.route('GET', r'3/album/(?P<id>\w+)/images', self.album_images)
+        self.route('GET', r'3/comment/(?P<id>\d+)', self.comment)
+        self.route('GET', r'3/gallery/(?P<id>\w+)', self.gallery_item)
+        self.route('GET', r'3/gallery/.+/(?P<page>\d+)', self.gallery_page)
+        self.route('GET', r'3/account/\w+/images/(?P<page>\d+)', self.image_page)
+        self.route('POST', r'3/upload', self.upload)
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}/'.format(*self.server_address)
+
+    def route(self, method, pattern, handler):
+        """
+        Register handler(request, **groups) for method and a regex matched
+        against the whole path. It returns (status, data[, headers]); later
+        routes take precedence
+        """
+        self.routes.insert(0, (method, re.compile(pattern + '$'), handler))
+
+    def dispatch(self, request, method):
+        path = urlsplit(request.path).path.lstrip('/')
+        received, body = request.read_body(self.keep_bodies)
+        with self._lock:
+            self.requests.append((method, path))
+            self.bytes_received += received
+            if body is not None:
+                self.bodies.append((request.headers.get('Content-Type'), body))
+        if self.latency:
+            time.sleep(self.latency)
+        if method in ('GET', 'HEAD') and path in self.files:
+            request.send_bytes(self.files[path], head=method == 'HEAD')
+            return
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                result = handler(request, **match.groupdict())
+                break
+        else:
+            result = 404, {'error': 'Not found', 'request': path}
+        status, data = result[:2]
+        headers = dict(self.rate_limit, **(result[2] if len(result) > 2 else {}))
+        if not path.startswith('oauth2'):
+            # OAuth endpoints are the only ones answering without an envelope
+            data = {'data': data, 'success': status == 200, 'status': status}
+        request.send_json(status, data, headers)
+
+    def credits(self, request):
+        return 200, {key.split('-')[-1]: value
+                     for key, value in self.rate_limit.items()}
+
+    def image(self, request, id):
+        return 200, fake_image(id)
+
+    def album(self, request, id):
+        return 200, fake_album(id)
+
+    def album_images(self, request, id):
+        return 200, [fake_image('{0}{1}'.format(id, index), index)
+                     for index in range(2)]
+
+    def comment(self, request, id):
+        return 200, fake_comment(int(id))
+
+    def gallery_item(self, request, id):
+        return 200, fake_gallery_item(0)
+
+    def page_range(self, page):
+        page = int(page)
+        if page >= self.pages:
+            return range(0)
+        return range(page * self.page_size, (page + 1) * self.page_size)
+
+    def gallery_page(self, request, page):
+        return 200, [fake_gallery_item(index) for index in self.page_range(page)]
+
+    def image_page(self, request, page):
+        return 200, [fake_image('i{0}'.format(index), index)
+                     for index in self.page_range(page)]
+
+    def upload(self, request):
+        return 200, fake_image('upload{0}'.format(len(self.requests)))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
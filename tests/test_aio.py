@@ -0,0 +1,173 @@
+import asyncio
+import io
+import threading
+import time
+
+import fixtures
+import testtools
+
+from imgurpython.helpers.error import ImgurClientError
+
+from imgur_cli import aio
+from imgur_cli import batch
+from imgur_cli import client
+from imgur_cli import concurrency
+from imgur_cli import metrics
+from imgur_cli import pagination
+from imgur_cli import retry
+from tests.fake_imgur import FakeImgurServer
+
+
+@testtools.skipUnless(aio.aiohttp, 'aiohttp is not installed')
+class TestAsyncEngine(testtools.TestCase):
+
+    def setUp(self):
+        super(TestAsyncEngine, self).setUp()
+        self.server = FakeImgurServer(pages=5, page_size=10).start()
+        self.addCleanup(self.server.stop)
+        self.client = client.ImgurClient('client_id', 'client_secret',
+                                         api_url=self.server.url)
+        concurrency.configure(engine='async')
+        self.addCleanup(concurrency.configure)
+        self.stderr = io.StringIO()
+        self.useFixture(fixtures.MonkeyPatch('sys.stderr', self.stderr))
+
+    def test_call(self):
+        async def fetch(ids):
+            async with aio.AsyncEngine(concurrency=5) as engine:
+                return await asyncio.gather(*(engine.call(self.client.get_image,
+                                                          image_id)
+                                              for image_id in ids))
+        ids = ['img{0}'.format(index) for index in range(20)]
+        images = asyncio.run(fetch(ids))
+        self.assertEqual([image.id for image in images], ids)
+        self.assertEqual(len(self.server.requests), 20)
+        self.assertEqual(self.client.rate_limiter.credits['ClientRemaining'], 12499)
+
+    def test_errors_and_posts(self):
+        self.server.route('GET', r'3/image/missing',
+                          lambda request: (404, {'error': 'Unable to find image'}))
+
+        async def run():
+            async with aio.AsyncEngine() as engine:
+                uploaded = await engine.call(self.client.upload_from_url,
+                                             'http://example.com/a.png',
+                                             {'title': 'a', 'album': None})
+                try:
+                    await engine.call(self.client.get_image, 'missing')
+                except ImgurClientError as e:
+                    return uploaded, e
+        self.client.metrics = metrics.RequestMetrics()
+        uploaded, error = asyncio.run(run())
+        self.assertTrue(uploaded['id'].startswith('upload'))
+        self.assertEqual(error.status_code, 404)
+        records = {(record['method'], record['status']): record
+                   for record in self.client.metrics.summary()['endpoints']}
+        self.assertEqual(records[('POST', '200')]['endpoint'], '/3/upload')
+        self.assertGreater(records[('POST', '200')]['bytes_out'], 0)
+        self.assertEqual(records[('GET', '404')]['endpoint'], '/3/image/{id}')
+
+    def test_refresh_once_off_the_loop(self):
+        self.server.route('POST', r'oauth2/token',
+                          lambda request: (200, {'access_token': 'new_token'}))
+
+        def account(request):
+            if request.headers['Authorization'] != 'Bearer new_token':
+                return 403, {'error': 'expired'}
+            return 200, {'id': 1, 'url': 'me', 'bio': None, 'reputation': 0,
+                         'created': 0, 'pro_expiration': False}
+        self.server.route('GET', r'3/account/me', account)
+        _client = client.ImgurClient('client_id', 'client_secret',
+                                     access_token='old_token',
+                                     refresh_token='refresh_token',
+                                     api_url=self.server.url)
+        refresh = _client.auth.refresh
+        threads = []
+
+        def tracked_refresh():
+            threads.append(threading.current_thread())
+            refresh()
+        _client.auth.refresh = tracked_refresh
+
+        async def fetch():
+            async with aio.AsyncEngine() as engine:
+                return await asyncio.gather(*(engine.call(_client.get_account,
+                                                          'me')
+                                              for _ in range(3)))
+        accounts = asyncio.run(fetch())
+        self.assertEqual([account.url for account in accounts], ['me'] * 3)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+        self.assertEqual(self.server.requests.count(('POST', 'oauth2/token')), 1)
+        self.assertEqual(self.server.requests.count(('GET', '3/account/me')), 6)
+
+    def test_refused_after_refresh(self):
+        self.server.route('POST', r'oauth2/token',
+                          lambda request: (200, {'access_token': 'new_token'}))
+        self.server.route('GET', r'3/account/me',
+                          lambda request: (403, {'error': 'Forbidden'}))
+        _client = client.ImgurClient('client_id', 'client_secret',
+                                     access_token='old_token',
+                                     refresh_token='refresh_token',
+                                     api_url=self.server.url)
+
+        async def fetch():
+            async with aio.AsyncEngine() as engine:
+                return await engine.call(_client.get_account, 'me')
+        error = self.assertRaises(ImgurClientError, asyncio.run, fetch())
+        self.assertEqual(error.status_code, 403)
+        self.assertEqual(self.server.requests.count(('POST', 'oauth2/token')), 1)
+        self.assertEqual(self.server.requests.count(('GET', '3/account/me')), 2)
+
+    def test_retries(self):
+        statuses = iter([503, 502])
+
+        def image(request, id):
+            status = next(statuses, 200)
+            return status, {'id': id} if status == 200 else {'error': 'Busy'}
+        self.server.route('GET', r'3/image/(?P<id>\w+)', image)
+        self.client.retry = retry.RetryPolicy(random=lambda: 0.0)
+
+        async def fetch():
+            async with aio.AsyncEngine() as engine:
+                return await engine.call(self.client.get_image, 'abc')
+        self.assertEqual(asyncio.run(fetch()).id, 'abc')
+        self.assertEqual(self.client.retry.retries, 2)
+        self.assertEqual(self.server.requests.count(('GET', '3/image/abc')), 3)
+
+    def test_batch_on_event_loop(self):
+        ids = ['img{0}'.format(index) for index in range(30)]
+        ids[3] = 'bad id'
+        records = list(batch.fetch_many(
+            lambda image_id: self.client.get_image(image_id).__dict__, iter(ids),
+            workers=10))
+        self.assertEqual([record['id'] for record in records], ids)
+        self.assertIn('error', records[3])
+        # Replayed calls record their latency once
+        self.assertIn('30 items', self.stderr.getvalue())
+
+    def test_pages_on_event_loop(self):
+        def fetch(page):
+            return self.client.gallery(page=page)
+        items = list(pagination.iter_items(fetch, concurrency=4))
+        self.assertEqual([item.id for item in items],
+                         ['g{0}'.format(index) for index in range(50)])
+
+    def test_many_in_flight(self):
+        self.server.latency = 0.05
+        start = time.perf_counter()
+        images = list(aio.imap_ordered(self.client.get_image,
+                                       ('img{0}'.format(index)
+                                        for index in range(100)), 100))
+        self.assertEqual(len(images), 100)
+        # One at a time this takes five seconds
+        self.assertLess(time.perf_counter() - start, 2.5)
+
+    def test_close_cancels_pending(self):
+        self.server.latency = 0.05
+        results = aio.imap_ordered(self.client.get_image,
+                                   ('img{0}'.format(index) for index in range(1000)),
+                                   10)
+        self.assertEqual(next(results).id, 'img0')
+        results.close()
+        self.assertLess(len(self.server.requests), 50)
@@ -0,0 +1,40 @@
+import io
+
+import fixtures
+import testtools
+
+from imgur_cli import batch
+from imgur_cli import client
+from tests.fake_imgur import FakeImgurServer
+
+
+class TestBatch(testtools.TestCase):
+
+    def setUp(self):
+        super(TestBatch, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        self.client = client.ImgurClient('client_id', 'client_secret',
+                                         api_url=self.server.url)
+        self.stderr = self.useFixture(fixtures.StringStream('stderr')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stderr', self.stderr))
+
+    def test_read_ids(self):
+        stream = io.StringIO('b\n\n c \n')
+        self.assertEqual(list(batch.read_ids(['a', '-', 'd'], stream)),
+                         ['a', 'b', 'c', 'd'])
+
+    def test_fetch_many(self):
+        self.server.route('GET', r'3/image/missing',
+                          lambda request: (404, {'error': 'Unable to find image'}))
+        ids = ['img{0}'.format(index) for index in range(20)]
+        ids.insert(5, 'missing')
+        records = list(batch.fetch_many(
+            lambda image_id: self.client.get_image(image_id).__dict__, iter(ids),
+            workers=4))
+        self.assertEqual([record['id'] for record in records], ids)
+        self.assertEqual(records[5], {'id': 'missing',
+                                      'error': '(404) Unable to find image'})
+        self.assertNotIn('error', records[6])
+        self.stderr.seek(0)
+        self.assertIn('21 items', self.stderr.read())
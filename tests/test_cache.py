@@ -0,0 +1,142 @@
+import os
+
+import fixtures
+import testtools
+
+from imgur_cli import cache
+from imgur_cli import client
+from tests.fake_imgur import FakeImgurServer, fake_image
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(testtools.TestCase):
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        self.directory = self.useFixture(fixtures.TempDir()).path
+        self.clock = FakeClock()
+
+    def make_cache(self, **kwargs):
+        return cache.ResponseCache(self.directory, clock=self.clock, **kwargs)
+
+    def test_ttl(self):
+        _cache = self.make_cache()
+        self.assertEqual(_cache.ttl('https://api.imgur.com/3/image/abc'), 3600)
+        self.assertEqual(_cache.ttl('https://api.imgur.com/3/gallery/abc/tags'), 600)
+        self.assertEqual(_cache.ttl('https://api.imgur.com/3/memegen/defaults'),
+                         86400)
+        self.assertIsNone(_cache.ttl('https://api.imgur.com/3/account/me'))
+        self.assertIsNone(_cache.ttl('https://api.imgur.com/3/gallery/hot/viral/0'))
+        self.assertIsNone(_cache.ttl('https://api.imgur.com/3/credits'))
+
+    def test_store_and_expire(self):
+        _cache = self.make_cache()
+        key = _cache.key('url', {'Authorization': 'Client-ID id'})
+        self.assertNotEqual(key, _cache.key('url', {'Authorization': 'Bearer x'}))
+        self.assertIsNone(_cache.get(key))
+        _cache.store(key, 'url', {'ETag': '"v1"', 'Server': 'x'}, '{}', 60)
+        entry = _cache.get(key)
+        self.assertEqual(entry['headers'], {'ETag': '"v1"'})
+        self.assertTrue(_cache.is_fresh(entry))
+        self.assertEqual(_cache.validators(entry), {'If-None-Match': '"v1"'})
+        self.clock.now += 60
+        self.assertFalse(_cache.is_fresh(entry))
+        self.assertTrue(_cache.is_fresh(_cache.renew(key, entry, 60)))
+
+    def test_prune(self):
+        _cache = self.make_cache()
+        _cache.store('old', 'url', {}, '{}', 10)
+        _cache.store('new', 'url', {}, '{}', 100)
+        self.clock.now += 50
+        self.assertEqual(_cache.stats()['expired'], 1)
+        self.assertEqual(_cache.prune(), 1)
+        self.assertEqual(_cache.stats()['entries'], 1)
+        self.assertEqual(_cache.prune(clear=True), 1)
+        self.assertEqual(_cache.stats()['entries'], 0)
+
+    def test_evicts_least_recently_used(self):
+        _cache = self.make_cache()
+        body = 'x' * 100
+        _cache.store('a', 'url', {}, body, 60)
+        # Room for two entries only
+        _cache.max_size = _cache.stats()['size'] * 5 // 2
+        _cache.store('b', 'url', {}, body, 60)
+        # Using "a" makes "b" the least recently used entry
+        os.utime(os.path.join(self.directory, 'b.json'), (0, 0))
+        self.assertIsNotNone(_cache.get('a'))
+        _cache.store('c', 'url', {}, body, 60)
+        self.assertIsNone(_cache.get('b'))
+        self.assertIsNotNone(_cache.get('a'))
+        self.assertIsNotNone(_cache.get('c'))
+
+
+class TestCachedClient(testtools.TestCase):
+
+    def setUp(self):
+        super(TestCachedClient, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        self.clock = FakeClock()
+        self.cache = cache.ResponseCache(self.useFixture(fixtures.TempDir()).path,
+                                         clock=self.clock)
+        self.client = client.ImgurClient('client_id', 'client_secret',
+                                         api_url=self.server.url, cache=self.cache)
+        self.conditional = []
+
+        def image(request, id):
+            self.conditional.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return 304, None, {'ETag': '"v1"'}
+            return 200, fake_image(id), {'ETag': '"v1"'}
+        self.server.route('GET', r'3/image/(?P<id>\w+)', image)
+
+    def image_requests(self):
+        return [path for _, path in self.server.requests
+                if path.startswith('3/image')]
+
+    def test_fresh_entry_skips_request(self):
+        self.assertEqual(self.client.get_image('abc').id, 'abc')
+        self.assertEqual(self.client.get_image('abc').id, 'abc')
+        self.assertEqual(self.image_requests(), ['3/image/abc'])
+
+    def test_cached_lookup_in_new_run_sends_nothing(self):
+        self.client.get_image('abc')
+        del self.server.requests[:]
+        _client = client.ImgurClient('client_id', 'client_secret',
+                                     api_url=self.server.url, cache=self.cache)
+        self.assertEqual(_client.get_image('abc').id, 'abc')
+        self.assertEqual(self.server.requests, [])
+
+    def test_stale_entry_revalidated(self):
+        self.client.get_image('abc')
+        self.clock.now += 3600
+        self.assertEqual(self.client.get_image('abc').id, 'abc')
+        self.assertEqual(self.conditional, [None, '"v1"'])
+        self.assertEqual(self.client.credits['ClientRemaining'], '12499')
+        # The 304 renewed the entry
+        self.client.get_image('abc')
+        self.assertEqual(len(self.image_requests()), 2)
+
+    def test_refresh_and_disabled(self):
+        self.client.get_image('abc')
+        self.cache.refresh = True
+        self.client.get_image('abc')
+        self.cache.refresh = False
+        self.cache.enabled = False
+        self.client.get_image('abc')
+        self.assertEqual(self.conditional, [None, '"v1"', None])
+
+    def test_uncacheable_routes(self):
+        self.client.get_album('abc')
+        self.client.get_album_images('abc')
+        self.client.get_album_images('abc')
+        self.assertEqual(len([path for _, path in self.server.requests
+                              if path == '3/album/abc/images']), 2)
@@ -1,4 +1,10 @@
+import argparse
+import io
+import json
+import os
 import sys
+import time
+import types
 
 import fixtures
 import imgurpython
@@ -8,6 +14,7 @@ from unittest import mock
 
 import imgur_cli.cli as cli
 from imgur_cli import exceptions
+from imgur_cli import ratelimit
 
 FAKE_ENV = {'IMGUR_CLIENT_ID': 'client_id',
             'IMGUR_CLIENT_SECRET': 'client_secret',
@@ -25,10 +32,11 @@ class TestImgurCli(testtools.TestCase):
 
     def setUp(self):
         super(TestImgurCli, self).setUp()
-        self.mock_client = mock.patch('imgur_cli.cli.imgurpython.ImgurClient')
+        self.mock_client = mock.patch('imgur_cli.client.ImgurClient')
         self._client = self.mock_client.start()
         self.mock_output = mock.patch('imgur_cli.cli_api.generate_output')
         self.mock_output.start()
+        self.cache_dir = self.useFixture(fixtures.TempDir()).path
         self.old_stderr = sys.stderr
         sys.stderr = DevNull()
 
@@ -65,19 +73,18 @@ class TestImgurCli(testtools.TestCase):
                 positional_args.append(arg)
             for index, arg in enumerate(positional_args,
                                         start=number_of_parsing_levels):
-                args_type = (
-                    parser_args.func.arguments[index - number_of_parsing_levels][1]
-                    .get('type')
-                )
-                if args_type:
-                    self.assertEqual(getattr(parser_args, arg),
-                                     args_type(argv[index]))
-                else:
-                    self.assertEqual(getattr(parser_args, arg), argv[index])
+                kwargs = parser_args.func.arguments[index -
+                                                    number_of_parsing_levels][1]
+                args_type = kwargs.get('type')
+                expected = args_type(argv[index]) if args_type else argv[index]
+                if kwargs.get('nargs') == '+':
+                    expected = [expected]
+                self.assertEqual(getattr(parser_args, arg), expected)
                 self.assertRaises(SystemExit, self.cli, argv[:index])
 
     def make_env(self, exclude=None):
         env = {key: value for key, value in FAKE_ENV.items() if key != exclude}
+        env['IMGUR_CLI_CACHE_DIR'] = self.cache_dir
         self.useFixture(fixtures.MonkeyPatch('os.environ', env))
 
     def test_imgur_credentials_env(self):
@@ -101,6 +108,75 @@ class TestImgurCli(testtools.TestCase):
     def test_help_unknown_command(self):
         self.assertRaises(exceptions.CommandError, self.cli, ['help', 'foofoo'])
 
+    def test_lazy_parser_subcommand(self):
+        _cli = cli.ImgurCli()
+        _cli.generate_parser(['gallery', 'items', '--page', '2'])
+        self.assertEqual(list(_cli.subparsers), ['gallery'])
+        self.assertEqual(list(_cli.subcommands), ['items'])
+
+    def test_lazy_parser_subparser(self):
+        _cli = cli.ImgurCli()
+        _cli.generate_parser(['album'])
+        self.assertEqual(list(_cli.subparsers), ['album'])
+        self.assertIn('images', _cli.subcommands)
+        self.assertNotIn('help', _cli.subcommands)
+
+    def test_lazy_parser_fallback(self):
+        for argv in (['help'], ['help', 'album'], ['foofoo'], []):
+            _cli = cli.ImgurCli()
+            _cli.generate_parser(argv)
+            self.assertIn('help', _cli.subcommands)
+            self.assertEqual(set(_cli.subparsers), set(cli.cli_api.SUBPARSERS))
+
+    def test_global_format_option(self):
+        self.addCleanup(cli.output.configure)
+        argv = ['--format', 'ndjson', 'gallery', 'items']
+        _cli = self.cli(argv)
+        self.assertEqual(list(_cli.subcommands), ['items'])
+        self.assertEqual(cli.output.options['format'], 'ndjson')
+        self.assertTrue(_cli.client.gallery.called)
+
+    def test_global_fields_and_where_options(self):
+        self.addCleanup(cli.output.configure)
+        argv = ['--fields', 'id,link', '--where', 'views>10', '--where',
+                'nsfw==false', 'gallery', 'items']
+        self.cli(argv)
+        self.assertEqual(cli.output.options['fields'], ['id', 'link'])
+        self.assertEqual(cli.output.options['where'],
+                         (cli.filters.Condition('views', '>', 10),
+                          cli.filters.Condition('nsfw', '==', False)))
+        stderr = self.useFixture(fixtures.StringStream('stderr')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stderr', stderr))
+        self.assertRaises(SystemExit, self.cli, ['--where', 'views', 'gallery',
+                                                 'items'])
+
+    def test_global_retries_option(self):
+        _cli = self.cli(['--retries', '0', 'gallery', 'items'])
+        self.assertEqual(_cli.client.retry.attempts, 1)
+        _cli.main(['gallery', 'items'])
+        self.assertEqual(_cli.client.retry.attempts, cli.retry.ATTEMPTS)
+
+    def test_global_timeout_option(self):
+        _cli = self.cli(['--timeout', '5,30', 'gallery', 'items'])
+        self.assertEqual(_cli.client.timeout, (5.0, 30.0))
+        _cli.main(['gallery', 'items'])
+        self.assertEqual(_cli.client.timeout, (10.0, 60.0))
+        self.assertEqual(cli.parse_timeout('2.5'), (2.5, 2.5))
+        for text in ('soon', '0', '1,2,3'):
+            self.assertRaises(argparse.ArgumentTypeError, cli.parse_timeout,
+                              text)
+
+    def test_global_metrics_option(self):
+        path = self.useFixture(fixtures.TempDir()).join('imgur.prom')
+        _cli = self.cli(['--metrics', 'prometheus', '--metrics-file', path,
+                         'gallery', 'items'])
+        self.assertEqual(_cli.client.metrics.command, 'gallery items')
+        with open(path) as metrics_file:
+            self.assertIn('imgur_cli_command_duration_seconds{command="gallery '
+                          'items"}', metrics_file.read())
+        _cli.main(['gallery', 'items'])
+        self.assertIsNone(_cli.client.metrics)
+
     def test_account_user(self):
         argv = ['account', 'user', 'me']
         _cli = self.cli(argv)
@@ -193,6 +269,17 @@ class TestImgurCli(testtools.TestCase):
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.get_account_comments.called)
 
+    def test_account_comments_flat(self):
+        argv = ['account', 'comments', 'me', '--flat', '--max-depth', '1',
+                '--max-comments', '2']
+        self._client.return_value.get_account_comments.return_value = [
+            {'id': 1, 'children': [{'id': 2, 'children': [{'id': 3}]}]},
+            {'id': 4, 'children': []}]
+        self.cli(argv)
+        rows = cli.cli_api.generate_output.call_args[0][0]['account_comments']
+        self.assertEqual([(row['id'], row['depth']) for row in rows],
+                         [(1, 0), (2, 1)])
+
     def test_account_comment_ids(self):
         argv = ['account', 'comment-ids', 'me']
         _cli = self.cli(argv)
@@ -228,6 +315,18 @@ class TestImgurCli(testtools.TestCase):
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.get_account_images_count.called)
 
+    @mock.patch('imgur_cli.sync.sync')
+    def test_account_sync(self, mock_sync):
+        argv = ['account', 'sync', 'me', '--only', 'images', '--dry-run']
+        _cli = self.cli(argv)
+        parser_args = _cli.parser.parse_args(argv)
+        self.assertParser(_cli, parser_args, argv)
+        kinds, snapshot, workers, concurrency, dry_run = mock_sync.call_args[0]
+        self.assertEqual([kind.name for kind in kinds], ['image'])
+        self.assertEqual(snapshot, os.path.join(self.cache_dir, 'snapshots',
+                                                'me.json'))
+        self.assertEqual((workers, concurrency, dry_run), (8, 4, True))
+
     def test_album(self):
         argv = ['album', 'id', '123']
         _cli = self.cli(argv)
@@ -245,6 +344,16 @@ class TestImgurCli(testtools.TestCase):
         self.assertRaises(SystemExit, self.cli,
                           [argv[0], '--output-file', 'dummy.json'])
 
+    @mock.patch('imgur_cli.download.download_many')
+    def test_album_download(self, mock_download_many):
+        argv = ['album', 'download', '123', '--directory', 'out', '--workers', '8']
+        _cli = self.cli(argv)
+        parser_args = _cli.parser.parse_args(argv)
+        self.assertParser(_cli, parser_args, argv[:3])
+        self.assertTrue(_cli.client.get_album_images.called)
+        self.assertEqual(mock_download_many.call_args[0][2:],
+                         ('out', 8, _cli.client.timeout))
+
     def test_album_create(self):
         argv = ['album', 'create', '--title', 'test']
         self._client.return_value.allowed_album_fields = {'ids', 'title',
@@ -415,6 +524,42 @@ class TestImgurCli(testtools.TestCase):
         self.assertTrue(all(getattr(parser_args, key) == value
                             for key, value in expected_args.items()))
 
+    def test_gallery_all_pages(self):
+        argv = ['gallery', 'items', '--all-pages', '--page', '1', '--max-items', '3']
+        pages = [[mock.Mock(id=index)] * 2 for index in range(3)] + [[]]
+        self._client.return_value.gallery.side_effect = lambda *args: pages[args[2]]
+        _cli = self.cli(argv)
+        parser_args = _cli.parser.parse_args(argv)
+        self.assertTrue(parser_args.all_pages)
+        result = cli.cli_api.generate_output.call_args[0][0]['gallery']
+        self.assertFalse(_cli.client.gallery.called)
+        self.assertEqual(len(list(result)), 3)
+        self.assertEqual([call[0][2] for call in _cli.client.gallery.call_args_list],
+                         [1, 2])
+
+    @mock.patch('imgur_cli.follow.Follower')
+    def test_gallery_follow(self, mock_follower):
+        self.addCleanup(cli.output.configure)
+        argv = ['gallery', 'items', '--section', 'user', '--sort', 'time',
+                '--follow', '--interval', '30', '--seen', '100']
+        _cli = self.cli(argv)
+        self.assertEqual(cli.output.options['format'], 'ndjson')
+        kwargs = mock_follower.call_args[1]
+        self.assertEqual(kwargs['interval'], 30)
+        self.assertEqual(kwargs['max_interval'], 600)
+        self.assertEqual(kwargs['seen'].maxsize, 100)
+        follow = mock_follower.return_value.follow
+        follow.assert_called_once_with(None)
+        result = cli.cli_api.generate_output.call_args[0][0]
+        self.assertIs(result['gallery'], follow.return_value)
+        self._client.return_value.gallery.return_value = [
+            types.SimpleNamespace(id='abc')]
+        self.assertEqual(mock_follower.call_args[0][0](0), [{'id': 'abc'}])
+        self.assertEqual(_cli.client.gallery.call_args[0],
+                         ('user', 'time', 0, 'day', False))
+        self.assertRaises(exceptions.CommandError, self.cli,
+                          argv + ['--all-pages'])
+
     def test_gallery_memes_subgallery(self):
         argv = ['gallery', 'memes-subgallery']
         _cli = self.cli(argv)
@@ -456,6 +601,20 @@ class TestImgurCli(testtools.TestCase):
         self.assertTrue(all(getattr(parser_args, key) == value
                             for key, value in expected_args.items()))
 
+    def test_gallery_tag_fields(self):
+        self.mock_output.stop()
+        stdout = self.useFixture(fixtures.StringStream('stdout')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', stdout))
+        items = [types.SimpleNamespace(id='a', views=1),
+                 types.SimpleNamespace(id='b', views=2)]
+        self._client.return_value.gallery_tag.return_value = \
+            types.SimpleNamespace(name='dogs', followers=3, items=items)
+        self.cli(['--format', 'compact', '--fields', 'id', 'gallery', 'tag',
+                  'dogs'])
+        stdout.seek(0)
+        self.assertEqual(json.loads(stdout.read()), {'gallery_tag': {
+            'name': 'dogs', 'followers': 3, 'items': [{'id': 'a'}, {'id': 'b'}]}})
+
     def test_gallery_tag_image(self):
         argv = ['gallery', 'tag-image', 'dogs', '123']
         _cli = self.cli(argv)
@@ -556,6 +715,16 @@ class TestImgurCli(testtools.TestCase):
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.gallery_item_comments.called)
         self.assertEqual(parser_args.sort, 'best')
+        mock_format_comment_tree.assert_called_with(
+            _cli.client.gallery_item_comments.return_value, None, None)
+
+    @mock.patch('imgur_cli.cli_api.flatten_comment_tree')
+    def test_gallery_comments_flat(self, mock_flatten_comment_tree):
+        argv = ['gallery', 'comments', '123', '--flat', '--max-depth', '2',
+                '--max-comments', '100']
+        _cli = self.cli(argv)
+        mock_flatten_comment_tree.assert_called_with(
+            _cli.client.gallery_item_comments.return_value, 2, 100)
 
     def test_gallery_create_comment(self):
         argv = ['gallery', 'create-comment', '123', 'test']
@@ -585,6 +754,19 @@ class TestImgurCli(testtools.TestCase):
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.get_image.called)
 
+    @mock.patch('imgur_cli.batch.fetch_many')
+    def test_image_many(self, mock_fetch_many):
+        argv = ['image', 'id', 'a', '-', '--workers', '2']
+        with mock.patch('sys.stdin', io.StringIO('b\nc\n')):
+            _cli = self.cli(argv)
+            fetch, ids, workers = mock_fetch_many.call_args[0]
+            self.assertEqual(list(ids), ['a', 'b', 'c'])
+        self.assertEqual(workers, 2)
+        self.assertEqual(fetch('x'), _cli.client.get_image.return_value.__dict__)
+        self.assertEqual(cli.output.options['format'], 'ndjson')
+        self.cli(['--format', 'json', 'image', 'id', 'a', 'b'])
+        self.assertEqual(cli.output.options['format'], 'json')
+
     def test_image_upload(self):
         argv = ['image', 'upload', 'file', 'test.jpg']
         _cli = self.cli(argv)
@@ -597,6 +779,26 @@ class TestImgurCli(testtools.TestCase):
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.upload_from_url.called)
 
+    def test_image_upload_directory(self):
+        tempdir = self.useFixture(fixtures.TempDir())
+        for name in ('a.png', 'b.png'):
+            with open(tempdir.join(name), 'wb') as image_file:
+                image_file.write(name.encode('utf-8'))
+        self._client.return_value.allowed_image_fields = {'album', 'name', 'title',
+                                                          'description'}
+        self._client.return_value.upload_from_path.return_value = {'id': 'abc'}
+        argv = ['image', 'upload', 'file', tempdir.path, '--workers', '2']
+        _cli = self.cli(argv)
+        uploads = list(cli.cli_api.generate_output.call_args[0][0]['uploads'])
+        self.assertEqual([upload['id'] for upload in uploads], ['abc', 'abc'])
+        self.assertEqual(_cli.client.upload_from_path.call_count, 2)
+        # Resumed from the manifest kept in the directory
+        _cli.main(argv)
+        uploads = list(cli.cli_api.generate_output.call_args[0][0]['uploads'])
+        self.assertEqual([upload.get('skipped') for upload in uploads],
+                         [True, True])
+        self.assertEqual(_cli.client.upload_from_path.call_count, 2)
+
     def test_image_delete(self):
         argv = ['image', 'delete', '123']
         _cli = self.cli(argv)
@@ -628,6 +830,16 @@ class TestImgurCli(testtools.TestCase):
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.get_notifications.called)
 
+    def test_notification_all_max_depth(self):
+        argv = ['notification', 'all', '--max-depth', '0']
+        reply = mock.Mock(content={'id': 1, 'children': [{'id': 2}]})
+        self._client.return_value.get_notifications.return_value = \
+            {'messages': [], 'replies': [reply]}
+        self.cli(argv)
+        result = cli.cli_api.generate_output.call_args[0][0]
+        replies = list(result['notifications_all']['replies'])
+        self.assertEqual(replies[0]['content'], {'id': 1, 'children': []})
+
     def test_notification_id_1(self):
         argv = ['notification', 'id', '123']
         self._client.return_value.get_notification.return_value = \
@@ -667,3 +879,76 @@ class TestImgurCli(testtools.TestCase):
         parser_args = _cli.parser.parse_args(argv)
         self.assertParser(_cli, parser_args, argv)
         self.assertTrue(_cli.client.authorize.called)
+
+    @mock.patch('imgur_cli.cli.generate_output')
+    def test_credits(self, mock_generate_output):
+        self.assertRaises(exceptions.CommandError, self.cli, ['credits'])
+        state = {'UserLimit': 2000, 'UserRemaining': 150, 'UserReset': 0,
+                 'ClientLimit': 12500, 'ClientRemaining': 9000,
+                 'updated': int(time.time())}
+        ratelimit.save_state(os.path.join(
+            self.cache_dir, ratelimit.state_file('client_id')), state)
+        _cli = self.cli(['credits'])
+        self.assertIsNone(_cli.client)
+        credits = mock_generate_output.call_args[0][0]['credits']
+        # The user window has been reset since
+        self.assertEqual(credits, dict(state, UserRemaining=None, UserResetIn=0))
+        self.assertRaises(exceptions.CommandError, self.cli, ['credits'],
+                          exclude='IMGUR_CLIENT_ID')
+
+    def test_store_option(self):
+        self.cli(['gallery', 'items'])
+        path = os.path.join(self.cache_dir, cli.STORE_FILE)
+        self.assertFalse(os.path.exists(path))
+        self.cli(['--store', 'gallery', 'items'])
+        self.assertTrue(os.path.exists(path))
+        self.assertIsNone(cli.output.options['store'])
+
+    @mock.patch('imgur_cli.cli.generate_output')
+    def test_query(self, mock_generate_output):
+        self.assertRaises(exceptions.CommandError, self.cli, ['query'])
+        from imgur_cli import store
+        from tests.fake_imgur import fake_gallery_item
+
+        item_store = store.Store(os.path.join(self.cache_dir, cli.STORE_FILE))
+        for index in range(3):
+            item_store.add(fake_gallery_item(index))
+        item_store.close()
+        # The store is closed once output is written: read it meanwhile
+        results = []
+        mock_generate_output.side_effect = lambda result: results.append(
+            {name: list(value) for name, value in result.items()})
+        _cli = self.cli(['query', '--sort', 'views', '--limit', '2'])
+        self.assertIsNone(_cli.client)
+        self.assertEqual([item['id'] for item in results[0]['items']],
+                         ['g2', 'g1'])
+        self.cli(['query', '--sql', 'SELECT count(*) AS n FROM items'])
+        self.assertEqual(results[1], {'rows': [{'n': 3}]})
+
+    def test_engine_option(self):
+        self.addCleanup(cli.concurrency.configure)
+        self.cli(['--engine', 'async', 'image', 'id', 'abc'])
+        self.assertEqual(cli.concurrency.options['engine'], 'async')
+        self.cli(['image', 'id', 'abc'])
+        self.assertEqual(cli.concurrency.options['engine'], 'threads')
+
+    def test_cache_options(self):
+        _cli = self.cli(['image', 'id', 'abc'])
+        self.assertFalse(_cli.client.cache.enabled)
+        _cli = self.cli(['--cache', '--refresh', 'image', 'id', 'abc'])
+        self.assertTrue(_cli.client.cache.enabled)
+        self.assertTrue(_cli.client.cache.refresh)
+        FAKE_ENV['IMGUR_CLI_CACHE'] = '1'
+        self.addCleanup(FAKE_ENV.pop, 'IMGUR_CLI_CACHE')
+        self.assertTrue(self.cli(['image', 'id', 'abc']).client.cache.enabled)
+        _cli = self.cli(['--no-cache', 'image', 'id', 'abc'])
+        self.assertFalse(_cli.client.cache.enabled)
+
+    @mock.patch('imgur_cli.cli.generate_output')
+    def test_cache_stats_and_prune(self, mock_generate_output):
+        _cli = self.cli(['cache', 'stats'])
+        self.assertIsNone(_cli.client)
+        stats = mock_generate_output.call_args[0][0]['cache']
+        self.assertEqual(stats['entries'], 0)
+        self.cli(['cache', 'prune', '--all'])
+        mock_generate_output.assert_called_with({'removed': 0})
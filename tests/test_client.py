@@ -0,0 +1,95 @@
+import email.parser
+import os
+
+import fixtures
+import testtools
+
+from unittest import mock
+
+from imgur_cli import client
+from tests.fake_imgur import FakeImgurServer
+
+
+class TestImgurClient(testtools.TestCase):
+
+    def setUp(self):
+        super(TestImgurClient, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+
+    def make_client(self, **kwargs):
+        return client.ImgurClient('client_id', 'client_secret',
+                                  api_url=self.server.url, **kwargs)
+
+    @mock.patch('requests.get', side_effect=AssertionError('bypassed session'))
+    def test_requests_use_session(self, mock_get):
+        session = client.create_session()
+        _client = self.make_client(session=session)
+        self.assertIs(_client.session, session)
+        image = _client.get_image('abc')
+        self.assertEqual(image.id, 'abc')
+        # No GET /3/credits when the client is created
+        self.assertEqual(self.server.requests, [('GET', '3/image/abc')])
+        self.assertEqual(_client.credits['ClientRemaining'], '12499')
+
+    def test_refresh_uses_session(self):
+        self.server.route('POST', r'oauth2/token',
+                          lambda request: (200, {'access_token': 'new_token'}))
+        calls = []
+
+        def account(request):
+            calls.append(request.headers['Authorization'])
+            if len(calls) == 1:
+                return 403, {'error': 'expired'}
+            return 200, {'id': 1, 'url': 'me', 'bio': None, 'reputation': 0,
+                         'created': 0, 'pro_expiration': False}
+
+        self.server.route('GET', r'3/account/me', account)
+        _client = self.make_client(access_token='old_token',
+                                   refresh_token='refresh_token')
+        self.assertIsInstance(_client.auth, client.SessionAuthWrapper)
+        _client.timeout = (5.0, 30.0)
+        post = _client.session.post
+        with mock.patch('requests.post', side_effect=AssertionError), \
+                mock.patch.object(_client.session, 'post', wraps=post) as post:
+            account = _client.get_account('me')
+        self.assertEqual(account.url, 'me')
+        self.assertEqual(calls, ['Bearer old_token', 'Bearer new_token'])
+        self.assertEqual(post.call_args[1]['timeout'], (5.0, 30.0))
+
+    def test_error_response(self):
+        _client = self.make_client()
+        error = self.assertRaises(client.ImgurClientError, _client.make_request,
+                                  'GET', 'missing')
+        self.assertEqual(error.status_code, 404)
+
+    def test_upload_streams_multipart_body(self):
+        self.server.keep_bodies = True
+        self.server.route('POST', r'oauth2/token',
+                          lambda request: (200, {'access_token': 'new_token'}))
+        statuses = [403, 200]
+        self.server.route('POST', r'3/upload', lambda request: (
+            statuses.pop(0), {'id': 'abc', 'link': 'http://i.imgur.com/abc.png'}))
+        path = self.useFixture(fixtures.TempDir()).join('cat.png')
+        contents = os.urandom(300 * 1024)
+        with open(path, 'wb') as image_file:
+            image_file.write(contents)
+        _client = self.make_client(access_token='old_token',
+                                   refresh_token='refresh_token')
+        image = _client.upload_from_path(path, {'title': 'Cat', 'foo': 'bar'})
+        self.assertEqual(image['id'], 'abc')
+        uploads = [body for _, body in self.server.bodies if b'cat.png' in body]
+        # Sent again in full after the token refresh
+        self.assertEqual(len(uploads), 2)
+        self.assertEqual(uploads[0], uploads[1])
+        content_type, body = self.server.bodies[-1]
+        message = email.parser.BytesParser().parsebytes(
+            'Content-Type: {0}\r\n\r\n'.format(content_type).encode() + body)
+        parts = {part.get_param('name', header='Content-Disposition'): part
+                 for part in message.get_payload()}
+        self.assertEqual(set(parts), {'type', 'title', 'image'})
+        self.assertEqual(parts['type'].get_payload(), 'file')
+        self.assertEqual(parts['title'].get_payload(), 'Cat')
+        self.assertEqual(parts['image'].get_filename(), 'cat.png')
+        self.assertEqual(parts['image'].get_content_type(), 'image/png')
+        self.assertEqual(parts['image'].get_payload(decode=True), contents)
@@ -0,0 +1,83 @@
+import sys
+
+import testtools
+
+from unittest import mock
+
+from imgurpython.imgur.models.comment import Comment
+
+from imgur_cli import client
+from imgur_cli import utils
+
+
+def comment(comment_id, parent_id=0, children=()):
+    return {'id': comment_id, 'parent_id': parent_id, 'children': list(children)}
+
+
+def chain(depth):
+    """A single thread of depth nested replies, built without recursion"""
+    root = node = comment(0)
+    for index in range(1, depth):
+        child = comment(index, index - 1)
+        node['children'].append(child)
+        node = child
+    return root
+
+
+class TestCommentTree(testtools.TestCase):
+
+    def setUp(self):
+        super(TestCommentTree, self).setUp()
+        self.comments = [comment(1, children=[comment(2, 1, [comment(3, 2)]),
+                                              comment(4, 1)]),
+                         comment(5)]
+
+    def test_format_comment_tree(self):
+        objects = client.build_comments(self.comments)
+        self.assertIsInstance(objects[0].children[0].children[0], Comment)
+        trees = list(utils.format_comment_tree(objects))
+        self.assertEqual(trees, self.comments)
+        # The comments themselves are left untouched
+        self.assertIsInstance(objects[0].children[0], Comment)
+        self.assertEqual(utils.format_comment_tree(self.comments[0]),
+                         self.comments[0])
+
+    def test_iterator_of_comments(self):
+        trees = utils.format_comment_tree(iter(self.comments), max_comments=4)
+        self.assertEqual(list(trees), [self.comments[0]])
+        rows = utils.flatten_comment_tree(iter(self.comments), max_depth=0)
+        self.assertEqual([row['id'] for row in rows], [1, 5])
+
+    def test_limits(self):
+        trees = list(utils.format_comment_tree(self.comments, max_depth=0))
+        self.assertEqual(trees, [comment(1), comment(5)])
+        trees = list(utils.format_comment_tree(self.comments, max_comments=3))
+        expected = [comment(1, children=[comment(2, 1, [comment(3, 2)])])]
+        self.assertEqual(trees, expected)
+
+    def test_flatten_comment_tree(self):
+        rows = [(row['id'], row['parent_id'], row['depth'])
+                for row in utils.flatten_comment_tree(self.comments)]
+        self.assertEqual(rows, [(1, 0, 0), (2, 1, 1), (3, 2, 2), (4, 1, 1),
+                                (5, 0, 0)])
+        rows = utils.flatten_comment_tree(self.comments, max_depth=1,
+                                          max_comments=2)
+        self.assertEqual([row['id'] for row in rows], [1, 2])
+
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        root = client.build_comments(chain(depth))
+        rows = list(utils.flatten_comment_tree(root))
+        self.assertEqual(len(rows), depth)
+        self.assertEqual(rows[-1]['depth'], depth - 1)
+        tree = utils.format_comment_tree(root, max_depth=depth)
+        self.assertEqual(tree['children'][0]['id'], 1)
+
+    def test_notification_replies(self):
+        response = {'messages': [], 'replies': [
+            {'id': 1, 'account_id': 2, 'viewed': False,
+             'content': chain(sys.getrecursionlimit() * 2)}]}
+        imgur_client = mock.Mock(make_request=lambda *args: response)
+        notifications = client.ImgurClient.get_notifications(imgur_client)
+        reply = notifications['replies'][0]
+        self.assertIsInstance(reply.content.children[0].children[0], Comment)
@@ -0,0 +1,58 @@
+import random
+import threading
+import time
+
+import testtools
+
+from imgur_cli import concurrency
+
+
+class TestImapOrdered(testtools.TestCase):
+
+    def test_results_in_input_order(self):
+        def slow_square(n):
+            time.sleep(random.random() / 100)
+            return n * n
+        results = concurrency.imap_ordered(slow_square, range(20), 4)
+        self.assertEqual(list(results), [n * n for n in range(20)])
+
+    def test_bounded_window(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def track(n):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.005)
+            with lock:
+                in_flight[0] -= 1
+            return n
+        self.assertEqual(list(concurrency.imap_ordered(track, range(12), 3)),
+                         list(range(12)))
+        self.assertLessEqual(in_flight[1], 3)
+
+    def test_close_stops_submitting(self):
+        submitted = []
+        results = concurrency.imap_ordered(lambda n: submitted.append(n) or n,
+                                           iter(range(1000)), 2)
+        self.assertEqual(next(results), 0)
+        results.close()
+        self.assertLessEqual(len(submitted), 3)
+
+
+class TestLatencyStats(testtools.TestCase):
+
+    def test_percentiles(self):
+        stats = concurrency.LatencyStats()
+        self.assertIsNone(stats.percentile(50))
+        for latency in range(1, 101):
+            stats.record(latency / 1000.0)
+        self.assertEqual(stats.percentile(50), 0.05)
+        self.assertEqual(stats.percentile(99), 0.099)
+        self.assertIn('100 pages in', stats.summary('pages'))
+
+    def test_timed(self):
+        stats = concurrency.LatencyStats()
+        self.assertEqual(stats.timed(lambda a, b=0: a + b)(1, b=2), 3)
+        self.assertEqual(len(stats.latencies), 1)
@@ -0,0 +1,89 @@
+import os
+
+import fixtures
+import testtools
+
+from imgur_cli import client
+from imgur_cli import download
+from tests.fake_imgur import FakeImgurServer
+
+
+class TestDownload(testtools.TestCase):
+
+    def setUp(self):
+        super(TestDownload, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        self.session = client.create_session()
+        self.directory = self.useFixture(fixtures.TempDir()).path
+        self.stderr = self.useFixture(fixtures.StringStream('stderr')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stderr', self.stderr))
+
+    def add_image(self, image_id, body, size=None):
+        self.server.files['files/{0}.gif'.format(image_id)] = body
+        return {'id': image_id, 'size': len(body) if size is None else size,
+                'link': '{0}files/{1}.gif'.format(self.server.url, image_id)}
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as image_file:
+            return image_file.read()
+
+    def test_download_many(self):
+        large = os.urandom(3 * download.CHUNK_SIZE + 17)
+        images = [self.add_image('a', large), self.add_image('b', b'gif')]
+        records = list(download.download_many(self.session, iter(images),
+                                              self.directory, workers=2))
+        self.assertEqual([record['size'] for record in records], [len(large), 3])
+        self.assertEqual(self.read('a.gif'), large)
+        self.assertEqual(self.read('b.gif'), b'gif')
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [download.ETAGS_FILE, 'a.gif', 'b.gif'])
+        self.stderr.seek(0)
+        self.assertIn('2 files', self.stderr.read())
+
+    def test_skips_files_with_matching_size(self):
+        images = [self.add_image('a', b'new'), self.add_image('b', b'longer')]
+        for name, body in (('a.gif', b'old'), ('b.gif', b'short')):
+            with open(os.path.join(self.directory, name), 'wb') as image_file:
+                image_file.write(body)
+        records = list(download.download_many(self.session, images,
+                                              self.directory))
+        self.assertTrue(records[0]['skipped'])
+        self.assertNotIn('skipped', records[1])
+        self.assertEqual(self.read('a.gif'), b'old')
+        self.assertEqual(self.read('b.gif'), b'longer')
+        # Without a recorded ETag, the sizes matching is enough
+        self.assertEqual(sorted(self.server.requests),
+                         [('GET', 'files/b.gif'), ('HEAD', 'files/a.gif')])
+
+    def test_skips_files_with_matching_etag(self):
+        images = [self.add_image('a', b'old'), self.add_image('b', b'old')]
+        list(download.download_many(self.session, images, self.directory))
+        # Changed on the server, still with the same size
+        images = [self.add_image('a', b'new'), images[1]]
+        del self.server.requests[:]
+        records = list(download.download_many(self.session, images,
+                                              self.directory))
+        self.assertNotIn('skipped', records[0])
+        self.assertTrue(records[1]['skipped'])
+        self.assertEqual(self.read('a.gif'), b'new')
+        self.assertEqual(sorted(self.server.requests),
+                         [('GET', 'files/a.gif'), ('HEAD', 'files/a.gif'),
+                          ('HEAD', 'files/b.gif')])
+        # A size other than the API's is downloaded again without asking
+        with open(os.path.join(self.directory, 'b.gif'), 'wb') as image_file:
+            image_file.write(b'truncated')
+        del self.server.requests[:]
+        list(download.download_many(self.session, images[1:], self.directory))
+        self.assertEqual(self.server.requests, [('GET', 'files/b.gif')])
+
+    def test_errors_reported_per_image(self):
+        images = [{'id': 'x', 'size': 1,
+                   'link': self.server.url + 'files/missing.gif'},
+                  self.add_image('b', b'gif')]
+        records = list(download.download_many(self.session, images,
+                                              self.directory))
+        self.assertIn('404', records[0]['error'])
+        self.assertEqual(records[1]['size'], 3)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [download.ETAGS_FILE, 'b.gif'])
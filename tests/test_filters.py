@@ -0,0 +1,61 @@
+import argparse
+
+import testtools
+
+from imgur_cli import filters
+
+
+class TestFilters(testtools.TestCase):
+
+    def test_parse_condition(self):
+        self.assertEqual(filters.parse_condition('views>10000'),
+                         filters.Condition('views', '>', 10000))
+        self.assertEqual(filters.parse_condition(' nsfw == false '),
+                         filters.Condition('nsfw', '==', False))
+        self.assertEqual(filters.parse_condition('section!=funny'),
+                         filters.Condition('section', '!=', 'funny'))
+        self.assertEqual(filters.parse_condition('title=="a b"'),
+                         filters.Condition('title', '==', 'a b'))
+        self.assertEqual(filters.parse_condition('tags.0.name<=cats'),
+                         filters.Condition('tags.0.name', '<=', 'cats'))
+        for text in ('views', 'views=1', '>1', ''):
+            self.assertRaises(argparse.ArgumentTypeError,
+                              filters.parse_condition, text)
+
+    def test_parse_fields(self):
+        self.assertEqual(filters.parse_fields('id, link,,views'),
+                         ['id', 'link', 'views'])
+        self.assertRaises(argparse.ArgumentTypeError, filters.parse_fields, ' , ')
+
+    def test_matches(self):
+        item = {'views': 20000, 'nsfw': False, 'section': None,
+                'tags': [{'name': 'cats'}], 'account': {'id': 1}}
+        matching = ('views>10000', 'views>=20000', 'nsfw==false',
+                    'section==null', 'tags.0.name==cats', 'account.id<2',
+                    'views!=1')
+        failing = ('views<10000', 'nsfw==true', 'missing==null', 'section>1',
+                   'tags.1.name==cats', 'tags.x==1', 'views>abc')
+        for text in matching:
+            self.assertTrue(filters.parse_condition(text).matches(item), text)
+        for text in failing:
+            self.assertFalse(filters.parse_condition(text).matches(item), text)
+
+    def test_project(self):
+        item = {'id': 'a', 'link': 'l', 'views': 3, 'account': {'id': 1, 'x': 2}}
+        self.assertEqual(filters.project(item, ['id', 'views', 'missing']),
+                         {'id': 'a', 'views': 3})
+        self.assertEqual(filters.project(item, ['account.id', 'link']),
+                         {'account': {'id': 1}, 'link': 'l'})
+        self.assertEqual(filters.project('abc', ['id']), 'abc')
+
+    def test_select(self):
+        items = [{'id': index, 'views': index * 10, 'nsfw': index % 2 == 1}
+                 for index in range(6)]
+        where = [filters.parse_condition('views>10'),
+                 filters.parse_condition('nsfw==false')]
+        selected = filters.select(iter(items), ['id'], where)
+        self.assertFalse(isinstance(selected, list))
+        self.assertEqual(list(selected), [{'id': 2}, {'id': 4}])
+        self.assertEqual(list(filters.select(items)), items)
+        item = {'views': 11, 'nsfw': False}
+        self.assertEqual(list(filters.select(['a', item], where=where)), [item])
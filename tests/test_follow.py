@@ -0,0 +1,78 @@
+import io
+
+import testtools
+
+from imgurpython.helpers.error import ImgurClientError
+
+from imgur_cli import follow
+
+
+def items(*ids):
+    return [{'id': item_id} for item_id in ids]
+
+
+class TestSeenSet(testtools.TestCase):
+
+    def test_bounded(self):
+        seen = follow.SeenSet(maxsize=3)
+        self.assertEqual([seen.add(item_id) for item_id in 'abca'],
+                         [True, True, True, False])
+        # 'a' was just seen again, so 'b' is the one forgotten
+        self.assertTrue(seen.add('d'))
+        self.assertEqual(len(seen), 3)
+        self.assertNotIn('b', seen)
+        self.assertIn('a', seen)
+
+
+class TestFollower(testtools.TestCase):
+
+    def setUp(self):
+        super(TestFollower, self).setUp()
+        self.polls = []
+        self.delays = []
+        self.stream = io.StringIO()
+
+    def follower(self, **kwargs):
+        def fetch(page):
+            # Every poll starts at page 0
+            if page == 0:
+                self.pages = self.polls.pop(0)
+            result = self.pages[page]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return follow.Follower(fetch, interval=10, max_interval=60,
+                               sleep=self.delays.append, stream=self.stream,
+                               **kwargs)
+
+    def test_only_new_items_with_adaptive_backoff(self):
+        self.polls = [[items('c', 'b', 'a')], [items('c', 'b', 'a')],
+                      [items('c', 'b', 'a')], [items('d', 'c', 'b')],
+                      [items('d', 'c', 'b')], [items('f', 'e', 'd')]]
+        follower = self.follower()
+        self.assertEqual([item['id'] for item in follower.follow(max_items=6)],
+                         ['c', 'b', 'a', 'd', 'f', 'e'])
+        self.assertEqual(self.delays, [10, 20, 40, 10, 20])
+
+    def test_backoff_is_capped(self):
+        self.polls = [[items('a')]] * 6 + [[items('b', 'a')]]
+        follower = self.follower()
+        self.assertEqual(list(follower.follow(max_items=2)), items('a', 'b'))
+        self.assertEqual(self.delays, [10, 20, 40, 60, 60, 60])
+
+    def test_catch_up_pages(self):
+        self.polls = [[items('b', 'a')],
+                      [items('f', 'e'), items('d', 'c'), items('b', 'a')],
+                      [items('h', 'g'), items('f', 'e')]]
+        follower = self.follower(catch_up=2)
+        self.assertEqual([item['id'] for item in follower.follow(max_items=8)],
+                         ['b', 'a', 'f', 'e', 'd', 'c', 'h', 'g'])
+
+    def test_failed_poll_backs_off(self):
+        self.polls = [[items('a')], [ImgurClientError('Over capacity', 503)],
+                      [items('b', 'a')]]
+        follower = self.follower()
+        self.assertEqual(list(follower.follow(max_items=2)), items('a', 'b'))
+        self.assertEqual(self.delays, [10, 20])
+        self.assertEqual(self.stream.getvalue(),
+                         'Poll failed: (503) Over capacity\n')
@@ -0,0 +1,126 @@
+import io
+import itertools
+import json
+import os
+
+import fixtures
+import testtools
+
+from imgur_cli import client
+from imgur_cli import metrics
+from tests.fake_imgur import FakeImgurServer, fake_image
+
+
+class TestRequestMetrics(testtools.TestCase):
+
+    def test_endpoint(self):
+        self.assertEqual(metrics.endpoint('https://api.imgur.com/3/image/aB3xYz'),
+                         '/3/image/{id}')
+        self.assertEqual(metrics.endpoint('https://api.imgur.com/3/gallery/hot/'
+                                          'viral/day/3?showViral=true'),
+                         '/3/gallery/hot/viral/day/{id}')
+        self.assertEqual(metrics.endpoint('http://127.0.0.1:80/3/account/someone/'
+                                          'images/0'),
+                         '/3/account/{id}/images/{id}')
+        self.assertEqual(metrics.endpoint('https://api.imgur.com/oauth2/token'),
+                         '/oauth2/token')
+
+    def make_metrics(self):
+        clock = itertools.chain([100.0], itertools.repeat(102.5))
+        request_metrics = metrics.RequestMetrics('image id',
+                                                 clock=lambda: next(clock))
+        request_metrics.record('get', 'http://x/3/image/a', 200, 0.02,
+                               bytes_in=100, credits={'User': 1, 'Client': 1})
+        request_metrics.record('get', 'http://x/3/image/b', 200, 0.3,
+                               bytes_in=50, retries=1,
+                               credits={'User': 1, 'Client': 1})
+        request_metrics.record('post', 'http://x/3/upload', 'error', 1.5,
+                               bytes_out=10)
+        return request_metrics
+
+    def test_summary(self):
+        summary = self.make_metrics().summary()
+        self.assertEqual(summary['command'], 'image id')
+        self.assertEqual(summary['duration'], 2.5)
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['user_credits'], 2)
+        get, post = summary['endpoints']
+        self.assertEqual((get['method'], get['endpoint'], get['status']),
+                         ('GET', '/3/image/{id}', '200'))
+        self.assertEqual(get['count'], 2)
+        self.assertEqual(get['bytes_in'], 150)
+        self.assertEqual(get['retries'], 1)
+        self.assertEqual(get['latency']['max'], 0.3)
+        self.assertEqual(get['latency']['p50'], 0.02)
+        self.assertEqual((post['status'], post['bytes_out']), ('error', 10))
+
+    def test_prometheus(self):
+        text = self.make_metrics().prometheus()
+        labels = ('command="image id",method="GET",endpoint="/3/image/{id}",'
+                  'status="200"')
+        self.assertIn('# TYPE imgur_cli_requests_total counter', text)
+        self.assertIn('imgur_cli_requests_total{%s} 2' % labels, text)
+        self.assertIn('imgur_cli_request_duration_seconds_bucket{%s,le="0.05"} 1'
+                      % labels, text)
+        self.assertIn('imgur_cli_request_duration_seconds_bucket{%s,le="0.5"} 2'
+                      % labels, text)
+        self.assertIn('imgur_cli_request_duration_seconds_bucket{%s,le="+Inf"} 2'
+                      % labels, text)
+        self.assertIn('imgur_cli_request_duration_seconds_count{%s} 2' % labels,
+                      text)
+        self.assertIn('imgur_cli_user_credits_consumed_total{%s} 2' % labels,
+                      text)
+        self.assertIn('imgur_cli_command_duration_seconds{command="image id"} 2.5',
+                      text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_write(self):
+        request_metrics = self.make_metrics()
+        stream = io.StringIO()
+        request_metrics.write('json', stream=stream)
+        self.assertEqual(json.loads(stream.getvalue())['requests'], 3)
+        directory = self.useFixture(fixtures.TempDir()).path
+        path = os.path.join(directory, 'textfile', 'imgur.prom')
+        request_metrics.write('prometheus', path)
+        with open(path) as metrics_file:
+            self.assertIn('imgur_cli_requests_total', metrics_file.read())
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['imgur.prom'])
+
+
+class TestClientMetrics(testtools.TestCase):
+
+    def setUp(self):
+        super(TestClientMetrics, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        remaining = iter(range(1999, 0, -1))
+
+        def image(request, id):
+            return 200, fake_image(id), {
+                'X-RateLimit-UserRemaining': next(remaining),
+                'X-RateLimit-ClientRemaining': 12000}
+        self.server.route('GET', r'3/image/(?P<id>\w+)', image)
+
+    def test_requests_recorded(self):
+        request_metrics = metrics.RequestMetrics('image id')
+        _client = client.ImgurClient('client_id', 'client_secret',
+                                     api_url=self.server.url,
+                                     metrics=request_metrics)
+        for image_id in ('a', 'b', 'c'):
+            _client.get_image(image_id)
+        self.assertRaises(Exception, _client.get_album, 'missing/x')
+        summary = request_metrics.summary()
+        records = {(record['endpoint'], record['status']): record
+                   for record in summary['endpoints']}
+        # Creating the client sent no GET /3/credits
+        self.assertNotIn(('/3/credits', '200'), records)
+        images = records[('/3/image/{id}', '200')]
+        self.assertEqual(images['count'], 3)
+        self.assertGreater(images['bytes_in'], 0)
+        # The first response is the baseline: 1999 left, then 1998 and 1997
+        self.assertEqual(images['user_credits'], 2)
+        self.assertEqual(images['client_credits'], 0)
+        self.assertEqual(records[('/3/album/{id}/{id}', '404')]['count'], 1)
+        _client.metrics = None
+        _client.get_image('d')
+        self.assertEqual(request_metrics.summary()['requests'], 4)
@@ -0,0 +1,46 @@
+import os
+
+import fixtures
+import testtools
+
+from imgur_cli.multipart import MultipartBody
+
+
+class TestMultipartBody(testtools.TestCase):
+
+    def setUp(self):
+        super(TestMultipartBody, self).setUp()
+        self.path = self.useFixture(fixtures.TempDir()).join('cat "1".gif')
+        self.contents = os.urandom(100000)
+        with open(self.path, 'wb') as image_file:
+            image_file.write(self.contents)
+
+    def test_encoding(self):
+        with MultipartBody({'type': 'file'}, 'image', self.path) as body:
+            data = body.read()
+        boundary = body.boundary.encode()
+        self.assertEqual(body.content_type,
+                         'multipart/form-data; boundary=' + body.boundary)
+        self.assertEqual(len(data), len(body))
+        self.assertEqual(data, b''.join((
+            b'--', boundary, b'\r\nContent-Disposition: form-data; '
+            b'name="type"\r\n\r\nfile\r\n--', boundary,
+            b'\r\nContent-Disposition: form-data; name="image"; '
+            b'filename="cat %221%22.gif"\r\nContent-Type: image/gif\r\n\r\n',
+            self.contents, b'\r\n--', boundary, b'--\r\n')))
+
+    def test_read_in_blocks_and_rewind(self):
+        with MultipartBody({'title': 'Cat'}, 'image', self.path) as body:
+            whole = body.read()
+            self.assertEqual(body.read(), b'')
+            self.assertEqual(body.seek(0), 0)
+            blocks = iter(lambda: body.read(7777), b'')
+            self.assertEqual(b''.join(blocks), whole)
+            self.assertEqual(body.tell(), len(body))
+            body.seek(-10, os.SEEK_END)
+            self.assertEqual(body.read(), whole[-10:])
+
+    def test_file_shrinking_while_sent(self):
+        with MultipartBody({}, 'image', self.path) as body:
+            os.truncate(self.path, 10)
+            self.assertRaises(OSError, body.read)
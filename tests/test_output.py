@@ -0,0 +1,167 @@
+import io
+import json
+import sys
+
+import fixtures
+import testtools
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from unittest import mock
+
+from imgur_cli import output
+from imgur_cli import utils
+
+
+class TestOutput(testtools.TestCase):
+
+    def setUp(self):
+        super(TestOutput, self).setUp()
+        self.addCleanup(output.configure)
+
+    def write(self, result, format='json'):
+        output.configure(format=format)
+        stream = io.StringIO()
+        output.write(result, stream)
+        return stream.getvalue()
+
+    def assertWritesJson(self, result, expected):
+        self.assertEqual(self.write(result),
+                         json.dumps(expected, indent=4, separators=(',', ': ')) +
+                         '\n')
+
+    def test_plain_values(self):
+        result = {'album': {'id': 'abc', 'images': [1, 2]}, 'count': 3}
+        self.assertWritesJson(result, result)
+        self.assertWritesJson({}, {})
+        self.assertWritesJson(True, True)
+
+    def test_streamed_values(self):
+        items = [{'id': 'a', 'title': 'line\nbreak'}, {'id': 'b', 'tags': []}]
+        self.assertWritesJson({'gallery': iter(items)}, {'gallery': items})
+        self.assertWritesJson({'gallery': iter([])}, {'gallery': []})
+
+    def test_nested_streamed_values(self):
+        messages = [{'id': 1}, {'id': 2}]
+        result = {'notifications': {'messages': iter(messages), 'replies': [],
+                                    'tag': {'items': iter([]), 'name': 'x'}}}
+        expected = {'notifications': {'messages': messages, 'replies': [],
+                                      'tag': {'items': [], 'name': 'x'}}}
+        self.assertWritesJson(result, expected)
+
+    def test_ndjson(self):
+        items = [{'id': 'a'}, {'id': 'b', 'nested': iter([1])}]
+        self.assertEqual(self.write({'gallery': iter(items)}, 'ndjson'),
+                         '{"id":"a"}\n{"id":"b","nested":[1]}\n')
+        self.assertEqual(self.write({'image': {'id': 'a'}}, 'ndjson'),
+                         '{"id":"a"}\n')
+        self.assertEqual(self.write({'deleted': True}, 'ndjson'),
+                         '{"deleted":true}\n')
+
+    def test_streams_before_exhausting_items(self):
+        stream = io.StringIO()
+        seen = []
+
+        def items():
+            for index in range(3):
+                seen.append(stream.getvalue().count('"id"'))
+                yield {'id': index}
+        output.write({'gallery': items()}, stream)
+        self.assertEqual(seen, [0, 1, 2])
+
+    def test_compact(self):
+        result = {'gallery': iter([{'id': 'a', 'tags': iter([1])}]), 'count': 1,
+                  'nested': {'items': iter([]), 'name': 'é'}}
+        data = self.write(result, 'compact')
+        self.assertEqual(data.count('\n'), 1)
+        self.assertNotIn(' ', data)
+        self.assertEqual(json.loads(data),
+                         {'gallery': [{'id': 'a', 'tags': [1]}], 'count': 1,
+                          'nested': {'items': [], 'name': 'é'}})
+
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        root = node = {'id': 0, 'children': []}
+        for index in range(1, depth):
+            node['children'].append({'id': index, 'children': []})
+            node = node['children'][0]
+        for format in ('json', 'compact', 'ndjson'):
+            data = self.write({'comment': root}, format)
+            self.assertEqual(data.count('"children"'), depth)
+            self.assertIn('"id":{0},"children":[]}}]}}'.format(depth - 1),
+                          data.replace(' ', '').replace('\n', ''))
+        value = {'a': [1, {'b': None, 'c': []}, {}], 'd': iter(['é']), 1: 'x'}
+        expected = {'a': [1, {'b': None, 'c': []}, {}], 'd': ['é'], '1': 'x'}
+        self.assertEqual(output._iterdumps(value), json.dumps(
+            expected, separators=(',', ':')))
+        value['d'] = iter(['é'])
+        self.assertEqual(output._iterdumps(value, output.INDENT), json.dumps(
+            expected, indent=4, separators=(',', ': ')))
+
+    def test_compact_without_orjson(self):
+        self.addCleanup(output._encoders.clear)
+        output._encoders.clear()
+        with mock.patch.dict('sys.modules', {'orjson': None}):
+            data = self.write({'gallery': iter([{'id': 'a'}])}, 'ndjson')
+        self.assertEqual(data, '{"id":"a"}\n')
+
+    @testtools.skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack(self):
+        output.configure(format='msgpack')
+        stream = io.BytesIO()
+        output.write({'gallery': iter([{'id': 'a', 'tags': iter([1])},
+                                       {'id': 'b'}])}, stream)
+        unpacker = msgpack.Unpacker(io.BytesIO(stream.getvalue()))
+        self.assertEqual(list(unpacker), [{'id': 'a', 'tags': [1]}, {'id': 'b'}])
+        # Text streams are written through their binary buffer
+        text = io.TextIOWrapper(io.BytesIO())
+        output.write({'deleted': True}, text)
+        self.assertEqual(msgpack.unpackb(text.buffer.getvalue()),
+                         {'deleted': True})
+
+    def test_csv(self):
+        items = [{'id': 'a', 'tags': ['x', 'y'], 'meta': {'w': 1, 'h': 2}},
+                 {'id': 'b', 'is_album': True, 'meta': {'w': 3, 'h': None}}]
+        self.assertEqual(self.write({'gallery': iter(items)}, 'csv'),
+                         'id,tags,meta.w,meta.h,is_album\n'
+                         'a,"[""x"",""y""]",1,2,\n'
+                         'b,,3,,true\n')
+        self.assertEqual(self.write({'count': 3}, 'csv'), 'count\n3\n')
+        self.assertEqual(self.write({'success': False}, 'csv'),
+                         'success\nfalse\n')
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, output.configure, format='xml')
+
+    def test_output_file(self):
+        path = self.useFixture(fixtures.TempDir()).join('out.json')
+        utils.generate_output({'gallery': (n for n in range(3))}, path)
+        with open(path) as json_file:
+            self.assertEqual(json.load(json_file), {'gallery': [0, 1, 2]})
+
+    def test_fields_and_where(self):
+        from imgur_cli import filters
+
+        items = [{'id': str(index), 'views': index, 'link': 'l'}
+                 for index in range(4)]
+        output.configure(format='ndjson', fields=['id', 'views'],
+                         where=[filters.parse_condition('views>=2')])
+        stream = io.StringIO()
+        output.write({'gallery': iter(items), 'album': {'id': 'a', 'x': 1},
+                      'ids': ['a'], 'count': 4}, stream)
+        self.assertEqual([json.loads(line) for line in stream.getvalue().split()],
+                         [{'id': '2', 'views': 2}, {'id': '3', 'views': 3},
+                          {'id': 'a'}, {'count': 4}])
+
+    def test_fields_inside_containers(self):
+        items = [{'id': str(index), 'views': index} for index in range(2)]
+        output.configure(format='compact', fields=['id'])
+        stream = io.StringIO()
+        output.write({'gallery_tag': {'name': 'cats', 'items': iter(items)}},
+                     stream)
+        self.assertEqual(json.loads(stream.getvalue()),
+                         {'gallery_tag': {'name': 'cats',
+                                          'items': [{'id': '0'}, {'id': '1'}]}})
@@ -0,0 +1,64 @@
+import argparse
+import io
+
+import testtools
+
+from unittest import mock
+
+from imgur_cli import pagination
+
+
+def fake_fetch(pages, calls):
+    def fetch(page):
+        calls.append(page)
+        return pages[page] if page < len(pages) else []
+    return fetch
+
+
+class TestPagination(testtools.TestCase):
+
+    def setUp(self):
+        super(TestPagination, self).setUp()
+        self.calls = []
+        self.fetch = fake_fetch([[1, 2], [3, 4], [5]], self.calls)
+
+    def test_iter_pages_stops_on_empty_page(self):
+        self.assertEqual(list(pagination.iter_pages(self.fetch)),
+                         [(0, [1, 2]), (1, [3, 4]), (2, [5])])
+        self.assertEqual(self.calls, [0, 1, 2, 3])
+
+    def test_iter_pages_is_lazy(self):
+        pages = pagination.iter_pages(self.fetch, start=1)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(next(pages), (1, [3, 4]))
+        self.assertEqual(self.calls, [1])
+
+    def test_iter_items_limits(self):
+        self.assertEqual(list(pagination.iter_items(self.fetch, max_pages=2)),
+                         [1, 2, 3, 4])
+        self.assertEqual(self.calls, [0, 1])
+        del self.calls[:]
+        self.assertEqual(list(pagination.iter_items(self.fetch, max_items=3)),
+                         [1, 2, 3])
+        self.assertEqual(self.calls, [0, 1])
+
+    def test_paginate(self):
+        args = argparse.Namespace(page=1, all_pages=False)
+        self.assertEqual(pagination.paginate(self.fetch, args), [3, 4])
+        args = argparse.Namespace(page=1, all_pages=True, max_pages=None,
+                                  max_items=None)
+        self.assertEqual(list(pagination.paginate(self.fetch, args)), [3, 4, 5])
+
+    def test_iter_pages_concurrent(self):
+        pages = pagination.iter_pages_concurrent(self.fetch, concurrency=3)
+        self.assertEqual(list(pages), [(0, [1, 2]), (1, [3, 4]), (2, [5])])
+        self.assertEqual(sorted(self.calls)[:4], [0, 1, 2, 3])
+        self.assertLessEqual(len(self.calls), 6)
+
+    def test_paginate_concurrency_reports(self):
+        args = argparse.Namespace(page=0, all_pages=True, max_pages=None,
+                                  max_items=None, concurrency=2)
+        with mock.patch('sys.stderr', io.StringIO()) as stderr:
+            self.assertEqual(list(pagination.paginate(self.fetch, args)),
+                             [1, 2, 3, 4, 5])
+        self.assertIn('pages/s', stderr.getvalue())
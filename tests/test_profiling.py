@@ -0,0 +1,109 @@
+import io
+import itertools
+import os
+import pstats
+
+import fixtures
+import testtools
+
+from imgur_cli import cli
+from imgur_cli import output
+from imgur_cli import profiling
+from imgur_cli.client import ImgurClient
+from tests.fake_imgur import FakeImgurServer
+
+
+class TestProfiler(testtools.TestCase):
+
+    def test_requested(self):
+        self.assertIsNone(profiling.requested(['gallery', 'items']))
+        self.assertIsNone(profiling.requested(['--profiled', 'x']))
+        options = profiling.requested(['--profile', 'gallery', 'items'])
+        self.assertTrue(options.profile)
+        self.assertIsNone(options.profile_output)
+        options = profiling.requested(['--profile-output', 'out.prof', 'help'])
+        self.assertEqual(options.profile_output, 'out.prof')
+
+    def test_nested_phases_charge_innermost(self):
+        clock = itertools.count()
+        profiler = profiling.Profiler(clock=lambda: next(clock))
+        # command 0-1, http 1-3, command 3-4, models 4-5, command 5-6
+        with profiler.phase('command'):
+            with profiler.phase('http'):
+                next(clock)
+            with profiler.phase('models'):
+                pass
+        self.assertEqual(profiler.totals['command'], 3)
+        self.assertEqual(profiler.totals['http'], 2)
+        self.assertEqual(profiler.totals['models'], 1)
+        self.assertEqual(profiler.calls['command'], 1)
+        summary = profiler.summary(10)
+        self.assertIn('command', summary)
+        self.assertIn('other', summary)
+        self.assertNotIn('parser', summary)
+
+    def test_instrument_and_uninstall(self):
+        write = output.write
+        send_request = ImgurClient.send_request
+        profiler = profiling.Profiler()
+        profiler.instrument()
+        profiler.instrument()
+        self.addCleanup(profiler.uninstall)
+        self.assertIsNot(output.write, write)
+        self.assertIsNot(ImgurClient.send_request, send_request)
+        output.write({'a': 1}, io.StringIO())
+        self.assertEqual(profiler.calls['output'], 1)
+        profiler.uninstall()
+        self.assertIs(output.write, write)
+        self.assertIs(ImgurClient.send_request, send_request)
+
+
+class TestProfileOption(testtools.TestCase):
+
+    def setUp(self):
+        super(TestProfileOption, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        self.useFixture(fixtures.MonkeyPatch('imgur_cli.client.API_URL',
+                                             self.server.url))
+        for name, value in (('IMGUR_CLIENT_ID', 'client_id'),
+                            ('IMGUR_CLIENT_SECRET', 'client_secret'),
+                            ('IMGUR_ACCESS_TOKEN', None),
+                            ('IMGUR_REFRESH_TOKEN', None),
+                            ('IMGUR_MASHAPE_KEY', None),
+                            ('IMGUR_CLI_CACHE_DIR',
+                             self.useFixture(fixtures.TempDir()).path)):
+            self.useFixture(fixtures.EnvironmentVariable(name, value))
+        self.stdout = self.useFixture(fixtures.StringStream('stdout')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', self.stdout))
+        self.stderr = self.useFixture(fixtures.StringStream('stderr')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stderr', self.stderr))
+
+    def test_profile(self):
+        write = output.write
+        _cli = cli.ImgurCli()
+        _cli.main(['--profile', 'gallery', 'items'])
+        self.stderr.seek(0)
+        summary = self.stderr.read()
+        for phase in ('parser', 'credentials', 'client', 'command', 'http',
+                      'models', 'output', 'total'):
+            self.assertIn(phase, summary)
+        self.assertIs(_cli.profiler, profiling.DISABLED)
+        self.assertIs(output.write, write)
+        self.stdout.seek(0)
+        self.assertIn('"gallery"', self.stdout.read())
+
+    def test_profile_output(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path, 'out.prof')
+        cli.ImgurCli().main(['--profile-output', path, 'image', 'id', 'abc'])
+        stats = pstats.Stats(path)
+        self.assertTrue(any(name == 'dispatch'
+                            for _, _, name in stats.stats))
+
+    def test_disabled(self):
+        write = output.write
+        _cli = cli.ImgurCli()
+        _cli.main(['image', 'id', 'abc'])
+        self.assertIs(output.write, write)
+        self.stderr.seek(0)
+        self.assertEqual(self.stderr.read(), '')
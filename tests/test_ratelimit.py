@@ -0,0 +1,142 @@
+import fixtures
+import testtools
+
+from imgurpython.helpers.error import ImgurClientRateLimitError
+
+from imgur_cli import client
+from imgur_cli import ratelimit
+from tests.fake_imgur import FakeImgurServer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def headers(remaining, reset, limit=1000, client_remaining=10000):
+    return {'X-RateLimit-UserLimit': str(limit),
+            'X-RateLimit-UserRemaining': str(remaining),
+            'X-RateLimit-UserReset': str(int(reset)),
+            'X-RateLimit-ClientLimit': '12500',
+            'X-RateLimit-ClientRemaining': str(client_remaining)}
+
+
+class TestRateLimiter(testtools.TestCase):
+
+    def setUp(self):
+        super(TestRateLimiter, self).setUp()
+        self.clock = FakeClock()
+
+    def make_limiter(self, **kwargs):
+        return ratelimit.RateLimiter(clock=self.clock, sleep=self.clock.sleep,
+                                     **kwargs)
+
+    def test_full_speed_without_budget(self):
+        limiter = self.make_limiter()
+        for _ in range(100):
+            limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_full_speed_with_plenty_left(self):
+        limiter = self.make_limiter()
+        limiter.update(headers(900, self.clock.now + 3600))
+        for _ in range(100):
+            limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(limiter.credits['UserRemaining'], 800)
+
+    def test_paces_when_low(self):
+        limiter = self.make_limiter(burst=1)
+        # 100 spare credits over 1000 seconds: one request every 10 seconds
+        limiter.update(headers(110, self.clock.now + 1000))
+        start = self.clock.now
+        for _ in range(5):
+            limiter.acquire()
+        self.assertEqual(len(self.clock.sleeps), 4)
+        self.assertGreater(self.clock.now - start, 35)
+        self.assertEqual(limiter.waited, sum(self.clock.sleeps))
+
+    def test_pauses_at_reserve_until_reset(self):
+        limiter = self.make_limiter()
+        reset = self.clock.now + 600
+        limiter.update(headers(ratelimit.RESERVE, reset))
+        limiter.acquire()
+        self.assertGreater(self.clock.now, reset)
+
+    def test_client_budget_exhausted(self):
+        limiter = self.make_limiter()
+        limiter.update(headers(900, self.clock.now + 3600, client_remaining=5))
+        self.assertRaises(ImgurClientRateLimitError, limiter.acquire)
+
+    def test_state_saved(self):
+        path = self.useFixture(fixtures.TempDir()).join('cache', 'credits.json')
+        limiter = self.make_limiter(state_path=path)
+        limiter.update(headers(900, 5000))
+        state = ratelimit.load_state(path)
+        self.assertEqual(state['UserRemaining'], 900)
+        self.assertEqual(state['updated'], 1000)
+        restored = self.make_limiter(state_path=path)
+        self.assertEqual(restored.credits['UserReset'], 5000)
+        self.assertIsNone(ratelimit.load_state(path + '.missing'))
+
+    def test_saved_state_reset_since(self):
+        path = self.useFixture(fixtures.TempDir()).join('credits.json')
+        limiter = self.make_limiter(state_path=path)
+        limiter.update(headers(5, self.clock.now + 600, client_remaining=5))
+        self.assertRaises(ImgurClientRateLimitError, limiter.acquire)
+        # Saved exhaustion alone never fails a run: only a live response does
+        restored = self.make_limiter(state_path=path)
+        self.assertEqual(restored.credits['ClientRemaining'], 5)
+        restored.acquire()
+        self.assertGreater(self.clock.now, 1600)
+        # A day later both budgets have been reset
+        self.clock.now += ratelimit.CLIENT_WINDOW
+        restored = self.make_limiter(state_path=path)
+        self.assertIsNone(restored.credits['ClientRemaining'])
+        self.assertIsNone(restored.credits['UserRemaining'])
+        start = self.clock.now
+        restored.acquire()
+        self.assertEqual(self.clock.now, start)
+
+    def test_state_file_per_client(self):
+        self.assertNotEqual(ratelimit.state_file('one'),
+                            ratelimit.state_file('two'))
+        self.assertTrue(ratelimit.state_file('one').endswith('.json'))
+
+    def test_consumed_credits(self):
+        path = self.useFixture(fixtures.TempDir()).join('credits.json')
+        limiter = self.make_limiter(state_path=path)
+        self.assertEqual(limiter.update(headers(900, 5000)), {})
+        self.assertEqual(limiter.update(headers(897, 5000, client_remaining=9990)),
+                         {'User': 3, 'Client': 10})
+        # Out of order
+        self.assertEqual(limiter.update(headers(898, 5000, client_remaining=9990)),
+                         {'User': 0, 'Client': 0})
+        # A new window: 1000 credits, 2 used since
+        self.assertEqual(limiter.update(headers(998, 9000, client_remaining=9989)),
+                         {'User': 2, 'Client': 1})
+        # Other processes may have used the saved credits: the first response
+        # of a run is only the baseline
+        restored = self.make_limiter(state_path=path)
+        self.assertEqual(restored.update(headers(990, 9000, client_remaining=9980)),
+                         {})
+        self.assertEqual(restored.update(headers(989, 9000, client_remaining=9979)),
+                         {'User': 1, 'Client': 1})
+
+    def test_client_records_headers(self):
+        server = FakeImgurServer().start()
+        self.addCleanup(server.stop)
+        limiter = ratelimit.RateLimiter()
+        _client = client.ImgurClient('client_id', 'client_secret',
+                                     api_url=server.url, rate_limiter=limiter)
+        _client.get_image('abc')
+        self.assertEqual(limiter.credits['ClientRemaining'], 12499)
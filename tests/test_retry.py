@@ -0,0 +1,140 @@
+import email.utils
+import time
+
+import requests
+import testtools
+
+from imgurpython.helpers.error import ImgurClientError, ImgurClientRateLimitError
+
+from imgur_cli import client
+from imgur_cli import metrics
+from imgur_cli import retry
+from tests.fake_imgur import FakeImgurServer, fake_image
+
+
+class TestRetryPolicy(testtools.TestCase):
+
+    def make_policy(self, **kwargs):
+        return retry.RetryPolicy(clock=lambda: 1000.0, random=lambda: 0.5,
+                                 **kwargs)
+
+    def test_backoff(self):
+        policy = self.make_policy(attempts=5, base=1, cap=6)
+        self.assertEqual([policy.delay(attempt) for attempt in range(5)],
+                         [0.5, 1.0, 2.0, 3.0, None])
+        self.assertEqual(policy.delay(0, 503, {}), 0.5)
+        self.assertIsNone(policy.delay(0, 404, {}))
+        self.assertIsNone(policy.delay(0, 400, {}))
+
+    def test_retry_after(self):
+        policy = self.make_policy(max_wait=60)
+        self.assertEqual(policy.delay(0, 503, {'Retry-After': '7'}), 7.0)
+        # Backoff wins when it is longer
+        self.assertEqual(policy.delay(0, 503, {'Retry-After': '0'}), 0.25)
+        date = email.utils.formatdate(1010.0, usegmt=True)
+        self.assertEqual(policy.delay(0, 429, {'Retry-After': date}), 10.0)
+        self.assertIsNone(policy.delay(0, 429, {'Retry-After': '61'}))
+        self.assertEqual(policy.delay(0, 503, {'Retry-After': 'soon'}), 0.25)
+
+    def test_rate_limit_reset(self):
+        policy = self.make_policy(max_wait=60)
+        headers = {'X-RateLimit-UserRemaining': '0',
+                   'X-RateLimit-UserReset': '1030'}
+        self.assertEqual(policy.delay(0, 429, headers), 30.0)
+        headers['X-RateLimit-UserReset'] = '5000'
+        self.assertIsNone(policy.delay(0, 429, headers))
+        headers['X-RateLimit-UserRemaining'] = '10'
+        self.assertEqual(policy.delay(0, 429, headers), 0.25)
+
+    def test_methods(self):
+        policy = self.make_policy()
+        self.assertTrue(policy.retries_method('GET'))
+        self.assertFalse(policy.retries_method('post'))
+        self.assertFalse(policy.retries_method('delete'))
+        self.assertFalse(self.make_policy(attempts=1).retries_method('get'))
+
+
+class TestClientRetries(testtools.TestCase):
+
+    def setUp(self):
+        super(TestClientRetries, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        self.sleeps = []
+        self.policy = retry.RetryPolicy(sleep=self.sleeps.append,
+                                        random=lambda: 1.0)
+        self.metrics = metrics.RequestMetrics()
+        self.client = client.ImgurClient('client_id', 'client_secret',
+                                         api_url=self.server.url,
+                                         retry=self.policy, metrics=self.metrics)
+
+    def fail(self, method, pattern, statuses, data, headers=None):
+        statuses = iter(statuses)
+
+        def handler(request, **kwargs):
+            status = next(statuses, 200)
+            if status == 200:
+                return 200, data
+            return status, {'error': 'Unavailable'}, headers or {}
+        self.server.route(method, pattern, handler)
+
+    def test_transient_errors_retried(self):
+        self.fail('GET', r'3/image/abc', [503, 502, 429], fake_image('abc'))
+        self.assertEqual(self.client.get_image('abc').id, 'abc')
+        self.assertEqual(self.sleeps, [0.5, 1.0, 2.0])
+        self.assertEqual((self.policy.retries, self.policy.backoff), (3, 3.5))
+        summary = self.metrics.summary()
+        self.assertEqual(summary['retries'], 3)
+        self.assertEqual(summary['backoff_seconds'], 3.5)
+
+    def test_gives_up(self):
+        self.fail('GET', r'3/image/abc', [500] * 10, fake_image('abc'))
+        error = self.assertRaises(ImgurClientError, self.client.get_image, 'abc')
+        self.assertEqual(error.status_code, 500)
+        self.assertEqual(len(self.sleeps), retry.ATTEMPTS - 1)
+
+    def test_long_retry_after_not_waited(self):
+        self.fail('GET', r'3/image/abc', [429], fake_image('abc'),
+                  {'Retry-After': '3600'})
+        self.assertRaises(ImgurClientRateLimitError, self.client.get_image, 'abc')
+        self.assertEqual(self.sleeps, [])
+
+    def test_posts_not_retried(self):
+        self.fail('POST', r'3/upload', [503], {'id': 'x'})
+        self.assertRaises(ImgurClientError, self.client.upload_from_url,
+                          'http://example.com/a.png', anon=True)
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(self.server.requests[-1], ('POST', '3/upload'))
+        self.assertEqual(self.server.requests.count(('POST', '3/upload')), 1)
+
+    def test_connection_errors_retried(self):
+        request = self.client.session.request
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise requests.ConnectionError('Connection reset by peer')
+            return request(*args, **kwargs)
+        self.client.session.request = flaky
+        self.assertEqual(self.client.get_image('abc').id, 'abc')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.sleeps, [0.5])
+        calls.clear()
+        self.assertRaises(requests.ConnectionError, self.client.upload_from_url,
+                          'http://example.com/a.png', anon=True)
+        self.assertEqual(len(calls), 1)
+
+    def test_read_timeouts_retried(self):
+        calls = []
+
+        def slow(request):
+            calls.append(request.path)
+            if len(calls) == 1:
+                time.sleep(0.5)
+            return 200, fake_image('abc')
+        self.server.route('GET', r'3/image/abc', slow)
+        self.client.timeout = (5.0, 0.1)
+        self.assertEqual(self.client.get_image('abc').id, 'abc')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.sleeps, [0.5])
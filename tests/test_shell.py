@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import types
+
+import fixtures
+import testtools
+
+from unittest import mock
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+import imgur_cli.cli as cli
+from imgur_cli import shell
+
+FAKE_ENV = {'IMGUR_CLIENT_ID': 'client_id',
+            'IMGUR_CLIENT_SECRET': 'client_secret'}
+
+
+class TestShell(testtools.TestCase):
+
+    def setUp(self):
+        super(TestShell, self).setUp()
+        self.useFixture(fixtures.MonkeyPatch('os.environ', dict(FAKE_ENV)))
+        self.mock_client = mock.patch('imgur_cli.client.ImgurClient')
+        self._client = self.mock_client.start()
+        self.addCleanup(self.mock_client.stop)
+        self.mock_output = mock.patch('imgur_cli.cli_api.generate_output')
+        self.output = self.mock_output.start()
+        self.addCleanup(self.mock_output.stop)
+        self.cli = cli.ImgurCli()
+        self.cli.generate_parser()
+
+    def test_split_line(self):
+        self.assertEqual(shell.split_line('album id "a b"  # comment\n'),
+                         ['album', 'id', 'a b'])
+        self.assertEqual(shell.split_line('   \n'), [])
+
+    def test_run_shell_reuses_client(self):
+        stream = io.StringIO('image id 123\n\n# comment\nalbum id abc\nexit\n'
+                             'image id 456\n')
+        status = shell.run_shell(self.cli, stream)
+        self.assertEqual(status, 0)
+        self.assertEqual(self._client.call_count, 1)
+        self.cli.client.get_image.assert_called_once_with('123')
+        self.cli.client.get_album.assert_called_once_with('abc')
+
+    def test_run_shell_survives_errors(self):
+        stream = io.StringIO('image foofoo\nshell\nimage id 123\n')
+        with mock.patch('sys.stderr', io.StringIO()):
+            status = shell.run_shell(self.cli, stream)
+        self.assertEqual(status, 0)
+        self.cli.client.get_image.assert_called_once_with('123')
+
+    def test_run_shell_profiles(self):
+        stream = io.StringIO('image id 123\n--profile image id 456\n'
+                             'image id 789\n')
+        stderr = io.StringIO()
+        with mock.patch('sys.stderr', stderr):
+            status = shell.run_shell(self.cli, stream)
+        self.assertEqual(status, 0)
+        lines = stderr.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines],
+                         ['phase', 'parser', 'command', 'other', 'total'])
+        self.assertIs(self.cli.profiler, cli.profiling.DISABLED)
+
+    def test_run_exit_status(self):
+        with mock.patch('sys.stderr', io.StringIO()):
+            self.assertEqual(self.cli.run(['image', 'id']), 2)
+        self.assertEqual(self.cli.run(['image', 'id', '123']), 0)
+        with mock.patch.object(self.cli, 'dispatch', return_value=3):
+            self.assertEqual(self.cli.run(['image', 'id', '123']), 3)
+
+    def test_daemon_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), 'imgur.sock')
+        server = shell.ShellServer(path, self.cli)
+        self.addCleanup(server.server_close)
+        self.output.side_effect = lambda result, *args: print('out', result)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = shell.forward(path, ['gallery', 'comment-count', 'abc'],
+                               stdout, stderr)
+        thread.join()
+        self.assertEqual(status, 0)
+        self.assertIn('out', stdout.getvalue())
+        self.cli.client.gallery_comment_count.assert_called_once_with('abc')
+
+    def test_daemon_socket_is_private(self):
+        path = os.path.join(tempfile.mkdtemp(), 'imgur.sock')
+        server = shell.ShellServer(path, self.cli)
+        self.addCleanup(server.server_close)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_daemon_runs_in_client_directory(self):
+        path = os.path.join(tempfile.mkdtemp(), 'imgur.sock')
+        server = shell.ShellServer(path, self.cli)
+        self.addCleanup(server.server_close)
+        self.output.side_effect = lambda result, *args: print(os.getcwd())
+        directory = os.path.realpath(self.useFixture(fixtures.TempDir()).path)
+        here = os.getcwd()
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        with client, client.makefile('rwb') as connection:
+            request = {'argv': ['gallery', 'comment-count', 'abc'],
+                       'cwd': directory}
+            connection.write(json.dumps(request).encode('utf-8') + b'\n')
+            connection.flush()
+            frames = [json.loads(line.decode('utf-8')) for line in connection]
+        thread.join()
+        self.assertEqual(frames, [{'stdout': directory}, {'stdout': '\n'},
+                                  {'exit': 0}])
+        self.assertEqual(os.getcwd(), here)
+
+    @testtools.skipUnless(msgpack, 'msgpack is not installed')
+    def test_daemon_binary_output(self):
+        path = os.path.join(tempfile.mkdtemp(), 'imgur.sock')
+        server = shell.ShellServer(path, self.cli)
+        self.addCleanup(server.server_close)
+        self.addCleanup(cli.output.configure)
+        self.mock_output.stop()
+        self._client.return_value.get_image.return_value = \
+            types.SimpleNamespace(id='abc', title='cats')
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        stdout = io.TextIOWrapper(io.BytesIO())
+        status = shell.forward(path, ['--format', 'msgpack', 'image', 'id',
+                                      'abc'], stdout, io.StringIO())
+        thread.join()
+        self.assertEqual(status, 0)
+        self.assertEqual(msgpack.unpackb(stdout.buffer.getvalue()),
+                         {'id': 'abc', 'title': 'cats'})
+
+    def test_forward_reading_stdin_runs_locally(self):
+        path = os.path.join(tempfile.mkdtemp(), 'imgur.sock')
+        server = shell.ShellServer(path, self.cli)
+        self.addCleanup(server.server_close)
+        self.assertIsNone(shell.forward(path, ['image', 'id', '-']))
+
+    def test_forward_without_daemon(self):
+        path = os.path.join(tempfile.mkdtemp(), 'missing.sock')
+        self.assertIsNone(shell.forward(path, ['help']))
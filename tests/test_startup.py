@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import testtools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = {'imgurpython', 'requests', 'urllib3', 'chardet', 'idna',
+                 'sqlite3'}
+
+
+class TestStartupImports(testtools.TestCase):
+
+    def imported_modules(self, argv):
+        """Run the CLI under -X importtime and return the packages it loaded"""
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-m',
+                                  'imgur_cli.cli'] + argv,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 env=env, cwd=ROOT, universal_newlines=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        modules = set()
+        for line in process.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                modules.add(line.rsplit('|', 1)[1].strip().split('.')[0])
+        # Sanity check that importtime output was actually parsed
+        self.assertIn('imgur_cli', modules)
+        return modules
+
+    def test_help_does_not_import_requests(self):
+        for argv in (['help'], ['help', 'gallery'], []):
+            self.assertEqual(self.imported_modules(argv) & HEAVY_MODULES, set())
+
+    def test_version_does_not_import_requests(self):
+        self.assertEqual(self.imported_modules(['--version']) & HEAVY_MODULES,
+                         set())
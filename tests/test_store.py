@@ -0,0 +1,154 @@
+import io
+import sqlite3
+import sys
+
+import fixtures
+import testtools
+
+from imgur_cli import exceptions
+from imgur_cli import output
+from imgur_cli import store
+from tests.fake_imgur import (fake_album, fake_comment, fake_gallery_item,
+                              fake_image)
+
+NOW = 1446568913 + 86400
+
+
+class TestStore(testtools.TestCase):
+
+    def setUp(self):
+        super(TestStore, self).setUp()
+        self.path = self.useFixture(fixtures.TempDir()).join('store', 'items.db')
+        self.store = self.open()
+
+    def open(self, **kwargs):
+        item_store = store.Store(self.path, clock=lambda: NOW, **kwargs)
+        self.addCleanup(item_store.connection.close)
+        return item_store
+
+    def ids(self, **kwargs):
+        return [item['id'] for item in self.store.query(**kwargs)]
+
+    def test_kind_of(self):
+        self.assertEqual(store.kind_of(fake_image('abc')), 'image')
+        self.assertEqual(store.kind_of(fake_gallery_item(1)), 'image')
+        self.assertEqual(store.kind_of(fake_album('xyz')), 'album')
+        self.assertEqual(store.kind_of(dict(fake_gallery_item(1), is_album=True)),
+                         'album')
+        self.assertEqual(store.kind_of(fake_comment(1)), 'comment')
+        self.assertIsNone(store.kind_of({'id': 1, 'url': 'someone'}))
+        self.assertIsNone(store.kind_of({'name': 'cats', 'followers': 10}))
+
+    def test_capture_streams_and_stores(self):
+        items = [fake_gallery_item(index) for index in range(5)]
+        self.store.context = {'section': 'hot'}
+        result = self.store.capture({'gallery': iter(items)})
+        self.assertEqual(self.ids(), [])
+        self.assertEqual(list(result['gallery']), items)
+        self.store.close()
+        self.store = self.open()
+        self.assertEqual(self.ids(), ['g4', 'g3', 'g2', 'g1', 'g0'])
+        self.assertEqual(self.ids(section='hot', gallery=True, sort='views',
+                                  limit=2), ['g4', 'g3'])
+        self.assertEqual(next(self.store.query(limit=1)), items[4])
+
+    def test_upsert_keeps_account_and_section(self):
+        self.store.context = {'section': 'hot', 'account': 'someone'}
+        self.store.add(fake_gallery_item(1))
+        self.store.flush()
+        self.store.context = {}
+        self.store.add(dict(fake_image('g1', 1), views=1000))
+        self.store.flush()
+        items = list(self.store.query())
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['views'], 1000)
+        self.assertEqual(self.ids(section='hot', account='someone', gallery=True),
+                         ['g1'])
+
+    def test_batched_transactions(self):
+        self.store.batch_size = 2
+        for index in range(3):
+            self.store.add(fake_image('i{0}'.format(index), index))
+        reader = sqlite3.connect(self.path)
+        self.addCleanup(reader.close)
+        count = 'SELECT count(*) FROM items'
+        self.assertEqual(reader.execute(count).fetchone()[0], 2)
+        self.store.close()
+        self.assertEqual(reader.execute(count).fetchone()[0], 3)
+
+    def test_tags_albums_and_comments(self):
+        tagged = dict(fake_gallery_item(1), tags=[{'name': 'Cats'}])
+        self.store.capture({'gallery_tag': {'name': 'cats',
+                                            'items': iter([tagged])}})
+        self.assertEqual(list(self.store.capture({'gallery_tag': {
+            'name': 'cats', 'items': iter([tagged])}})['gallery_tag']['items']),
+            [tagged])
+        self.store.capture({'album': fake_album('xyz')})
+        self.store.capture({'comments': [fake_comment(1, [fake_comment(2)])]})
+        self.store.flush()
+        self.assertEqual(self.ids(tag='cats'), ['g1'])
+        self.assertEqual(self.ids(kind='album'), ['xyz'])
+        self.assertEqual(sorted(self.ids(kind='comment', account='author')),
+                         [1, 2])
+        comment = next(self.store.query(kind='comment', limit=1))
+        self.assertNotIn('children', comment)
+
+    def test_tags_without_name(self):
+        tagged = dict(fake_gallery_item(1),
+                      tags=[{'name': None}, {'display_name': 'Dogs'}, 'Cats'])
+        list(self.store.capture({'gallery': iter([tagged])})['gallery'])
+        self.store.flush()
+        self.assertEqual(self.ids(tag='cats'), ['g1'])
+        rows = self.store.execute('SELECT count(*) AS n FROM tags')
+        self.assertEqual(list(rows), [{'n': 1}])
+
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        root = node = fake_comment(0)
+        for index in range(1, depth):
+            node['children'].append(fake_comment(index))
+            node = node['children'][0]
+        self.assertTrue(self.store.add(root))
+        self.store.flush()
+        rows = self.store.execute('SELECT count(*) AS n FROM items')
+        self.assertEqual(list(rows), [{'n': depth}])
+
+    def test_since_and_until(self):
+        for index in range(3):
+            self.store.add(fake_image('i{0}'.format(index), index * 3600))
+        self.store.flush()
+        since = store.parse_since('2015-11-03T16:41:53')
+        self.assertEqual(since, 1446568913)
+        self.assertEqual(self.ids(since=since + 1), ['i2', 'i1'])
+        self.assertEqual(self.ids(since=since, until=since + 3600), ['i0'])
+        self.assertEqual(store.parse_since('day', now=NOW), NOW - 86400)
+        self.assertEqual(store.parse_since('2h', now=NOW), NOW - 7200)
+        self.assertRaises(exceptions.CommandError, store.parse_since, 'lately')
+
+    def test_execute_is_read_only(self):
+        self.store.add(fake_image('abc'))
+        self.store.flush()
+        rows = list(self.store.execute('SELECT kind, count(*) AS n FROM items '
+                                       'GROUP BY kind'))
+        self.assertEqual(rows, [{'kind': 'image', 'n': 1}])
+        self.assertRaises(exceptions.CommandError, list,
+                          self.store.execute('DELETE FROM items'))
+
+    def test_missing_store(self):
+        self.assertRaises(exceptions.CommandError, store.Store,
+                          self.path + '.missing', create=False)
+
+    def test_output_records_to_store(self):
+        self.addCleanup(output.configure)
+        self.addCleanup(output.record_to, None)
+        output.configure(format='ndjson', fields=['id'])
+        output.record_to(self.store)
+        stream = io.StringIO()
+        output.write({'images': iter([fake_image('abc'), fake_image('def')])},
+                     stream)
+        self.store.flush()
+        self.assertEqual(stream.getvalue(), '{"id":"abc"}\n{"id":"def"}\n')
+        # The store has the full records, not the --fields projection
+        self.assertEqual(sorted(item['link'] for item in self.store.query()),
+                         ['http://i.imgur.com/abc.png',
+                          'http://i.imgur.com/def.png'])
@@ -0,0 +1,120 @@
+import json
+import os
+
+import fixtures
+import testtools
+
+from imgur_cli import client
+from imgur_cli import sync
+from tests.fake_imgur import FakeImgurServer
+
+ID_PAGE_SIZE = 100
+
+
+class TestAccountSync(testtools.TestCase):
+
+    def setUp(self):
+        super(TestAccountSync, self).setUp()
+        self.server = FakeImgurServer(pages=3, page_size=60).start()
+        self.addCleanup(self.server.stop)
+        self.image_ids = ['i{0}'.format(index) for index in range(180)]
+        self.album_ids = ['a1', 'a2']
+        self.route_ids('images', self.image_ids)
+        self.route_ids('albums', self.album_ids)
+        self.server.route('GET', r'3/image/bad',
+                          lambda request: (404, {'error': 'Unable to find image'}))
+        self.client = client.ImgurClient('client_id', 'client_secret',
+                                         api_url=self.server.url)
+        self.snapshot = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                     'snapshots', 'someone.json')
+        self.stderr = self.useFixture(fixtures.StringStream('stderr')).stream
+        self.useFixture(fixtures.MonkeyPatch('sys.stderr', self.stderr))
+
+    def route_ids(self, name, ids):
+        def id_page(request, page):
+            page = int(page)
+            return 200, ids[page * ID_PAGE_SIZE:(page + 1) * ID_PAGE_SIZE]
+        self.server.route('GET', r'3/account/\w+/{0}/count'.format(name),
+                          lambda request: (200, len(ids)))
+        self.server.route('GET', r'3/account/\w+/{0}/ids/(?P<page>\d+)'.format(
+            name), id_page)
+        self.server.route('GET', r'3/account/\w+/albums/(?P<page>\d+)',
+                          lambda request, page: (200, []))
+
+    def sync(self, **kwargs):
+        del self.server.requests[:]
+        kinds = sync.account_kinds(self.client, 'someone')
+        return list(sync.sync(kinds, self.snapshot, **kwargs))
+
+    def read_stderr(self):
+        self.stderr.seek(0)
+        return self.stderr.read()
+
+    def requested(self, prefix):
+        return [path for _, path in self.server.requests
+                if path.startswith(prefix)]
+
+    def test_first_sync_reads_listing(self):
+        changes = self.sync()
+        images = [change for change in changes if change['kind'] == 'image']
+        self.assertEqual([change['id'] for change in images], self.image_ids)
+        self.assertEqual({change['change'] for change in changes}, {'added'})
+        self.assertEqual(images[3]['item']['title'], 'Image 3')
+        # Listing pages instead of 180 lookups, and the 2 ID pages the count
+        # calls for plus one
+        self.assertEqual(self.requested('3/image/'), [])
+        self.assertEqual(len(self.requested('3/account/someone/images/ids/')), 3)
+        albums = [change['id'] for change in changes if change['kind'] == 'album']
+        self.assertEqual(albums, ['a1', 'a2'])
+        with open(self.snapshot) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        self.assertEqual(len(snapshot['items']['image']), 180)
+        self.assertIn('images: 180 added, 0 removed, 0 unchanged',
+                      self.read_stderr())
+
+    def test_incremental_sync(self):
+        self.sync()
+        self.image_ids.remove('i5')
+        self.image_ids.append('new1')
+        self.album_ids.remove('a2')
+        changes = self.sync()
+        self.assertEqual(
+            [(change['kind'], change['change'], change['id'])
+             for change in changes],
+            [('image', 'removed', 'i5'), ('image', 'added', 'new1'),
+             ('album', 'removed', 'a2')])
+        self.assertEqual(changes[0]['item']['title'], 'Image 5')
+        self.assertEqual(self.requested('3/image/'), ['3/image/new1'])
+        self.assertEqual(self.requested('3/account/someone/images/0'), [])
+        self.assertEqual(self.sync(), [])
+
+    def test_listing_stops_once_new_items_found(self):
+        self.sync()
+        with open(self.snapshot) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        for index in range(10):
+            del snapshot['items']['image']['i{0}'.format(index)]
+        sync.save_snapshot(self.snapshot, snapshot)
+        changes = self.sync()
+        self.assertEqual([change['id'] for change in changes],
+                         ['i{0}'.format(index) for index in range(10)])
+        # All of them are on the first page of the listing
+        self.assertEqual(self.requested('3/account/someone/images/0'),
+                         ['3/account/someone/images/0'])
+        self.assertEqual(self.requested('3/account/someone/images/1'), [])
+        self.assertEqual(self.requested('3/image/'), [])
+
+    def test_failed_lookups_retried_next_time(self):
+        self.sync()
+        self.image_ids.append('bad')
+        changes = self.sync()
+        self.assertEqual(changes, [{'kind': 'image', 'change': 'added',
+                                    'id': 'bad',
+                                    'error': '(404) Unable to find image'}])
+        self.assertIn('1 failed', self.read_stderr())
+        self.assertEqual(len(self.sync()), 1)
+
+    def test_dry_run(self):
+        self.sync(dry_run=True)
+        self.assertFalse(os.path.exists(self.snapshot))
+        self.assertEqual(len(self.sync()), 182)
@@ -0,0 +1,114 @@
+import os
+import stat
+import threading
+
+import fixtures
+import testtools
+
+from imgur_cli import client
+from imgur_cli import tokens
+from tests.fake_imgur import FakeImgurServer
+
+ACCOUNT = {'id': 1, 'url': 'me', 'bio': None, 'reputation': 0, 'created': 0,
+           'pro_expiration': False}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenStore(testtools.TestCase):
+
+    def setUp(self):
+        super(TestTokenStore, self).setUp()
+        self.server = FakeImgurServer().start()
+        self.addCleanup(self.server.stop)
+        self.path = self.useFixture(fixtures.TempDir()).join('tokens.json')
+        self.clock = FakeClock()
+        self.refreshes = 0
+        self.authorization = []
+        self._lock = threading.Lock()
+        self.server.route('POST', r'oauth2/token', self.token)
+        self.server.route('GET', r'3/account/me', self.account)
+
+    def token(self, request):
+        with self._lock:
+            self.refreshes += 1
+            access_token = 'token{0}'.format(self.refreshes)
+        return 200, {'access_token': access_token, 'expires_in': 3600,
+                     'refresh_token': 'refresh_token'}
+
+    def account(self, request):
+        self.authorization.append(request.headers['Authorization'])
+        if request.headers['Authorization'] == 'Bearer expired':
+            return 403, {'error': 'expired'}
+        return 200, ACCOUNT
+
+    def make_store(self):
+        return tokens.TokenStore(self.path, 'client_id', clock=self.clock)
+
+    def make_client(self, access_token='env_token'):
+        return client.ImgurClient('client_id', 'client_secret', access_token,
+                                  'refresh_token', api_url=self.server.url,
+                                  token_store=self.make_store())
+
+    def test_env_token_kept_without_entry(self):
+        self.make_client().get_account('me')
+        self.assertEqual(self.refreshes, 0)
+        self.assertEqual(self.authorization, ['Bearer env_token'])
+
+    def test_refresh_without_any_token(self):
+        self.make_client(access_token=None).get_account('me')
+        self.make_client(access_token=None).get_account('me')
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual(self.authorization, ['Bearer token1'] * 2)
+
+    def test_reactive_refresh_is_stored(self):
+        self.make_client(access_token='expired').get_account('me')
+        self.assertEqual(self.refreshes, 1)
+        # The next run starts with the refreshed token
+        self.make_client(access_token='expired').get_account('me')
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual(self.authorization,
+                         ['Bearer expired', 'Bearer token1', 'Bearer token1'])
+        mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        self.assertEqual(mode & 0o077, 0)
+
+    def test_proactive_refresh_near_expiry(self):
+        self.make_store().save('refresh_token', {'access_token': 'stored',
+                                                 'expires_in': 1000})
+        self.make_client().get_account('me')
+        self.clock.now += 1000 - tokens.EXPIRY_MARGIN
+        self.make_client().get_account('me')
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual(self.authorization, ['Bearer stored', 'Bearer token1'])
+
+    def test_concurrent_refresh_once(self):
+        self.server.latency = 0.05
+        self.make_store().save('refresh_token', {'access_token': 'stale',
+                                                 'expires_in': 0})
+        clients = []
+
+        def run():
+            clients.append(self.make_client())
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual({_client.auth.get_current_access_token()
+                          for _client in clients}, {'token1'})
+
+    def test_set_user_auth_stores_token(self):
+        _client = client.ImgurClient('client_id', 'client_secret',
+                                     api_url=self.server.url,
+                                     token_store=self.make_store())
+        _client.set_user_auth('new_token', 'refresh_token', 3600)
+        entry = self.make_store().load('refresh_token')
+        self.assertEqual(entry, {'access_token': 'new_token', 'expires_at': 4600})
@@ -0,0 +1,79 @@
+import io
+import json
+import os
+
+import fixtures
+import testtools
+
+from unittest import mock
+
+from imgur_cli import upload
+
+
+class TestUpload(testtools.TestCase):
+
+    def setUp(self):
+        super(TestUpload, self).setUp()
+        self.tempdir = self.useFixture(fixtures.TempDir())
+        self.paths = []
+        for name in ('a.png', 'b.gif', 'c.png'):
+            path = self.tempdir.join(name)
+            with open(path, 'wb') as image_file:
+                image_file.write(name.encode('utf-8'))
+            self.paths.append(path)
+        os.mkdir(self.tempdir.join('nested'))
+        with open(self.tempdir.join('notes.txt'), 'w') as notes_file:
+            notes_file.write('not an image')
+        self.client = mock.Mock()
+        self.client.upload_from_path.side_effect = self.fake_upload
+
+    def fake_upload(self, path, config):
+        name = os.path.basename(path)
+        return {'id': name, 'deletehash': 'x' + name, 'name': config['name'],
+                'link': 'http://i.imgur.com/' + name}
+
+    def test_expand_paths(self):
+        self.assertTrue(upload.is_bulk(self.tempdir.path))
+        self.assertFalse(upload.is_bulk(self.paths[0]))
+        # Only the images of a directory
+        self.assertEqual(upload.expand_paths(self.tempdir.path), self.paths)
+        self.assertEqual(upload.expand_paths(self.tempdir.join('*.png')),
+                         [self.paths[0], self.paths[2]])
+        stream = io.StringIO('{0}\n\n{1}\n'.format(*self.paths))
+        self.assertEqual(upload.expand_paths('-', stream), self.paths[:2])
+
+    def test_default_manifest(self):
+        self.assertEqual(upload.default_manifest(self.tempdir.path),
+                         self.tempdir.join(upload.MANIFEST_FILE))
+        self.assertIsNone(upload.default_manifest(self.tempdir.join('*.png')))
+        self.assertIsNone(upload.default_manifest('-'))
+
+    def test_upload_many_resumes_from_manifest(self):
+        manifest_path = self.tempdir.join('manifest.jsonl')
+        records = list(upload.upload_many(self.client, self.paths[:2], {}, 2,
+                                          upload.Manifest(manifest_path)))
+        self.assertEqual([record['id'] for record in records], ['a.png', 'b.gif'])
+        self.assertEqual(records[0]['hash'], upload.file_hash(self.paths[0]))
+        with open(manifest_path) as manifest_file:
+            self.assertEqual(len(manifest_file.readlines()), 2)
+
+        self.client.upload_from_path.reset_mock()
+        records = list(upload.upload_many(self.client, self.paths, {}, 2,
+                                          upload.Manifest(manifest_path)))
+        self.assertEqual([record.get('skipped') for record in records],
+                         [True, True, None])
+        self.client.upload_from_path.assert_called_once_with(
+            self.paths[2], {'name': 'c.png'})
+
+    def test_upload_errors_are_recorded(self):
+        missing = self.tempdir.join('missing.png')
+        records = list(upload.upload_many(self.client, [missing, self.paths[0]]))
+        self.assertEqual(records[0]['path'], missing)
+        self.assertIn('error', records[0])
+        self.assertEqual(records[1]['link'], 'http://i.imgur.com/a.png')
+
+    def test_manifest_ignores_truncated_line(self):
+        manifest_path = self.tempdir.join('manifest.jsonl')
+        with open(manifest_path, 'w') as manifest_file:
+            manifest_file.write(json.dumps({'hash': 'abc', 'id': 'x'}) + '\n{"ha')
+        self.assertEqual(upload.Manifest(manifest_path).get('abc')['id'], 'x')